@@ -1,14 +1,33 @@
 # backend/app/api.py
-from fastapi import APIRouter, HTTPException
+import os
+import json
+import asyncio
+import functools
+from fastapi import APIRouter, HTTPException, Header, Query, File, Form, UploadFile
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
-from app.model import load_artifacts, predict_from_interests
+from app.model import (
+    predict_from_interests,
+    predict_batch_from_interests,
+    recommend_from_interests,
+    similar_courses,
+    skills_from_text,
+    get_inference_service,
+    InferenceQueueFull,
+    reload_artifacts,
+    artifact_info,
+)
+from app.batching import get_batcher
+from app.metrics import count_error, render_metrics, slow_requests
 
 router = APIRouter()
 
-# Load model + vectorizer + meta on startup
-load_artifacts()
+# admin endpoints require a matching X-Admin-Token header and are disabled when unset
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+# largest accepted document upload
+OCR_MAX_UPLOAD_BYTES = int(os.environ.get("OCR_MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
 
 # ------------ Request & Response Models ------------
 class InterestsPayload(BaseModel):
@@ -22,9 +41,83 @@ class PredictResponse(BaseModel):
     probability: float
     explanation: Dict[str, Any]
 
+class BatchInterestsPayload(BaseModel):
+    interests: List[str] = Field(
+        ...,
+        min_items=1,
+        max_items=4096,
+        description="List of comma-separated interest strings, one per learner"
+    )
+
+class BatchPredictResponse(BaseModel):
+    results: List[PredictResponse]
+
+class RecommendPayload(BaseModel):
+    interests: str = Field(
+        ...,
+        description="Comma-separated interest keywords, e.g. 'nlp, transformers, deep learning'"
+    )
+    exclude: List[str] = Field(
+        default_factory=list,
+        description="Courses never to recommend, e.g. ones already taken"
+    )
+    include: List[str] = Field(
+        default_factory=list,
+        description="Restrict recommendations to these courses"
+    )
+    segments: List[str] = Field(
+        default_factory=list,
+        description="Restrict recommendations to these catalogue segments (meta.json 'segments')"
+    )
+
+class CourseScore(BaseModel):
+    course: str
+    probability: float
+
+class RecommendResponse(BaseModel):
+    recommendations: List[CourseScore]
+    explanation: Dict[str, Any]
+
+class SimilarCourse(BaseModel):
+    course: str
+    score: float
+
+class SimilarResponse(BaseModel):
+    results: List[SimilarCourse]
+
+class OCRPage(BaseModel):
+    page: int
+    text: str
+
+class UploadPredictResponse(PredictResponse):
+    skills: List[str]
+    pages: List[OCRPage]
+
+class ReloadPayload(BaseModel):
+    version: Optional[str] = Field(
+        None,
+        description="Registry version to serve; defaults to the one CURRENT points at"
+    )
+    promote: bool = Field(
+        False,
+        description="Also move CURRENT to this version so watching workers follow"
+    )
+
 # ------------ Main Predict Endpoint ------------
+def _failed(endpoint: str, status: int, e: Exception) -> HTTPException:
+    count_error(endpoint, status)
+    return HTTPException(status_code=status, detail=str(e))
+
+def _busy(e: InferenceQueueFull, endpoint: str) -> HTTPException:
+    count_error(endpoint, 503)
+    return HTTPException(
+        status_code=503,
+        detail="Inference capacity exhausted, please retry.",
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
 @router.post("/predict", response_model=PredictResponse)
-def predict(payload: InterestsPayload):
+async def predict(payload: InterestsPayload):
     """
     This endpoint expects JSON:
     {
@@ -33,14 +126,248 @@ def predict(payload: InterestsPayload):
 
     It passes the string to predict_from_interests() which treats it
     as text for CountVectorizer, NOT a dict. This is correct.
+    The sklearn work runs on the bounded inference pool; when that is
+    saturated the caller gets a 503 with a Retry-After hint.
     """
     try:
-        recommended, prob, explanation = predict_from_interests(payload.interests)
+        batcher = get_batcher()
+        if batcher is not None:
+            # coalesced with concurrent requests into one batched call
+            recommended, prob, explanation = await batcher.predict(payload.interests)
+        else:
+            recommended, prob, explanation = await get_inference_service().submit(
+                predict_from_interests, payload.interests
+            )
         return {
             "recommended_course": recommended,
             "probability": round(prob, 4),
             "explanation": explanation
         }
+    except InferenceQueueFull as e:
+        raise _busy(e, "/predict")
     except Exception as e:
         # Return proper HTTP error
+        raise _failed("/predict", 500, e)
+
+
+# ------------ Batch Predict Endpoint ------------
+@router.post("/predict/batch", response_model=BatchPredictResponse)
+async def predict_batch(payload: BatchInterestsPayload):
+    """
+    Scores many learners in one call:
+    {
+        "interests": ["python, ml", "nlp, transformers"]
+    }
+
+    All items go through a single vectorizer transform and a single
+    predict_proba; results come back in the same order as the input.
+    """
+    try:
+        results = await get_inference_service().submit(
+            predict_batch_from_interests, payload.interests
+        )
+        return {
+            "results": [
+                {
+                    "recommended_course": recommended,
+                    "probability": round(prob, 4),
+                    "explanation": explanation
+                }
+                for recommended, prob, explanation in results
+            ]
+        }
+    except InferenceQueueFull as e:
+        raise _busy(e, "/predict/batch")
+    except Exception as e:
+        raise _failed("/predict/batch", 500, e)
+
+
+# ------------ Top-K Recommend Endpoint ------------
+@router.post("/recommend", response_model=RecommendResponse)
+async def recommend(payload: RecommendPayload, k: int = Query(5, ge=1, le=50)):
+    """
+    Ranked top-k courses for one learner:
+    POST /recommend?k=3
+    {
+        "interests": "python, ml",
+        "exclude": ["intro_ml"]
+    }
+
+    include/segments narrow the candidates, exclude removes courses from
+    them; the ranking comes from the same single predict_proba as /predict.
+    """
+    try:
+        result = await get_inference_service().submit(
+            recommend_from_interests, payload.interests, k,
+            payload.exclude, payload.include, payload.segments
+        )
+        for item in result["recommendations"]:
+            item["probability"] = round(item["probability"], 4)
+        return result
+    except InferenceQueueFull as e:
+        raise _busy(e, "/recommend")
+    except ValueError as e:
+        raise _failed("/recommend", 400, e)
+    except Exception as e:
+        raise _failed("/recommend", 500, e)
+
+
+# ------------ Content-based Similar Endpoint ------------
+@router.post("/similar", response_model=SimilarResponse)
+async def similar(payload: InterestsPayload, k: int = Query(5, ge=1, le=50)):
+    """
+    Nearest catalogue courses to the interests by TF-IDF cosine similarity
+    over course descriptions, independent of the classifier:
+    POST /similar?k=3
+    {
+        "interests": "react, javascript"
+    }
+    """
+    try:
+        results = await get_inference_service().submit(similar_courses, payload.interests, k)
+        return {"results": [{"course": c, "score": round(s, 4)} for c, s in results]}
+    except InferenceQueueFull as e:
+        raise _busy(e, "/similar")
+    except LookupError as e:
+        raise _failed("/similar", 404, e)
+    except Exception as e:
+        raise _failed("/similar", 500, e)
+
+
+# ------------ Document upload (OCR) Endpoints ------------
+def _ocr_engine():
+    # OCR dependencies (pillow, opencv, pytesseract) load on first upload only
+    try:
+        from app.ocr import get_ocr_engine, open_document
+    except ImportError as e:
+        raise HTTPException(status_code=501, detail=f"OCR support is not installed: {e}")
+    return get_ocr_engine(), open_document
+
+async def _read_document(endpoint: str, file: UploadFile):
+    engine, open_document = _ocr_engine()
+    data = await file.read(OCR_MAX_UPLOAD_BYTES + 1)
+    if len(data) > OCR_MAX_UPLOAD_BYTES:
+        raise _failed(endpoint, 413, ValueError(f"Upload larger than {OCR_MAX_UPLOAD_BYTES} bytes"))
+    try:
+        # validates the header only; the engine gets the bytes so identical
+        # uploads hit its result cache before any page is decoded
+        open_document(data)
+    except ValueError as e:
+        raise _failed(endpoint, 400, e)
+    return engine, data
+
+@router.post("/ocr")
+async def ocr_document(file: UploadFile = File(...), preprocess: str = Form("none")):
+    """
+    OCR an uploaded image or multi-page TIFF, optionally preprocessed with
+    comma-separated steps (grayscale, resize, denoise, deskew, binarize). Pages are recognized in
+    parallel and streamed back as newline-delimited JSON
+    ({page, text, words}) in the order they finish.
+    """
+    engine, document = await _read_document("/ocr", file)
+    loop = asyncio.get_running_loop()
+    try:
+        # hashing the upload for the cache key is CPU work too, keep it off the loop
+        pages = await loop.run_in_executor(None, functools.partial(engine.stream, document, preprocess=preprocess))
+    except ValueError as e:
+        raise _failed("/ocr", 400, e)
+    done = object()
+
+    async def body():
+        while True:
+            page = await loop.run_in_executor(None, next, pages, done)
+            if page is done:
+                return
+            yield json.dumps(page) + "\n"
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+@router.post("/predict/upload", response_model=UploadPredictResponse)
+async def predict_upload(file: UploadFile = File(...), preprocess: str = Form("none")):
+    """
+    Recommend a course from a transcript or certificate: OCR every page,
+    pick out the skills the model knows, and score them like /predict.
+    """
+    engine, document = await _read_document("/predict/upload", file)
+    loop = asyncio.get_running_loop()
+    try:
+        result = await loop.run_in_executor(None, functools.partial(engine.run, document, preprocess=preprocess))
+    except ValueError as e:
+        raise _failed("/predict/upload", 400, e)
+    except Exception as e:
+        raise _failed("/predict/upload", 500, RuntimeError(f"OCR failed: {e}"))
+    try:
+        skills = skills_from_text(result["text"])
+        if skills:
+            recommended, prob, explanation = await get_inference_service().submit(
+                predict_from_interests, ", ".join(skills)
+            )
+    except InferenceQueueFull as e:
+        raise _busy(e, "/predict/upload")
+    except Exception as e:
+        raise _failed("/predict/upload", 500, e)
+    if not skills:
+        raise _failed("/predict/upload", 422, ValueError("No known skills found in the document."))
+    return {
+        "recommended_course": recommended,
+        "probability": round(prob, 4),
+        "explanation": explanation,
+        "skills": skills,
+        "pages": [{"page": p["page"], "text": p["text"]} for p in result["pages"]],
+    }
+
+
+# ------------ Dynamic batching stats ------------
+@router.get("/predict/batching")
+def batching_stats():
+    """Batch-size histogram of the /predict coalescer, for tuning its window."""
+    batcher = get_batcher()
+    if batcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **batcher.stats()}
+
+
+# ------------ Metrics ------------
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Per-stage latency histograms and counters, in Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@router.get("/metrics/slow")
+def slowest_requests(x_admin_token: Optional[str] = Header(None)):
+    """
+    Slowest scoring calls picked by the sampler (PREDICT_SLOW_SAMPLE_RATE),
+    with stage breakdowns. Admin only: entries hold raw learner inputs.
+    """
+    _check_admin(x_admin_token)
+    return {"sample_rate": slow_requests.rate, "slowest": slow_requests.slowest()}
+
+
+# ------------ Model registry admin ------------
+def _check_admin(token: Optional[str]):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled; set ADMIN_TOKEN.")
+    if token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+
+@router.get("/admin/model")
+def model_info(x_admin_token: Optional[str] = Header(None)):
+    _check_admin(x_admin_token)
+    return artifact_info()
+
+@router.post("/admin/reload")
+async def reload_model(payload: Optional[ReloadPayload] = None, x_admin_token: Optional[str] = Header(None)):
+    """
+    Loads and warms a model version off the event loop, then swaps it in.
+    In-flight requests finish on the version they started with. Only this
+    worker swaps; with `promote`, the other workers' watchers follow CURRENT.
+    """
+    _check_admin(x_admin_token)
+    payload = payload or ReloadPayload()
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(None, reload_artifacts, payload.version, payload.promote)
+    except (FileNotFoundError, ValueError) as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,350 @@
+# backend/app/artifacts.py
+"""
+Memory-mappable model format.
+
+A fitted model is exported as a directory of uncompressed .npy arrays plus a
+manifest.json. Serving opens the arrays with mmap_mode="r", so every worker
+on a host shares one copy of the model through the OS page cache instead of
+unpickling its own (sklearn trees copy their node arrays on unpickle, so
+joblib's mmap_mode alone does not help for forests).
+"""
+import os
+import json
+import numpy as np
+import scipy.sparse as sp
+from typing import Any, Dict, Optional, Tuple
+
+ARRAYS_DIRNAME = "model.arrays"
+MANIFEST_FILE = "manifest.json"
+FORMAT_VERSION = 2
+# compact forests store leaf class fractions as uint16 multiples of 1/scale
+LEAF_VALUE_SCALE = 65535
+
+
+def save_array_bundle(path: str, arrays: Dict[str, np.ndarray], manifest: Dict[str, Any]):
+    """Write arrays as uncompressed .npy files plus a manifest; manifest goes last."""
+    os.makedirs(path, exist_ok=True)
+    for name, arr in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(arr), allow_pickle=False)
+    manifest = dict(manifest, format_version=FORMAT_VERSION, arrays=sorted(arrays))
+    with open(os.path.join(path, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f)
+
+def load_array_bundle(path: str, mmap_mode: Optional[str] = "r") -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    with open(os.path.join(path, MANIFEST_FILE), "r") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported array bundle format: {manifest.get('format_version')!r}")
+    arrays = {
+        name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode, allow_pickle=False)
+        for name in manifest["arrays"]
+    }
+    return arrays, manifest
+
+def has_array_bundle(path: str) -> bool:
+    return os.path.exists(os.path.join(path, MANIFEST_FILE))
+
+
+# ------------ Export ------------
+def _flatten_forest(model) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """
+    Compile a fitted forest into flat node arrays laid out for batch
+    traversal: children packed as [left, right] pairs, and leaves turned
+    into self-loops (feature 0, threshold +inf) so every row can take the
+    same number of steps without per-level branching.
+    """
+    trees = [est.tree_ for est in model.estimators_]
+    sizes = [t.node_count for t in trees]
+    offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+    n_nodes = int(offsets[-1])
+    if n_nodes >= np.iinfo(np.int32).max // 2:
+        raise ValueError("Forest too large for int32 node ids")
+    feature = np.concatenate([t.feature for t in trees]).astype(np.int64)
+    threshold = np.concatenate([t.threshold for t in trees]).astype(np.float64)
+    left = np.concatenate([t.children_left + o for t, o in zip(trees, offsets)])
+    right = np.concatenate([t.children_right + o for t, o in zip(trees, offsets)])
+    leaf = feature < 0
+    ids = np.arange(n_nodes)
+    children = np.empty(2 * n_nodes, dtype=np.int32)
+    children[0::2] = np.where(leaf, ids, left)
+    children[1::2] = np.where(leaf, ids, right)
+    # only the features the forest splits on are ever read at predict time
+    used = np.unique(feature[~leaf]).astype(np.int32)
+    remap = np.zeros(model.n_features_in_, dtype=np.int32)
+    remap[used] = np.arange(len(used), dtype=np.int32)
+    feature = np.where(leaf, 0, remap[np.where(leaf, 0, feature)]).astype(np.int32)
+    threshold[leaf] = np.inf
+    # per-node class distribution as DecisionTreeClassifier.predict_proba returns
+    # it: sklearn >= 1.4 already stores fractions, older versions store counts
+    value = np.concatenate([t.value[:, 0, :] for t in trees]).astype(np.float64)
+    totals = value.sum(axis=1, keepdims=True)
+    counts = (np.abs(totals - 1.0) > 1e-9) & (totals > 0)
+    value = np.where(counts, value / np.where(counts, totals, 1.0), value)
+    arrays = {
+        "tree_offsets": offsets,
+        "feature": feature,
+        "threshold": threshold,
+        "children": children,
+        "value": value,
+        "used_features": used,
+        "feature_importances": np.asarray(model.feature_importances_, dtype=np.float64),
+    }
+    manifest = {
+        "kind": "forest",
+        "n_features": int(model.n_features_in_),
+        "max_depth": int(max(t.max_depth for t in trees)),
+    }
+    return arrays, manifest
+
+def _round_down_f32(values: np.ndarray) -> np.ndarray:
+    """
+    Largest float32 <= each value. Trees compare float32 inputs, and for a
+    float32 x, x > t holds exactly when x > round_down_f32(t), so splits
+    stay bit-for-bit the same.
+    """
+    out = values.astype(np.float32)
+    over = out.astype(np.float64) > values
+    out[over] = np.nextafter(out[over], np.float32(-np.inf))
+    return out
+
+def compact_forest_arrays(arrays: Dict[str, np.ndarray], manifest: Dict[str, Any],
+                          value_scale: int = LEAF_VALUE_SCALE) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """
+    Shrink flattened forest arrays for serving: nodes are renumbered so the
+    leaves come last and only leaves keep a class distribution (internal
+    node distributions are a training by-product), stored as uint16
+    fractions of `value_scale`; thresholds become float32 (rounded down, so
+    every split decides the same); feature ids become uint16 when they fit.
+    Per-tree probabilities move by at most 0.5 / value_scale.
+    """
+    children = np.asarray(arrays["children"])
+    n_nodes = len(children) // 2
+    ids = np.arange(n_nodes)
+    leaf = children[0::2] == ids
+    order = np.concatenate([ids[~leaf], ids[leaf]])
+    new_id = np.empty(n_nodes, dtype=np.int32)
+    new_id[order] = np.arange(n_nodes, dtype=np.int32)
+    packed = np.empty_like(children)
+    packed[0::2] = new_id[children[0::2][order]]
+    packed[1::2] = new_id[children[1::2][order]]
+    feature = np.asarray(arrays["feature"])[order]
+    if feature.max(initial=0) <= np.iinfo(np.uint16).max:
+        feature = feature.astype(np.uint16)
+    value = np.asarray(arrays["value"])[ids[leaf]]
+    compact = {
+        "roots": new_id[np.asarray(arrays["tree_offsets"])[:-1]],
+        "feature": feature,
+        "threshold": _round_down_f32(np.asarray(arrays["threshold"])[order]),
+        "children": packed,
+        "value": np.rint(value * value_scale).astype(np.uint16),
+        "used_features": np.asarray(arrays["used_features"]),
+        "feature_importances": np.asarray(arrays["feature_importances"]),
+    }
+    manifest = dict(manifest, value_scale=value_scale, leaf_offset=int((~leaf).sum()))
+    return compact, manifest
+
+def linear_link(model) -> str:
+    """
+    How predict_proba turns decision scores into probabilities, following
+    sklearn's LogisticRegression: "ovr" (per-class sigmoids, normalized),
+    "softmax", or "softmax2" for a binary multinomial model (softmax over
+    [-d, d], i.e. sigmoid(2d)).
+    """
+    multi_class = getattr(model, "multi_class", "ovr")
+    binary = len(model.classes_) <= 2
+    if multi_class in ("ovr", "warn") or (
+            multi_class in ("auto", "deprecated") and (binary or getattr(model, "solver", "lbfgs") == "liblinear")):
+        return "ovr"
+    return "softmax2" if binary else "softmax"
+
+def export_model(model, path: str, compact: bool = False) -> Optional[str]:
+    """
+    Export a fitted model to the array format at `path`. Returns the kind
+    written, or None when the model type has no array form (it is then
+    served from model.joblib as before). `compact` applies to forests, see
+    compact_forest_arrays.
+    """
+    if hasattr(model, "estimators_") and hasattr(model, "feature_importances_") \
+            and all(hasattr(e, "tree_") for e in model.estimators_):
+        arrays, manifest = _flatten_forest(model)
+        if compact:
+            arrays, manifest = compact_forest_arrays(arrays, manifest)
+    elif hasattr(model, "coef_") and hasattr(model, "intercept_") and hasattr(model, "predict_proba"):
+        arrays = {
+            # feature-major, so a serving worker can gather token rows straight from the memmap
+            "coef_t": np.ascontiguousarray(np.asarray(model.coef_, dtype=np.float64).T),
+            "intercept": np.asarray(model.intercept_, dtype=np.float64),
+        }
+        manifest = {"kind": "linear", "link": linear_link(model), "n_features": int(model.coef_.shape[1])}
+    else:
+        return None
+    manifest["classes"] = np.asarray(model.classes_).tolist()
+    manifest["source"] = type(model).__name__
+    save_array_bundle(path, arrays, manifest)
+    return manifest["kind"]
+
+
+# ------------ Serving models ------------
+class FlatForest:
+    """
+    Random forest evaluated from flat node arrays. All trees are walked for a
+    whole batch at once, one vectorized step per tree level, reading feature
+    values straight from the CSR input. Gives the same probabilities as the
+    sklearn forest it was exported from (to within 0.5 / value_scale for a
+    compacted export, whose leaves are numbered from leaf_offset and hold
+    uint16 class fractions).
+    """
+    # rows per evaluation chunk, bounds the (trees x rows) working set
+    CHUNK_ROWS = 1024
+    # below this many cells the used-feature columns are gathered densely
+    DENSE_CELLS = 1 << 22
+    # finished (leaf) paths are dropped from the working set every N levels
+    COMPACT_EVERY = 4
+
+    def __init__(self, arrays: Dict[str, np.ndarray], manifest: Dict[str, Any]):
+        # plain ndarray views over the memmaps: same pages, no subclass overhead per op
+        arrays = {k: np.asarray(v) for k, v in arrays.items()}
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.children = arrays["children"]
+        self.value = arrays["value"]
+        self.used_features = arrays["used_features"]
+        self.feature_importances_ = arrays["feature_importances"]
+        self.classes_ = np.asarray(manifest["classes"])
+        self.n_features_in_ = manifest["n_features"]
+        if len(self.feature_importances_) != self.n_features_in_ or (
+                len(self.used_features) and int(self.used_features.max()) >= self.n_features_in_):
+            raise ValueError(f"Forest export does not match its {self.n_features_in_} input features")
+        self.max_depth = manifest["max_depth"]
+        roots = arrays["roots"] if "roots" in arrays else arrays["tree_offsets"][:-1]
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.n_trees = len(self.roots)
+        # compact exports: value rows exist for leaves only, from leaf_offset on
+        self.leaf_offset = manifest.get("leaf_offset", 0)
+        self.value_scale = manifest.get("value_scale")
+        # input column -> position among used features (-1 when never split on)
+        self._local = np.full(self.n_features_in_, -1, dtype=np.int64)
+        self._local[self.used_features] = np.arange(len(self.used_features))
+
+    def _gather(self, X):
+        """
+        Keep only the used-feature entries of X: a dense (rows x n_used)
+        block when that is small, otherwise sorted (key, value) pairs with
+        key = row * n_used + local feature. Values are float32, as sklearn
+        trees see them.
+        """
+        n, n_used = X.shape[0], len(self.used_features)
+        if not sp.issparse(X):
+            return np.asarray(X)[:, self.used_features].astype(np.float32).ravel(), None
+        X = X.tocsr()
+        rows = np.repeat(np.arange(n, dtype=np.int64), np.diff(X.indptr))
+        local = self._local[X.indices]
+        keep = local >= 0
+        keys = rows[keep] * n_used + local[keep]
+        vals = X.data[keep].astype(np.float32)
+        if n * n_used <= self.DENSE_CELLS:
+            dense = np.zeros(n * n_used, dtype=np.float32)
+            dense[keys] = vals
+            return dense, None
+        if not X.has_sorted_indices:
+            order = np.argsort(keys, kind="stable")
+            keys, vals = keys[order], vals[order]
+        return keys, vals
+
+    @staticmethod
+    def _lookup(keys: np.ndarray, vals: np.ndarray, q: np.ndarray) -> np.ndarray:
+        # sparse lookup: (row, feature) pairs that are not stored are zeros
+        if not len(keys):
+            return np.zeros(len(q), dtype=np.float32)
+        pos = np.searchsorted(keys, q)
+        pos[pos == len(keys)] = 0
+        return np.where(keys[pos] == q, vals[pos], np.float32(0))
+
+    def _proba_chunk(self, X) -> np.ndarray:
+        n, n_trees, n_used = X.shape[0], self.n_trees, len(self.used_features)
+        first, second = self._gather(X)
+        # tree-major working set: entry t * n + r walks tree t for row r
+        node = np.repeat(self.roots, n)
+        base = np.tile(np.arange(n, dtype=np.int64) * n_used, n_trees)
+        live = None
+        cur, cur_base = node, base
+        for level in range(self.max_depth):
+            q = cur_base + self.feature.take(cur)
+            x = first.take(q) if second is None else self._lookup(first, second, q)
+            cur = self.children.take(cur * 2 + (x > self.threshold.take(cur)))
+            if level % self.COMPACT_EVERY == self.COMPACT_EVERY - 1 and level + 1 < self.max_depth:
+                # drop paths that reached their leaf; they stay put from here on
+                going = self.children.take(cur * 2) != cur
+                if live is None:
+                    node, live = cur, np.nonzero(going)[0]
+                else:
+                    node[live] = cur
+                    live = live[going]
+                cur, cur_base = cur[going], cur_base[going]
+                if not len(cur):
+                    break
+        if live is None:
+            node = cur
+        else:
+            node[live] = cur
+        leaves = self.value.take(node - self.leaf_offset if self.leaf_offset else node, axis=0)
+        leaves = leaves.reshape(n_trees, n, -1)
+        # add trees one at a time, in order, exactly as sklearn accumulates them
+        out = np.zeros(leaves.shape[1:], dtype=np.float64)
+        for t in range(n_trees):
+            out += leaves[t]
+        if self.value_scale:
+            return out / (n_trees * self.value_scale)
+        return out / n_trees
+
+    def predict_proba(self, X) -> np.ndarray:
+        if X.shape[1] != self.n_features_in_:
+            # a stale vectorizer would otherwise read the wrong columns
+            raise ValueError(f"X has {X.shape[1]} features, but FlatForest is expecting "
+                             f"{self.n_features_in_} features as input")
+        n = X.shape[0]
+        if n <= self.CHUNK_ROWS:
+            return self._proba_chunk(X)
+        return np.vstack([self._proba_chunk(X[i:i + self.CHUNK_ROWS]) for i in range(0, n, self.CHUNK_ROWS)])
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+class LinearModelArrays:
+    """Linear classifier (logistic regression, SGD log-loss) scored from coef/intercept arrays."""
+    def __init__(self, arrays: Dict[str, np.ndarray], manifest: Dict[str, Any]):
+        # coef_ is a transposed view of the feature-major export; nothing is copied
+        self.coef_ = arrays["coef_t"].T if "coef_t" in arrays else arrays["coef"]
+        self.intercept_ = arrays["intercept"]
+        self.link = manifest["link"]
+        self.classes_ = np.asarray(manifest["classes"])
+        self.n_features_in_ = manifest["n_features"]
+
+    def decision_function(self, X) -> np.ndarray:
+        scores = np.asarray(X @ self.coef_.T) + self.intercept_
+        return scores.ravel() if scores.shape[1] == 1 else scores
+
+    def predict_proba(self, X) -> np.ndarray:
+        scores = self.decision_function(X)
+        if self.link == "softmax":
+            scores = scores - scores.max(axis=1, keepdims=True)
+            np.exp(scores, out=scores)
+            return scores / scores.sum(axis=1, keepdims=True)
+        prob = 1.0 / (1.0 + np.exp(-2.0 * scores if self.link == "softmax2" else -scores))
+        if prob.ndim == 1:
+            return np.vstack([1 - prob, prob]).T
+        return prob / prob.sum(axis=1, keepdims=True)
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def load_model(path: str, mmap_mode: Optional[str] = "r"):
+    """Open an exported model; arrays stay memory-mapped and read-only."""
+    arrays, manifest = load_array_bundle(path, mmap_mode=mmap_mode)
+    if manifest["kind"] == "forest":
+        return FlatForest(arrays, manifest)
+    if manifest["kind"] == "linear":
+        return LinearModelArrays(arrays, manifest)
+    raise ValueError(f"Unknown model kind in {path}: {manifest['kind']!r}")
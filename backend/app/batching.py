@@ -0,0 +1,115 @@
+# backend/app/batching.py
+import os
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.model import predict_batch_from_interests, get_inference_service
+
+# dynamic batching for /predict: off unless PREDICT_BATCHING=1
+PREDICT_BATCHING = os.environ.get("PREDICT_BATCHING", "0").lower() in ("1", "true", "yes")
+PREDICT_BATCH_WINDOW_MS = float(os.environ.get("PREDICT_BATCH_WINDOW_MS", "2"))
+PREDICT_MAX_BATCH_SIZE = int(os.environ.get("PREDICT_MAX_BATCH_SIZE", "32"))
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-item requests into one batched call.
+
+    Items are collected for at most `window_ms` milliseconds or until
+    `max_batch_size` are waiting, whichever comes first, then handed to
+    `run_batch` in one go (through `submit`, normally the inference pool).
+    Each caller gets back its own result, or the batch's exception.
+    """
+    def __init__(self, run_batch: Callable[[List[Any]], List[Any]] = predict_batch_from_interests,
+                 window_ms: float = PREDICT_BATCH_WINDOW_MS, max_batch_size: int = PREDICT_MAX_BATCH_SIZE,
+                 submit: Optional[Callable] = None):
+        self.run_batch = run_batch
+        self.window = max(0.0, window_ms) / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self._submit = submit
+        self._loop = None
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer = None
+        self._tasks = set()
+        # batch-size histogram over power-of-two buckets up to max_batch_size
+        self._bounds = []
+        b = 1
+        while b < self.max_batch_size:
+            self._bounds.append(b)
+            b *= 2
+        self._bounds.append(self.max_batch_size)
+        self._counts = [0] * len(self._bounds)
+        self._batches = 0
+        self._items = 0
+
+    async def predict(self, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # a new event loop (e.g. a fresh test client) starts from a clean slate
+            self._loop = loop
+            self._pending = []
+            self._timer = None
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = self._loop.create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]):
+        self._record(len(batch))
+        items = [item for item, _ in batch]
+        submit = self._submit or get_inference_service().submit
+        try:
+            results = await submit(self.run_batch, items)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _record(self, size: int):
+        self._batches += 1
+        self._items += size
+        for i, bound in enumerate(self._bounds):
+            if size <= bound:
+                self._counts[i] += 1
+                break
+
+    def stats(self) -> Dict[str, Any]:
+        """Batch-size histogram (per-bucket, not cumulative) for tuning the window."""
+        return {
+            "window_ms": self.window * 1000.0,
+            "max_batch_size": self.max_batch_size,
+            "batches": self._batches,
+            "items": self._items,
+            "mean_batch_size": (self._items / self._batches) if self._batches else 0.0,
+            "histogram": {str(b): c for b, c in zip(self._bounds, self._counts)},
+        }
+
+
+_batcher: Optional[MicroBatcher] = None
+
+def get_batcher() -> Optional[MicroBatcher]:
+    """The shared batcher, or None when dynamic batching is disabled."""
+    global _batcher
+    if not PREDICT_BATCHING:
+        return None
+    if _batcher is None:
+        _batcher = MicroBatcher()
+    return _batcher
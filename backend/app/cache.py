@@ -0,0 +1,313 @@
+# backend/app/cache.py
+import os
+import json
+import time
+import zlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# in-process result cache: PREDICT_CACHE_SIZE=0 disables it
+PREDICT_CACHE_SIZE = int(os.environ.get("PREDICT_CACHE_SIZE", "1024"))
+PREDICT_CACHE_TTL = float(os.environ.get("PREDICT_CACHE_TTL", "300"))
+# optional shared backend (a SQLite file every worker on the host can open)
+PREDICT_CACHE_PATH = os.environ.get("PREDICT_CACHE_PATH", "")
+PREDICT_SHARED_CACHE_SIZE = int(os.environ.get("PREDICT_SHARED_CACHE_SIZE", "100000"))
+# persistent OCR result store (a SQLite file): OCR_CACHE_PATH="" disables it
+OCR_CACHE_PATH = os.environ.get("OCR_CACHE_PATH", "")
+OCR_CACHE_MAX_BYTES = int(os.environ.get("OCR_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+class SqliteCacheBackend:
+    """
+    Shared cache stand-in backed by a SQLite file, so several uvicorn workers
+    on one host can reuse each other's results. Values are stored as JSON.
+    """
+    _TRIM_EVERY = 256
+
+    def __init__(self, path: str, ttl: float = PREDICT_CACHE_TTL, max_entries: int = PREDICT_SHARED_CACHE_SIZE):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._puts = 0
+        with self._conn() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT, expires REAL)")
+
+    def _conn(self) -> sqlite3.Connection:
+        # one connection per thread; WAL lets readers and a writer overlap
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        row = self._conn().execute(
+            "SELECT value FROM results WHERE key = ? AND expires > ?", (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key: str, value: Any):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, expires) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time() + self.ttl),
+            )
+        self._puts += 1
+        if self._puts % self._TRIM_EVERY == 0:
+            self.trim()
+
+    def trim(self):
+        """Drop expired rows, then the oldest rows beyond max_entries."""
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM results WHERE expires <= ?", (time.time(),))
+            conn.execute(
+                "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY expires DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM results")
+
+
+class ResultCache:
+    """
+    Bounded LRU cache with a TTL for full prediction results, optionally
+    backed by a shared store. Callers put the artifact version in the key,
+    so entries from an older model are never served after a reload.
+    """
+    def __init__(self, max_size: int = PREDICT_CACHE_SIZE, ttl: float = PREDICT_CACHE_TTL,
+                 shared: Optional[SqliteCacheBackend] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared = shared
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+        if self.shared is not None:
+            try:
+                value = self.shared.get(key)
+            except sqlite3.Error:
+                value = None
+            if value is not None:
+                # JSON round-trip turns tuples into lists
+                value = tuple(value)
+                self._store(key, value, now)
+                with self._lock:
+                    self.shared_hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: Any):
+        self._store(key, value, time.monotonic())
+        if self.shared is not None:
+            try:
+                self.shared.put(key, value)
+            except sqlite3.Error:
+                # the shared store is best effort; the local copy still helps
+                pass
+
+    def _store(self, key: str, value: Any, now: float):
+        with self._lock:
+            self._data[key] = (now + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """Drop local entries (shared entries age out via their versioned keys and TTL)."""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+            }
+
+
+class OCRResultCache:
+    """
+    Persistent OCR results keyed by a content hash (see app.ocr.ocr_cache_key).
+    Values are stored as zlib-compressed JSON; once the compressed total
+    passes max_bytes, the least recently used entries are dropped. The file
+    can be shared by every worker on the host.
+
+    get_or_compute also de-duplicates concurrent misses, per process only:
+    the first caller for a key runs the OCR, later ones wait for its result.
+    claim/settle expose the same in-flight table to callers that produce the
+    value piecewise (OCREngine.stream). Other workers sharing the file are
+    not coordinated with; a leader re-reads the file after claiming, so it
+    skips the OCR if one of them has stored the result meanwhile.
+    """
+    # after an overflow, trim down to this fraction of max_bytes
+    _LOW_WATER = 0.9
+
+    def __init__(self, path: str, max_bytes: int = OCR_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._conn() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS ocr_results "
+                         "(key TEXT PRIMARY KEY, value BLOB, size INTEGER, last_used REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ocr_results_last_used ON ocr_results (last_used)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        conn = self._conn()
+        row = conn.execute("SELECT value FROM ocr_results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        with conn:
+            conn.execute("UPDATE ocr_results SET last_used = ? WHERE key = ?", (time.time(), key))
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, key: str, value: Any):
+        blob = zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"))
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO ocr_results (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, blob, len(blob), time.time()),
+            )
+        if self.total_bytes() > self.max_bytes:
+            self.trim()
+
+    def total_bytes(self) -> int:
+        return self._conn().execute("SELECT COALESCE(SUM(size), 0) FROM ocr_results").fetchone()[0]
+
+    def trim(self):
+        """Drop least recently used entries until the total is under the low-water mark."""
+        conn = self._conn()
+        with conn:
+            excess = self.total_bytes() - int(self.max_bytes * self._LOW_WATER)
+            if excess <= 0:
+                return
+            victims = []
+            for key, size in conn.execute("SELECT key, size FROM ocr_results ORDER BY last_used"):
+                victims.append((key,))
+                excess -= size
+                if excess <= 0:
+                    break
+            conn.executemany("DELETE FROM ocr_results WHERE key = ?", victims)
+
+    def claim(self, key: str) -> Tuple[Future, bool]:
+        """
+        Join the in-flight computation of a missed key: (future, True) for the
+        first caller, who must compute, store and settle() it; (future, False)
+        for the ones that wait on its result.
+        """
+        with self._lock:
+            pending = self._inflight.get(key)
+            if pending is not None:
+                self.coalesced += 1
+                return pending, False
+            pending = self._inflight[key] = Future()
+        self.misses += 1
+        return pending, True
+
+    def settle(self, key: str, pending: Future, value: Any = None, error: Optional[BaseException] = None):
+        """Hand the leader's value (or error) to the waiting callers and end the in-flight entry."""
+        if error is None:
+            pending.set_result(value)
+        else:
+            pending.set_exception(error)
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        pending, leader = self.claim(key)
+        if not leader:
+            return pending.result()
+        try:
+            # another worker may have stored it between our miss and the claim
+            value = self.get(key)
+            if value is None:
+                value = compute()
+                self.put(key, value)
+        except BaseException as e:
+            self.settle(key, pending, error=e)
+            raise
+        self.settle(key, pending, value)
+        return value
+
+    def clear(self):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM ocr_results")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced,
+                "bytes": self.total_bytes(), "max_bytes": self.max_bytes}
+
+
+_result_cache: Optional[ResultCache] = None
+
+def get_result_cache() -> ResultCache:
+    global _result_cache
+    if _result_cache is None:
+        shared = SqliteCacheBackend(PREDICT_CACHE_PATH) if PREDICT_CACHE_PATH and PREDICT_CACHE_SIZE > 0 else None
+        _result_cache = ResultCache(shared=shared)
+    return _result_cache
+
+
+_ocr_cache: Optional[OCRResultCache] = None
+
+def get_ocr_cache() -> Optional[OCRResultCache]:
+    """The shared OCR result cache, or None when OCR_CACHE_PATH is unset."""
+    global _ocr_cache
+    if _ocr_cache is None and OCR_CACHE_PATH and OCR_CACHE_MAX_BYTES > 0:
+        _ocr_cache = OCRResultCache(OCR_CACHE_PATH)
+    return _ocr_cache
@@ -1,8 +1,9 @@
 # backend/app/main.py
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware     # <-- make sure this line is present
 from app.api import router as api_router
-from app.model import load_artifacts
+from app.model import load_artifacts, artifacts_ready, artifact_info, get_inference_service, ArtifactWatcher
 
 app = FastAPI(title="CreditRiskAPI", version="0.1")
 
@@ -15,12 +16,33 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# follows the registry's CURRENT pointer (a no-op for a flat MODEL_DIR);
+# MODEL_WATCH_INTERVAL=0 turns it off
+artifact_watcher = ArtifactWatcher()
+
 @app.on_event("startup")
 def startup_event():
-    load_artifacts()
+    # the only place artifacts load; a no-op in pre-fork workers (app/serve.py),
+    # which inherit the master's copy
+    load_artifacts(warm=True)
+    artifact_watcher.start()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    artifact_watcher.stop()
+    get_inference_service().shutdown()
 
 app.include_router(api_router, prefix="")
 
+# async so liveness probes answer on the event loop even when the
+# inference pool is saturated
 @app.get("/health")
-def health():
+async def health():
     return {"status": "ok"}
+
+# readiness, unlike liveness, waits for artifacts: route traffic only after 200
+@app.get("/ready")
+async def ready():
+    if not artifacts_ready():
+        return JSONResponse(status_code=503, content={"status": "loading"})
+    return {"status": "ready", "version": artifact_info()["version"]}
@@ -0,0 +1,281 @@
+# backend/app/metrics.py
+"""
+In-process metrics for the serving hot path, rendered in the Prometheus text
+exposition format by GET /metrics.
+
+Counters and histograms are sharded per thread: a thread only ever writes its
+own shard, so observing takes no lock (the lock is only taken when a new
+thread's shard is registered, and at scrape time to list the shards). Values
+are per process; with INFERENCE_EXECUTOR=process, timings recorded inside the
+worker processes are not visible here.
+
+An opt-in sampler (PREDICT_SLOW_SAMPLE_RATE > 0) records the per-stage
+breakdown of a fraction of scoring calls and keeps the slowest ones for
+GET /metrics/slow.
+"""
+import os
+import heapq
+import random
+import threading
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# fraction of scoring calls whose stage breakdown is sampled (0 = off)
+PREDICT_SLOW_SAMPLE_RATE = float(os.environ.get("PREDICT_SLOW_SAMPLE_RATE", "0"))
+# how many of the slowest sampled calls are kept
+PREDICT_SLOW_KEEP = int(os.environ.get("PREDICT_SLOW_KEEP", "20"))
+
+# seconds, from 10us to 2.5s
+LATENCY_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3,
+                   1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _labels(labels: Optional[Dict[str, str]], extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in (labels or {}).items()]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _fmt(v: float) -> str:
+    return "+Inf" if v == float("inf") else repr(float(v))
+
+
+class _Sharded:
+    """
+    Per-thread value shards; each thread writes only its own list. Shards of
+    threads that have exited are folded into one retired shard, so pools that
+    come and go do not grow the shard list.
+    """
+    def __init__(self, size: int):
+        self._size = size
+        self._local = threading.local()
+        self._shards: List[Tuple[threading.Thread, List[float]]] = []
+        self._retired = [0.0] * size
+        self._lock = threading.Lock()
+
+    def shard(self) -> List[float]:
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = [0.0] * self._size
+            with self._lock:
+                self._fold()
+                self._shards.append((threading.current_thread(), values))
+            return values
+
+    def _fold(self):
+        # called with the lock held; an exited thread writes no more
+        live = []
+        for thread, values in self._shards:
+            if thread.is_alive():
+                live.append((thread, values))
+            else:
+                self._retired = [a + b for a, b in zip(self._retired, values)]
+        self._shards = live
+
+    def totals(self) -> List[float]:
+        with self._lock:
+            self._fold()
+            shards = [values for _, values in self._shards] + [self._retired]
+        return [sum(col) for col in zip(*shards)]
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = _Sharded(1)
+
+    def inc(self, amount: float = 1.0):
+        self._values.shard()[0] += amount
+
+    @property
+    def value(self) -> float:
+        return self._values.totals()[0]
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labels)} {_fmt(self.value)}"]
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets=LATENCY_BUCKETS, labels: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # one slot per bucket, one for +Inf, then the sum
+        self._values = _Sharded(len(self.buckets) + 2)
+
+    def observe(self, value: float):
+        shard = self._values.shard()
+        shard[bisect_left(self.buckets, value)] += 1
+        shard[-1] += value
+
+    def snapshot(self) -> Tuple[List[float], float]:
+        """(non-cumulative counts per bucket incl. +Inf, sum)"""
+        totals = self._values.totals()
+        return totals[:-1], totals[-1]
+
+    def samples(self) -> List[str]:
+        counts, total = self.snapshot()
+        return _histogram_samples(self.name, self.labels, self.buckets, counts, total)
+
+
+def _histogram_samples(name, labels, buckets, counts, total) -> List[str]:
+    lines, running = [], 0.0
+    for bound, count in zip(list(buckets) + [float("inf")], counts):
+        running += count
+        le = f'le="{_fmt(bound)}"'
+        lines.append(f"{name}_bucket{_labels(labels, le)} {_fmt(running)}")
+    lines.append(f"{name}_sum{_labels(labels)} {_fmt(total)}")
+    lines.append(f"{name}_count{_labels(labels)} {_fmt(running)}")
+    return lines
+
+
+class MetricsRegistry:
+    """
+    Metrics grouped into families by name, plus collector callbacks that
+    produce (name, type, help, samples) families at scrape time for state
+    kept elsewhere (cache, batcher, inference pool).
+    """
+    def __init__(self):
+        self._metrics: Dict[str, List[Any]] = {}
+        self._collectors: List[Callable[[], List[Tuple[str, str, str, List[str]]]]] = []
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            self._metrics.setdefault(metric.name, []).append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, **labels) -> Counter:
+        return self._add(Counter(name, help, labels or None))
+
+    def histogram(self, name: str, help: str, buckets=LATENCY_BUCKETS, **labels) -> Histogram:
+        return self._add(Histogram(name, help, buckets, labels or None))
+
+    def collector(self, fn):
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            families = list(self._metrics.items())
+        for name, metrics in families:
+            kind = "histogram" if isinstance(metrics[0], Histogram) else "counter"
+            lines.append(f"# HELP {name} {metrics[0].help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for metric in metrics:
+                lines.extend(metric.samples())
+        for fn in self._collectors:
+            for name, kind, help, samples in fn():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+class SlowRequestSampler:
+    """Keeps the `keep` slowest of a random `rate` fraction of recorded calls."""
+    def __init__(self, rate: float = PREDICT_SLOW_SAMPLE_RATE, keep: int = PREDICT_SLOW_KEEP):
+        self.rate = rate
+        self.keep = keep
+        self._heap: List[Tuple[float, int, Dict[str, Any]]] = []
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def sampled(self) -> bool:
+        return self.rate > 0 and (self.rate >= 1 or random.random() < self.rate)
+
+    def record(self, total: float, entry: Dict[str, Any]):
+        with self._lock:
+            self._seq += 1
+            item = (total, self._seq, entry)
+            if len(self._heap) < self.keep:
+                heapq.heappush(self._heap, item)
+            elif total > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+
+    def slowest(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            items = sorted(self._heap, reverse=True)
+        return [dict(entry, total_ms=total * 1e3) for total, _, entry in items]
+
+    def clear(self):
+        with self._lock:
+            self._heap = []
+
+
+REGISTRY = MetricsRegistry()
+PREDICT_STAGES = ("normalize", "vectorize", "predict_proba", "explain")
+STAGE_SECONDS = {
+    stage: REGISTRY.histogram("predict_stage_seconds", "Time per scoring call spent in each stage.", stage=stage)
+    for stage in PREDICT_STAGES
+}
+PREDICT_ITEMS = REGISTRY.counter("predict_items_total", "Interest strings scored (cache hits included).")
+DICT_FALLBACKS = REGISTRY.counter("predict_dict_vectorizer_fallback_total",
+                                  "Vectorize calls that fell back to token-count dicts (DictVectorizer path).")
+_errors: Dict[str, Counter] = {}
+_errors_lock = threading.Lock()
+slow_requests = SlowRequestSampler()
+
+
+def count_error(endpoint: str, status: int):
+    key = f"{endpoint}:{status}"
+    counter = _errors.get(key)
+    if counter is None:
+        with _errors_lock:
+            counter = _errors.get(key)
+            if counter is None:
+                counter = _errors[key] = REGISTRY.counter(
+                    "predict_errors_total", "Requests that failed, by endpoint and status code.",
+                    endpoint=endpoint, status=str(status))
+    counter.inc()
+
+
+@REGISTRY.collector
+def _serving_state():
+    # state owned by other modules, read at scrape time (imported lazily:
+    # those modules import this one)
+    from app.cache import get_result_cache, get_ocr_cache
+    from app.batching import get_batcher
+    from app import model
+    families = []
+    cache = get_result_cache().stats()
+    for key, help in (("hits", "Result cache hits in this process."),
+                      ("shared_hits", "Result cache hits served by the shared backend."),
+                      ("misses", "Result cache misses.")):
+        families.append((f"predict_cache_{key}_total", "counter", help,
+                         [f"predict_cache_{key}_total {_fmt(cache[key])}"]))
+    families.append(("predict_cache_entries", "gauge", "Entries in the in-process result cache.",
+                     [f"predict_cache_entries {_fmt(cache['size'])}"]))
+    ocr_cache = get_ocr_cache()
+    if ocr_cache is not None:
+        stats = ocr_cache.stats()
+        for key, help in (("hits", "OCR cache hits in this process."),
+                          ("misses", "OCR cache misses (documents recognized)."),
+                          ("coalesced", "Uploads that waited on an identical in-flight OCR run.")):
+            families.append((f"ocr_cache_{key}_total", "counter", help,
+                             [f"ocr_cache_{key}_total {_fmt(stats[key])}"]))
+        families.append(("ocr_cache_bytes", "gauge", "Compressed size of the OCR result cache.",
+                         [f"ocr_cache_bytes {_fmt(stats['bytes'])}"]))
+    service = model._inference_service
+    if service is not None:
+        families.append(("inference_in_flight", "gauge", "Inference jobs running or queued.",
+                         [f"inference_in_flight {_fmt(service.in_flight)}"]))
+        families.append(("inference_capacity", "gauge", "Inference jobs admitted before rejecting with 503.",
+                         [f"inference_capacity {_fmt(service.capacity)}"]))
+    batcher = get_batcher()
+    if batcher is not None:
+        stats = batcher.stats()
+        bounds = [float(b) for b in stats["histogram"]]
+        counts = list(stats["histogram"].values()) + [0]
+        families.append(("predict_batch_size", "histogram", "Items per coalesced /predict batch.",
+                         _histogram_samples("predict_batch_size", None, bounds, counts, stats["items"])))
+    return families
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
@@ -1,30 +1,372 @@
 import os
-import joblib
+import time
+import asyncio
+import threading
 import json
+import hashlib
+import multiprocessing
 import numpy as np
-from typing import Tuple, Dict, Any
-from sklearn.feature_extraction.text import CountVectorizer
+import scipy.sparse as sp
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Tuple, Dict, Any, List, Callable, Optional
+
+from app.cache import get_result_cache
+from app.metrics import STAGE_SECONDS, PREDICT_ITEMS, DICT_FALLBACKS, slow_requests
+from app.artifacts import ARRAYS_DIRNAME, MANIFEST_FILE, FlatForest, has_array_bundle, load_model, linear_link
+from app.vectorizer import FastCountVectorizer
+from app.similarity import CATALOGUE_DIRNAME, load_catalogue
+from app.registry import resolve_artifact_dir, current_version, list_versions, set_current
 
 MODEL_DIR = os.environ.get("MODEL_DIR", "models")
 MODEL_PATH = os.path.join(MODEL_DIR, "model.joblib")
 VECT_PATH = os.path.join(MODEL_DIR, "vectorizer.joblib")
 META_PATH = os.path.join(MODEL_DIR, "meta.json")
 
+# inference pool: "thread" or "process" workers, plus how many requests may
+# wait for a free worker before callers are turned away
+INFERENCE_EXECUTOR = os.environ.get("INFERENCE_EXECUTOR", "thread")
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", os.cpu_count() or 1))
+INFERENCE_QUEUE_SIZE = int(os.environ.get("INFERENCE_QUEUE_SIZE", "64"))
+INFERENCE_RETRY_AFTER = int(os.environ.get("INFERENCE_RETRY_AFTER", "1"))
+
 _model = None
 _vectorizer = None
 _meta = {}
+# identifies the loaded artifacts; part of every result-cache key
+_artifact_version = None
+
+EXPLAIN_TOP_K = 5
+
+# serve models from their memory-mapped array export when one exists
+# (ARTIFACT_MMAP=0 forces the joblib pickle)
+ARTIFACT_MMAP = os.environ.get("ARTIFACT_MMAP", "1").lower() not in ("0", "false", "no")
+# a flat forest export wins on small batches only (200 trees, 1 core: 5.9ms vs
+# 10.2ms at 64 rows, 94ms vs 28ms at 1024); larger batches go to the pickle
+FLAT_FOREST_MAX_ROWS = int(os.environ.get("FLAT_FOREST_MAX_ROWS", "64"))
+
+# re-check the registry's CURRENT pointer every N seconds. Every worker runs
+# its own watcher, which is how a promote reaches the pre-fork workers (app/serve.py):
+# with 0 (no watcher) /admin/reload only swaps the worker that served it
+MODEL_WATCH_INTERVAL = float(os.environ.get("MODEL_WATCH_INTERVAL", "5"))
+
+def _artifact_fingerprint(path: str = MODEL_DIR) -> str:
+    """Stable across worker processes: derived from the artifact files' stat info."""
+    h = hashlib.sha1()
+    for name in ("model.joblib", "vectorizer.joblib", "meta.json", os.path.join(ARRAYS_DIRNAME, MANIFEST_FILE),
+                 os.path.join(CATALOGUE_DIRNAME, MANIFEST_FILE)):
+        fp = os.path.join(path, name)
+        if os.path.exists(fp):
+            st = os.stat(fp)
+            h.update(f"{os.path.abspath(fp)}:{st.st_mtime_ns}:{st.st_size};".encode())
+    return h.hexdigest()[:16]
+
+class LinearEngine:
+    """
+    Direct scorer for linear classifiers (logistic regression, SGD log-loss,
+    or their array exports). Scores are gathered from a feature-major view
+    of coef_ (one row per token) straight from CSR indices, without
+    sklearn's input validation; an array export already stores coef_ that
+    way, so its memmap is used in place rather than copied into every worker.
+    The per-token products are the coef contributions the explanation needs,
+    so both come out of the same pass.
+    """
+    def __init__(self, coef: np.ndarray, intercept: np.ndarray, classes, link: str):
+        coef = np.asarray(coef, dtype=np.float64)
+        self.n_features = coef.shape[1]
+        # (n_features, n_outputs): a no-op for exports, a one-off copy for a pickled model
+        self.weights = np.ascontiguousarray(coef.T)
+        self.bias = np.asarray(intercept, dtype=np.float64)
+        self.classes = np.asarray(classes)
+        self.link = link
+
+    @classmethod
+    def from_model(cls, model) -> Optional["LinearEngine"]:
+        if not all(hasattr(model, a) for a in ("coef_", "intercept_", "classes_", "predict_proba")):
+            return None
+        link = getattr(model, "link", None) or linear_link(model)
+        return cls(model.coef_, model.intercept_, model.classes_, link)
+
+    def score(self, X) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return (probabilities, contributions) for a CSR matrix X, where
+        contributions[j] are the per-output products for X.data[j].
+        """
+        if X.shape[1] != self.n_features:
+            # a mismatched vectorizer would otherwise index the wrong weights
+            raise ValueError(f"X has {X.shape[1]} features, but LinearEngine is expecting "
+                             f"{self.n_features} features as input")
+        indptr, data = X.indptr, X.data
+        contrib = self.weights[X.indices] * data[:, None]
+        n = len(indptr) - 1
+        if n == 1:
+            scores = contrib.sum(axis=0, keepdims=True)
+        else:
+            # segment sums over the non-empty rows; empty rows score bias only
+            scores = np.zeros((n, self.weights.shape[1]))
+            nonempty = indptr[:-1] < indptr[1:]
+            if len(data):
+                scores[nonempty] = np.add.reduceat(contrib, indptr[:-1][nonempty], axis=0)
+        scores += self.bias
+        return self._link(scores), contrib
+
+    def _link(self, scores: np.ndarray) -> np.ndarray:
+        if self.link == "softmax":
+            scores -= scores.max(axis=1, keepdims=True)
+            np.exp(scores, out=scores)
+            scores /= scores.sum(axis=1, keepdims=True)
+            return scores
+        prob = 1.0 / (1.0 + np.exp(-2.0 * scores if self.link == "softmax2" else -scores))
+        if prob.shape[1] == 1:
+            return np.hstack([1.0 - prob, prob])
+        return prob / prob.sum(axis=1, keepdims=True)
+
+class ClassIndex:
+    """
+    Class-name lookups and boolean filter masks, built once per bundle from
+    meta["classes"] (and the optional meta["segments"]: segment name -> list
+    of class names) so ranking filters are vector ops, not Python loops.
+    """
+    def __init__(self, classes: List[str], segments: Optional[Dict[str, List[str]]] = None):
+        self.classes = list(classes)
+        self.position = {c: i for i, c in enumerate(self.classes)}
+        self.segments = {}
+        for name, members in (segments or {}).items():
+            mask = np.zeros(len(self.classes), dtype=bool)
+            mask[[self.position[c] for c in members if c in self.position]] = True
+            self.segments[name] = mask
+
+    def _positions(self, names: List[str]) -> List[int]:
+        return [self.position[c] for c in names if c in self.position]
+
+    def mask(self, exclude: Optional[List[str]] = None, include: Optional[List[str]] = None,
+             segments: Optional[List[str]] = None) -> np.ndarray:
+        """
+        Allowed classes: those in `include` or any of `segments` (everything
+        when neither is given), minus `exclude`. Unknown class names are
+        ignored; unknown segments raise ValueError.
+        """
+        if include or segments:
+            allowed = np.zeros(len(self.classes), dtype=bool)
+            allowed[self._positions(include or [])] = True
+            for name in segments or []:
+                if name not in self.segments:
+                    raise ValueError(f"Unknown catalogue segment: {name!r}")
+                allowed |= self.segments[name]
+        else:
+            allowed = np.ones(len(self.classes), dtype=bool)
+        if exclude:
+            allowed[self._positions(exclude)] = False
+        return allowed
+
+    @staticmethod
+    def top_k(probs: np.ndarray, k: int, allowed: np.ndarray) -> np.ndarray:
+        """Indices of the k most probable allowed classes, best first."""
+        k = min(k, int(allowed.sum()))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        scores = np.where(allowed, probs, -np.inf)
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        return top[np.lexsort((top, -scores[top]))][:k]
 
-def load_artifacts():
-    global _model, _vectorizer, _meta
-    if _model is None:
-        if os.path.exists(MODEL_PATH):
-            _model = joblib.load(MODEL_PATH)
-    if _vectorizer is None:
-        if os.path.exists(VECT_PATH):
-            _vectorizer = joblib.load(VECT_PATH)
-    if os.path.exists(META_PATH):
-        with open(META_PATH, "r") as f:
-            _meta = json.load(f)
+class ArtifactBundle:
+    """
+    One loaded set of artifacts (model, vectorizer, meta) plus everything
+    derived from them at load time. Bundles are never mutated after loading;
+    requests grab the active bundle once, so a concurrent swap cannot mix
+    versions within a request.
+    """
+    def __init__(self, path: str, name: Optional[str] = None):
+        # joblib (and sklearn, via unpickling) only load when artifacts do
+        import joblib
+        self.path = path
+        self.name = name
+        self.model = None
+        self.vectorizer = None
+        self.meta = {}
+        model_path = os.path.join(path, "model.joblib")
+        vect_path = os.path.join(path, "vectorizer.joblib")
+        meta_path = os.path.join(path, "meta.json")
+        arrays_path = os.path.join(path, ARRAYS_DIRNAME)
+        # compact exports ship without a pickle: their arrays are read even with ARTIFACT_MMAP off
+        if has_array_bundle(arrays_path) and (ARTIFACT_MMAP or not os.path.exists(model_path)):
+            # read-only memmaps: workers share the model through the page cache
+            try:
+                self.model = load_model(arrays_path, mmap_mode="r" if ARTIFACT_MMAP else None)
+            except (ValueError, KeyError) as e:
+                # e.g. an export from an older format version; the pickle still works
+                print(f"Ignoring array export in {arrays_path}: {e}")
+        if self.model is None and os.path.exists(model_path):
+            self.model = joblib.load(model_path, mmap_mode="r" if ARTIFACT_MMAP else None)
+        # sklearn forest for large batches, loaded on first use (compact exports have none)
+        self._forest_path = model_path if isinstance(self.model, FlatForest) and os.path.exists(model_path) else None
+        self._forest = None
+        self._forest_lock = threading.Lock()
+        if os.path.exists(vect_path):
+            self.vectorizer = joblib.load(vect_path)
+        if os.path.exists(meta_path):
+            with open(meta_path, "r") as f:
+                self.meta = json.load(f)
+        fingerprint = _artifact_fingerprint(path)
+        self.version = f"{name}-{fingerprint}" if name else fingerprint
+        self.linear = LinearEngine.from_model(self.model) if self.model is not None else None
+        self.fast_vectorizer = FastCountVectorizer.from_vectorizer(self.vectorizer) if self.vectorizer is not None else None
+        classes = self.meta.get("classes") or [str(c) for c in getattr(self.model, "classes_", [])]
+        self.class_index = ClassIndex(classes, self.meta.get("segments"))
+        try:
+            self.catalogue = load_catalogue(path)
+        except (ValueError, KeyError) as e:
+            print(f"Ignoring catalogue index in {path}: {e}")
+            self.catalogue = None
+        self._prepare_explainer()
+
+    @property
+    def ready(self) -> bool:
+        return self.model is not None and self.vectorizer is not None
+
+    def predict_proba(self, X):
+        """model.predict_proba, except flat forest batches past FLAT_FOREST_MAX_ROWS run on the sklearn pickle."""
+        if self._forest_path is None or X.shape[0] <= FLAT_FOREST_MAX_ROWS:
+            return self.model.predict_proba(X)
+        if self._forest is None:
+            import joblib
+            with self._forest_lock:
+                if self._forest is None:
+                    self._forest = joblib.load(self._forest_path, mmap_mode="r")
+        return self._forest.predict_proba(X)
+
+    def _prepare_explainer(self):
+        # explanation arrays, precomputed once per load so requests never
+        # touch the full vocabulary
+        self.feature_names = None
+        self.importances = None
+        self.coefs = None
+        if self.vectorizer is not None and hasattr(self.vectorizer, "get_feature_names_out"):
+            try:
+                self.feature_names = np.asarray(self.vectorizer.get_feature_names_out(), dtype=object)
+            except Exception:
+                self.feature_names = None
+        # vocabulary terms grouped by word count, for matching skills in free
+        # text; lone stop words ("and", "with") are vocabulary but not skills
+        self.skill_terms: Dict[int, set] = {}
+        if self.feature_names is not None:
+            from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+            for term in self.feature_names:
+                words = str(term).split()
+                if words and not (len(words) == 1 and words[0] in ENGLISH_STOP_WORDS):
+                    self.skill_terms.setdefault(len(words), set()).add(" ".join(words))
+        # a hashing vectorizer has no names to report tokens by, so nothing to explain with
+        if self.model is not None and self.feature_names is not None:
+            if hasattr(self.model, "feature_importances_"):
+                self.importances = np.asarray(self.model.feature_importances_, dtype=np.float64)
+            elif hasattr(self.model, "coef_"):
+                self.coefs = np.asarray(self.model.coef_, dtype=np.float64)
+
+_active: Optional[ArtifactBundle] = None
+_swap_lock = threading.Lock()
+
+def _activate(bundle: ArtifactBundle) -> Optional[ArtifactBundle]:
+    """Swap in a loaded bundle; returns the one it replaced."""
+    global _active, _model, _vectorizer, _meta, _artifact_version
+    with _swap_lock:
+        previous = _active
+        # a single reference assignment: readers see either bundle, never a mix
+        _active = bundle
+        _model, _vectorizer, _meta = bundle.model, bundle.vectorizer, bundle.meta
+        if bundle.version != _artifact_version:
+            # results computed by the previous artifacts must not be served again
+            get_result_cache().clear()
+            _artifact_version = bundle.version
+    if previous is not None and previous.version != bundle.version and _inference_service is not None \
+            and _inference_service.executor == "process":
+        # process workers hold their own copy; recycle them onto the new version
+        # (threads read _active, so a thread pool is kept)
+        _inference_service.recycle()
+    return previous
+
+def load_artifacts(warm: bool = False, model_dir: Optional[str] = None):
+    """
+    Load the current artifacts if none are loaded yet (idempotent). With
+    `warm`, one throwaway prediction runs first so lazy imports and first-call
+    setup are paid before the bundle starts taking traffic. `model_dir`
+    (registry or flat layout) overrides MODEL_DIR.
+    """
+    name, path = resolve_artifact_dir(model_dir or MODEL_DIR)
+    if _active is not None and _model is not None and _vectorizer is not None \
+            and (model_dir is None or _active.path == path):
+        return
+    bundle = ArtifactBundle(path, name)
+    if warm and bundle.ready:
+        _score(bundle, [""])
+    _activate(bundle)
+
+def artifacts_ready() -> bool:
+    return _active is not None and _active.ready
+
+def reload_artifacts(version: Optional[str] = None, promote: bool = False, warm: bool = True) -> Dict[str, Any]:
+    """
+    Load `version` (default: whatever CURRENT points at) next to the active
+    bundle, warm it with a throwaway prediction, then swap it in. Requests
+    already running finish on the bundle they started with. With `promote`,
+    CURRENT is moved to the version first so watching workers follow.
+    """
+    name, path = resolve_artifact_dir(MODEL_DIR, version)
+    bundle = ArtifactBundle(path, name)
+    if not bundle.ready:
+        raise RuntimeError(f"Model artifacts incomplete in {path}")
+    if warm:
+        _score(bundle, [""])
+    if promote and name is not None:
+        set_current(MODEL_DIR, name)
+    previous = _activate(bundle)
+    return {
+        "previous": previous.version if previous is not None else None,
+        "current": bundle.version,
+        "name": bundle.name,
+    }
+
+def artifact_info() -> Dict[str, Any]:
+    art = _active
+    return {
+        "version": art.version if art is not None else None,
+        "name": art.name if art is not None else None,
+        "path": os.path.abspath(art.path) if art is not None else None,
+        "current_pointer": current_version(MODEL_DIR),
+        "available": list_versions(MODEL_DIR),
+    }
+
+class ArtifactWatcher:
+    """Background thread that follows the registry's CURRENT pointer."""
+    def __init__(self, interval: float = MODEL_WATCH_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="artifact-watcher", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            pointer = current_version(MODEL_DIR)
+            art = _active
+            if pointer is None or (art is not None and art.name == pointer):
+                continue
+            try:
+                reload_artifacts(pointer)
+            except Exception as e:
+                # keep serving the old version; try again on the next tick
+                print(f"artifact watcher: failed to load {pointer!r}: {e!r}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
 
 def _normalize_interests(text: str) -> str:
     # basic normalization: lowercase, remove duplicates, strip
@@ -33,111 +375,333 @@ def _normalize_interests(text: str) -> str:
     unique = list(dict.fromkeys(toks))
     return " ".join(unique)
 
-def predict_from_interests(interests_text: str) -> Tuple[str, float, Dict[str, Any]]:
-    global _model, _vectorizer, _meta
-    if _model is None or _vectorizer is None:
-        raise RuntimeError("Model artifacts not loaded. Run training script to generate models.")
-
-    # Normalize input to a predictable form (space-separated tokens)
-    norm = _normalize_interests(interests_text)
-
-    # Try transforming as text first (CountVectorizer case).
-    # If that fails (e.g. DictVectorizer expects dicts), build a token->count dict and retry.
-    X = None
+def _vectorize(art: ArtifactBundle, norms: List[str]):
+    """
+    Vectorize a list of normalized interest strings in a single transform call.
+    Plain CountVectorizers go through the dict-based serving vectorizer;
+    otherwise tries the text form first and falls back to token->count dicts
+    for mapping-based vectorizers (DictVectorizer).
+    """
+    if art.fast_vectorizer is not None:
+        return art.fast_vectorizer.transform(norms)
     try:
-        X = _vectorizer.transform([norm])
+        return art.vectorizer.transform(norms)
     except Exception as e:
         # fallback: vectorizer probably expects mapping-like inputs (DictVectorizer)
+        DICT_FALLBACKS.inc()
         try:
-            # build token->count dict from normalized string
-            tokens = [t.strip() for t in norm.split() if t.strip()]
-            feature_dict = {}
-            for t in tokens:
-                feature_dict[t] = feature_dict.get(t, 0) + 1
-            # try again with dict (list-of-dicts)
-            X = _vectorizer.transform([feature_dict])
+            feature_dicts = []
+            for norm in norms:
+                # build token->count dict from normalized string
+                tokens = [t.strip() for t in norm.split() if t.strip()]
+                feature_dict = {}
+                for t in tokens:
+                    feature_dict[t] = feature_dict.get(t, 0) + 1
+                feature_dicts.append(feature_dict)
+            # try again with dicts (list-of-dicts)
+            return art.vectorizer.transform(feature_dicts)
         except Exception as e2:
             # both attempts failed — raise original error with context
             raise RuntimeError(f"Vectorizer transform failed for both text and dict forms. "
                                f"First error: {e!r}; Fallback error: {e2!r}")
 
-    # Proceed with prediction as before
-    try:
-        probs = _model.predict_proba(X)[0]
-    except Exception as e:
-        raise RuntimeError(f"Model predict_proba failed: {e}")
-
-    # pick predicted class
-    idx = int(np.argmax(probs))
-    course = _meta.get("classes", [])[idx] if _meta.get("classes") else str(idx)
-    prob = float(probs[idx])
+def _top_k(scores: np.ndarray, cols: np.ndarray, k: int) -> np.ndarray:
+    """
+    Positions of the k largest scores, best first. Uses argpartition so the
+    cost is linear in the number of present tokens; ties keep vocabulary order.
+    """
+    if len(scores) > k:
+        part = np.argpartition(-scores, k - 1)[:k]
+    else:
+        part = np.arange(len(scores))
+    return part[np.lexsort((cols[part], -scores[part]))]
 
-    # build explanation (same logic as before)
+def _explain(art: ArtifactBundle, X, row: int, idx: int, contrib: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    """
+    Build the explanation dict for one row of the CSR matrix X, looking only
+    at that row's non-zero entries. `contrib` holds per-entry coef products
+    when the linear engine already computed them.
+    """
     explanation = {}
     try:
-        if hasattr(_model, "feature_importances_"):
-            importances = _model.feature_importances_
-            tokens = _vectorizer.get_feature_names_out()
-            present = X.toarray()[0]
-            contribs = {}
-            for tok, pres, imp in zip(tokens, present, importances):
-                if pres:
-                    contribs[tok] = float(imp)
-            top = dict(sorted(contribs.items(), key=lambda x: x[1], reverse=True)[:5])
-            explanation = {"method": "feature_importances", "top_contributing_tokens": top}
-        elif hasattr(_model, "coef_"):
-            tokens = _vectorizer.get_feature_names_out()
-            coefs = _model.coef_[idx]
-            present = X.toarray()[0]
-            contribs = {}
-            for tok, pres, c in zip(tokens, present, coefs):
-                if pres:
-                    contribs[tok] = float(c * pres)
-            top = dict(sorted(contribs.items(), key=lambda x: abs(x[1]), reverse=True)[:5])
-            explanation = {"method": "coef_contributions", "top_contributing_tokens": top}
+        if art.feature_names is None:
+            return {"method": "none", "note": "No explanation available: the vectorizer has no feature names."}
+        if art.importances is None and art.coefs is None:
+            return {"method": "none", "note": "No explanation available for this model type."}
+        start, end = X.indptr[row], X.indptr[row + 1]
+        cols = X.indices[start:end]
+        vals = X.data[start:end]
+        present = vals != 0
+        cols, vals = cols[present], vals[present]
+        if art.importances is not None:
+            contribs = art.importances[cols]
+            order = _top_k(contribs, cols, EXPLAIN_TOP_K)
+            method = "feature_importances"
         else:
-            explanation = {"method": "none", "note": "No explanation available for this model type."}
+            if contrib is not None:
+                per_class = contrib[start:end][present]
+            else:
+                per_class = art.coefs.T[cols] * vals[:, None]
+            # binary linear models keep a single coef row for the positive class
+            if per_class.shape[1] > 1:
+                contribs = per_class[:, idx]
+            else:
+                contribs = per_class[:, 0] if idx == 1 else -per_class[:, 0]
+            order = _top_k(np.abs(contribs), cols, EXPLAIN_TOP_K)
+            method = "coef_contributions"
+        top = {str(art.feature_names[c]): float(v) for c, v in zip(cols[order], contribs[order])}
+        explanation = {"method": method, "top_contributing_tokens": top}
     except Exception:
         explanation = {"method": "error", "note": "Failed to produce explanation."}
+    return explanation
 
-    return course, prob, explanation
+def predict_batch_from_interests(interests_texts: List[str]) -> List[Tuple[str, float, Dict[str, Any]]]:
+    """
+    Score many interest strings at once: one vectorizer transform and one
+    predict_proba over the whole sparse matrix, then per-item results in
+    input order. Results are cached per normalized input and artifact version,
+    so only cache misses reach the model.
+    """
+    art = _active
+    if art is None or not art.ready:
+        raise RuntimeError("Model artifacts not loaded. Run training script to generate models.")
+    if not interests_texts:
+        return []
 
+    # stage breakdown of this call, only when the slow-request sampler picks it
+    timings = {} if slow_requests.sampled() else None
+    start = time.perf_counter()
+    # Normalize inputs to a predictable form (space-separated tokens)
+    norms = [_normalize_interests(t) for t in interests_texts]
+    _observe("normalize", time.perf_counter() - start, timings)
+    PREDICT_ITEMS.inc(len(norms))
+    cache = get_result_cache()
+    if not cache.enabled:
+        results = _score(art, norms, timings)
+        scored = len(norms)
+    else:
+        version = art.version
+        results = [cache.get(f"{version}:{norm}") for norm in norms]
+        misses = [i for i, r in enumerate(results) if r is None]
+        if misses:
+            for i, result in zip(misses, _score(art, [norms[i] for i in misses], timings)):
+                cache.put(f"{version}:{norms[i]}", result)
+                results[i] = result
+        scored = len(misses)
+    if timings is not None:
+        slow_requests.record(time.perf_counter() - start, {
+            "version": art.version, "items": len(norms), "scored": scored,
+            "stages_ms": timings, "inputs": norms[:3],
+        })
+    return results
 
+def _observe(stage: str, seconds: float, timings: Optional[Dict[str, float]] = None):
+    STAGE_SECONDS[stage].observe(seconds)
+    if timings is not None:
+        timings[stage] = seconds * 1e3
 
+def _predict_proba(art: ArtifactBundle, norms: List[str], timings: Optional[Dict[str, float]] = None):
+    """Return (CSR X, probabilities, linear contributions or None) for normalized inputs."""
+    t0 = time.perf_counter()
+    X = _vectorize(art, norms)
+    # explanations walk CSR rows directly (DictVectorizer(sparse=False) gives ndarray)
+    X = X.tocsr() if sp.issparse(X) else sp.csr_matrix(X)
+    t1 = time.perf_counter()
+    _observe("vectorize", t1 - t0, timings)
 
-# backend/debug_artifacts.py
-import json, os
-from app import model as M
+    contrib = None
+    try:
+        if art.linear is not None:
+            probs, contrib = art.linear.score(X)
+        else:
+            probs = art.predict_proba(X)
+    except Exception as e:
+        raise RuntimeError(f"Model predict_proba failed: {e}")
+    _observe("predict_proba", time.perf_counter() - t1, timings)
+    return X, probs, contrib
 
-print("MODEL_PATH:", os.path.abspath(M.MODEL_PATH))
-print("VECT_PATH:", os.path.abspath(M.VECT_PATH))
-print("META_PATH:", os.path.abspath(M.META_PATH))
+def _score(art: ArtifactBundle, norms: List[str],
+           timings: Optional[Dict[str, float]] = None) -> List[Tuple[str, float, Dict[str, Any]]]:
+    """Vectorize, predict and explain already-normalized inputs with one bundle."""
+    X, probs, contrib = _predict_proba(art, norms, timings)
+    t0 = time.perf_counter()
+    classes = art.meta.get("classes") or []
+    results = []
+    for i, idx in enumerate(np.argmax(probs, axis=1)):
+        idx = int(idx)
+        course = classes[idx] if classes else str(idx)
+        prob = float(probs[i, idx])
+        results.append((course, prob, _explain(art, X, i, idx, contrib)))
+    _observe("explain", time.perf_counter() - t0, timings)
+    return results
 
-print("_model type:", type(M._model))
-print("_vectorizer type:", type(M._vectorizer))
-print("_meta keys:", list(M._meta.keys()))
+def predict_labels_from_interests(interests_texts: List[str]) -> List[Tuple[str, float]]:
+    """
+    (course, probability) of the top course per input, for bulk scoring:
+    no explanations and no result cache.
+    """
+    art = _active
+    if art is None or not art.ready:
+        raise RuntimeError("Model artifacts not loaded. Run training script to generate models.")
+    if not interests_texts:
+        return []
+    _, probs, _ = _predict_proba(art, [_normalize_interests(t) for t in interests_texts])
+    idx = np.argmax(probs, axis=1)
+    classes = art.meta.get("classes") or [str(i) for i in range(probs.shape[1])]
+    names = np.asarray(classes, dtype=object)[idx]
+    return list(zip(names.tolist(), probs[np.arange(len(idx)), idx].tolist()))
 
-# feature info
-try:
-    feat_names = M._vectorizer.get_feature_names_out()
-    print("vectorizer feature count:", len(feat_names))
-    print("vectorizer features:", list(feat_names))
-except Exception as e:
-    print("vectorizer.get_feature_names_out() error:", e)
-    try:
-        print("vectorizer.vocabulary_.size:", len(getattr(M._vectorizer, "vocabulary_", {})))
-    except Exception:
-        pass
-
-# model coef info
-try:
-    if hasattr(M._model, "coef_"):
-        print("model.coef_.shape:", M._model.coef_.shape)
-    if hasattr(M._model, "classes_"):
-        print("model.classes_:", list(M._model.classes_))
-    print("model type repr:", repr(M._model))
-except Exception as e:
-    print("model info error:", e)
-
-# Look for stored feature names in meta
-print("meta content (first 200 chars):", json.dumps(M._meta)[:200])
+def predict_from_interests(interests_text: str) -> Tuple[str, float, Dict[str, Any]]:
+    return predict_batch_from_interests([interests_text])[0]
+
+def similar_courses(interests_text: str, k: int = 5) -> List[Tuple[str, float]]:
+    """
+    Top-k catalogue courses by cosine similarity between the interests and
+    the course descriptions; works for courses the classifier has no label for.
+    """
+    art = _active
+    if art is None or art.catalogue is None:
+        raise LookupError("No course catalogue index loaded. Run create_course_artifacts.py to build one.")
+    return art.catalogue.search(_normalize_interests(interests_text), k)
+
+def skills_from_text(text: str) -> List[str]:
+    """
+    Vocabulary terms (single- or multi-word) found in free text such as an
+    OCR'd transcript, in order of first appearance, so a document can be
+    scored like a typed interest list.
+    """
+    art = _active
+    if art is None or not art.ready:
+        raise RuntimeError("Model artifacts not loaded. Run training script to generate models.")
+    words = [w for w in (t.strip(".,;:()[]{}'\"!?") for t in text.lower().split()) if w]
+    found: Dict[str, int] = {}
+    for n, terms in art.skill_terms.items():
+        for i in range(len(words) - n + 1):
+            gram = " ".join(words[i:i + n])
+            if gram in terms and gram not in found:
+                found[gram] = i
+    return sorted(found, key=lambda g: (found[g], -len(g)))
+
+def recommend_from_interests(interests_text: str, k: int = 5, exclude: Optional[List[str]] = None,
+                             include: Optional[List[str]] = None,
+                             segments: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Rank the top-k courses for one learner from a single predict_proba row,
+    honouring exclusion (e.g. courses already taken) and inclusion filters
+    (explicit courses or catalogue segments). The explanation is for the
+    top-ranked course.
+    """
+    art = _active
+    if art is None or not art.ready:
+        raise RuntimeError("Model artifacts not loaded. Run training script to generate models.")
+    allowed = art.class_index.mask(exclude=exclude, include=include, segments=segments)
+    X, probs, contrib = _predict_proba(art, [_normalize_interests(interests_text)])
+    row = probs[0]
+    top = art.class_index.top_k(row, k, allowed)
+    classes = art.class_index.classes
+    recommendations = [{"course": classes[i], "probability": float(row[i])} for i in top]
+    explanation = _explain(art, X, 0, int(top[0]), contrib) if len(top) else \
+        {"method": "none", "note": "No course matches the requested filters."}
+    return {"recommendations": recommendations, "explanation": explanation}
+
+# ------------ Async inference service ------------
+class InferenceQueueFull(RuntimeError):
+    """Raised when every worker is busy and the wait queue is full."""
+    def __init__(self, retry_after: int):
+        super().__init__("Inference queue is full, retry later.")
+        self.retry_after = retry_after
+
+def _init_process_worker(path: Optional[str] = None, name: Optional[str] = None):
+    # process workers load their own artifacts once at spawn: the parent's
+    # active bundle, which need not be the one CURRENT points at
+    if path is None:
+        load_artifacts()
+    else:
+        _activate(ArtifactBundle(path, name))
+
+class InferenceService:
+    """
+    Runs CPU-bound prediction work on a dedicated, bounded worker pool so the
+    event loop stays free. At most `workers` jobs run at once and at most
+    `queue_size` more wait; anything beyond that fails fast with
+    InferenceQueueFull instead of piling up.
+    """
+    def __init__(self, workers: int = INFERENCE_WORKERS, queue_size: int = INFERENCE_QUEUE_SIZE,
+                 executor: str = INFERENCE_EXECUTOR, retry_after: int = INFERENCE_RETRY_AFTER):
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown inference executor: {executor!r}")
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self.executor = executor
+        self.retry_after = retry_after
+        self._pool = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_size
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                if self.executor == "process":
+                    # not fork: the server's other threads may hold locks the child would inherit
+                    methods = multiprocessing.get_all_start_methods()
+                    context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+                    art = _active
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=context, initializer=_init_process_worker,
+                        initargs=(os.path.abspath(art.path), art.name) if art is not None else ())
+                else:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+            return self._pool
+
+    def _acquire(self) -> bool:
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                return False
+            self._in_flight += 1
+            return True
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._in_flight -= 1
+
+    async def submit(self, fn: Callable, *args):
+        """Run fn(*args) on the pool; raises InferenceQueueFull when saturated."""
+        if not self._acquire():
+            raise InferenceQueueFull(self.retry_after)
+        try:
+            future = self._get_pool().submit(fn, *args)
+        except Exception:
+            self._release()
+            raise
+        # the slot is freed when the job finishes, even if the caller went away
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def recycle(self):
+        """Replace the pool; jobs already running finish on the old one."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+_inference_service: Optional[InferenceService] = None
+
+def get_inference_service() -> InferenceService:
+    global _inference_service
+    if _inference_service is None:
+        _inference_service = InferenceService()
+    return _inference_service
@@ -1,8 +1,27 @@
-from PIL import Image
+# backend/app/ocr.py
+import io
+import os
+import hashlib
+import functools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from PIL import Image, ImageSequence
 import numpy as np
 import cv2
 import pytesseract
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, List, Optional, Sequence, Tuple, Union
+
+from app.cache import OCRResultCache, get_ocr_cache
+
+# page-level OCR pool: "process" (Tesseract's own work plus our preprocessing
+# run outside the GIL) or "thread"; at most OCR_WORKERS pages run at once
+OCR_EXECUTOR = os.environ.get("OCR_EXECUTOR", "process")
+OCR_WORKERS = int(os.environ.get("OCR_WORKERS", min(4, os.cpu_count() or 1)))
+# resolution pages are scaled to by the "resize" preprocessing step
+OCR_TARGET_DPI = int(os.environ.get("OCR_TARGET_DPI", "300"))
+# bump when the cached result format or the preprocessing output changes
+OCR_RESULT_VERSION = 2
 
 def pil_to_cv2(image: Image.Image) -> np.ndarray:
     return cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
@@ -33,31 +52,312 @@ def preprocess_image(image: Image.Image, method: str = "none") -> Image.Image:
     # unknown method -> return original
     return Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
 
-def run_ocr(image: Image.Image) -> Dict[str, Any]:
+PREPROCESS_STEPS = ("grayscale", "resize", "denoise", "deskew", "binarize")
+
+def parse_steps(preprocess: Union[str, Sequence[str], None]) -> Tuple[str, ...]:
     """
-    Runs Tesseract OCR and returns:
-    - text: full text
-    - words: list of {text,left,top,width,height,conf}
+    "none", a single step or a comma-separated list ("resize,deskew,binarize")
+    as a tuple of steps; ValueError for unknown steps.
+    """
+    if preprocess is None:
+        return ()
+    if isinstance(preprocess, str):
+        preprocess = preprocess.split(",")
+    steps = tuple(s.strip() for s in preprocess if s.strip() and s.strip() != "none")
+    unknown = [s for s in steps if s not in PREPROCESS_STEPS]
+    if unknown:
+        raise ValueError(f"Unknown preprocessing step(s) {unknown}; choose from {list(PREPROCESS_STEPS)}")
+    return steps
+
+def _deskew_angle(gray: np.ndarray) -> float:
+    # rotation (degrees, for getRotationMatrix2D) that levels the ink (dark) pixels
+    ink = cv2.findNonZero(cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1])
+    if ink is None or len(ink) < 10:
+        return 0.0
+    angle = cv2.minAreaRect(ink)[-1]
+    # minAreaRect reports (0, 90]; take the smaller rotation to an axis
+    return angle - 90.0 if angle > 45.0 else angle
+
+def preprocess_array(page: np.ndarray, steps: Sequence[str] = (), dpi: Optional[float] = None,
+                     target_dpi: int = OCR_TARGET_DPI) -> np.ndarray:
+    """
+    Apply preprocessing steps, in the given order, to one page array (RGB or
+    already single-channel) and return what Tesseract should read. Without
+    steps the page is returned untouched. Otherwise it is converted to
+    grayscale exactly once (not at all for single-channel input, see
+    iter_pages), threshold and median blur run in place (so a writable
+    single-channel input is modified), and only resize and deskew allocate
+    a new buffer. A read-only input is never copied up front: the first step
+    that would write to it gets a new output buffer instead.
     """
-    # Convert to RGB bytes for pytesseract
-    img = image
-    # full text
-    text = pytesseract.image_to_string(img)
-    # word-level data
-    data = pytesseract.image_to_data(img, output_type=pytesseract.Output.DICT)
+    if not steps:
+        return page
+    gray = page if page.ndim == 2 else cv2.cvtColor(page, cv2.COLOR_RGB2GRAY)
+    for step in steps:
+        if step == "resize":
+            if dpi and abs(dpi - target_dpi) > 1:
+                scale = target_dpi / float(dpi)
+                gray = cv2.resize(gray, None, fx=scale, fy=scale,
+                                  interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC)
+        elif step == "denoise":
+            gray = cv2.medianBlur(gray, 3, dst=gray if gray.flags.writeable else None)
+        elif step == "binarize":
+            gray = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU,
+                                 dst=gray if gray.flags.writeable else None)[1]
+        elif step == "deskew":
+            angle = _deskew_angle(gray)
+            if abs(angle) >= 0.1:
+                h, w = gray.shape
+                rotation = cv2.getRotationMatrix2D((w / 2.0, h / 2.0), angle, 1.0)
+                gray = cv2.warpAffine(gray, rotation, (w, h), flags=cv2.INTER_LINEAR,
+                                      borderMode=cv2.BORDER_CONSTANT, borderValue=255)
+    return gray
+
+def _conf(value) -> int:
+    return int(float(value)) if value not in (None, "", "-1") else -1
+
+def words_from_data(data: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """Non-empty words of an image_to_data dict as {text,left,top,width,height,conf}."""
     words = []
     n = len(data.get("text", []))
     for i in range(n):
         w = data["text"][i].strip()
         if not w:
             continue
-        conf = int(float(data["conf"][i])) if data["conf"][i] not in (None, "", "-1") else -1
         words.append({
             "text": w,
             "left": int(data["left"][i]),
             "top": int(data["top"][i]),
             "width": int(data["width"][i]),
             "height": int(data["height"][i]),
-            "conf": conf
+            "conf": _conf(data["conf"][i])
         })
-    return {"text": text, "words": words}
\ No newline at end of file
+    return words
+
+def text_from_data(data: Dict[str, List[Any]]) -> str:
+    """
+    Rebuild the page text from image_to_data's word rows the way
+    image_to_string lays it out: words of a line joined by spaces, lines by
+    newlines, and a blank line between paragraphs/blocks.
+    """
+    paragraphs: List[List[str]] = []
+    lines: Dict[Any, List[str]] = {}
+    last_par = None
+    for i, raw in enumerate(data.get("text", [])):
+        w = raw.strip()
+        if not w:
+            continue
+        par = (data["page_num"][i], data["block_num"][i], data["par_num"][i])
+        if par != last_par:
+            paragraphs.append([])
+            last_par = par
+        key = par + (data["line_num"][i],)
+        if key not in lines:
+            lines[key] = []
+            paragraphs[-1].append(key)
+        lines[key].append(w)
+    return "\n\n".join("\n".join(" ".join(lines[k]) for k in keys) for keys in paragraphs)
+
+def run_ocr(image: Union[Image.Image, np.ndarray], lang: Optional[str] = None, config: str = "") -> Dict[str, Any]:
+    """
+    Runs Tesseract OCR once and returns:
+    - text: full text, rebuilt from the word data
+    - words: list of {text,left,top,width,height,conf}
+    """
+    kwargs = {"lang": lang} if lang else {}
+    data = pytesseract.image_to_data(image, config=config, output_type=pytesseract.Output.DICT, **kwargs)
+    return {"text": text_from_data(data), "words": words_from_data(data)}
+
+def _ocr_page(index: int, page: np.ndarray, dpi: Optional[float], steps: Tuple[str, ...],
+              lang: Optional[str], config: str) -> Dict[str, Any]:
+    # pool task: one page in, one page result out; the array goes to
+    # Tesseract as is, single-channel once preprocessed
+    return dict(run_ocr(preprocess_array(page, steps, dpi), lang=lang, config=config), page=index)
+
+def open_document(data: bytes) -> Image.Image:
+    """Open uploaded bytes as a (possibly multi-page) image; ValueError if unreadable."""
+    try:
+        return Image.open(io.BytesIO(data))
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Unsupported or corrupt image: {e}")
+
+def iter_pages(document: Union[bytes, Image.Image], gray: bool = False) -> Iterator[Tuple[np.ndarray, Optional[float]]]:
+    """
+    (array, dpi) for every frame of an image (multi-page TIFF, GIF, ...), one
+    at a time. Grayscale and bilevel scans stay single-channel; anything else
+    becomes RGB, or, with `gray` (every preprocessing step works on gray),
+    single-channel straight from the decoder with no RGB copy in between.
+    """
+    image = open_document(document) if isinstance(document, (bytes, bytearray)) else document
+    for frame in ImageSequence.Iterator(image):
+        dpi = frame.info.get("dpi")
+        dpi = float(dpi[0]) if dpi else None
+        yield np.asarray(frame.convert("L" if gray or frame.mode in ("1", "L") else "RGB")), dpi
+
+
+@functools.lru_cache(maxsize=1)
+def _tesseract_version() -> str:
+    try:
+        return str(pytesseract.get_tesseract_version())
+    except (EnvironmentError, pytesseract.TesseractError):
+        return "unknown"
+
+def ocr_cache_key(data: bytes, steps: Sequence[str] = (), lang: Optional[str] = None, config: str = "") -> str:
+    """
+    Content address of an OCR result: the uploaded bytes plus everything that
+    changes the output (preprocessing steps and target DPI, language, config,
+    Tesseract version), so identical re-uploads share one entry.
+    """
+    h = hashlib.sha256(data)
+    params = (OCR_RESULT_VERSION, _tesseract_version(), tuple(steps), OCR_TARGET_DPI, lang or "", config)
+    h.update(repr(params).encode("utf-8"))
+    return h.hexdigest()
+
+
+class OCREngine:
+    """
+    Page-parallel OCR over a bounded pool. Pages are decoded lazily and at
+    most `workers` of them are in flight, so a long document never holds
+    more than that many decoded pages in memory.
+
+    With a cache, documents passed as bytes are looked up by content hash
+    first, and concurrent identical uploads share one OCR pass.
+    """
+    def __init__(self, workers: int = OCR_WORKERS, executor: str = OCR_EXECUTOR,
+                 cache: Optional[OCRResultCache] = None):
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown OCR executor: {executor!r}")
+        self.workers = max(1, workers)
+        self.executor = executor
+        self.cache = cache
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    if self.executor == "process":
+                        # forking a threaded server can copy a lock some other thread holds
+                        methods = multiprocessing.get_all_start_methods()
+                        context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+                        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                    else:
+                        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ocr")
+        return self._pool
+
+    def stream(self, document: Union[bytes, Image.Image], preprocess: Union[str, Sequence[str]] = "none",
+               lang: Optional[str] = None, config: str = "") -> Iterator[Dict[str, Any]]:
+        """
+        Yield {page, text, words} per page in completion order, not page
+        order. `preprocess` is parsed by parse_steps (ValueError right away
+        for unknown steps). Cached documents, and uploads that waited on an
+        identical one already being OCR'd, come back in page order once it is done.
+        """
+        steps = parse_steps(preprocess)
+        key = self._cache_key(document, steps, lang, config)
+        if key is None:
+            return self._stream(document, steps, lang, config)
+        return self._stream_cached(key, document, steps, lang, config)
+
+    def _cache_key(self, document, steps, lang, config) -> Optional[str]:
+        if self.cache is None or not isinstance(document, (bytes, bytearray)):
+            return None
+        return ocr_cache_key(bytes(document), steps, lang, config)
+
+    def _stream_cached(self, key, document, steps, lang, config) -> Iterator[Dict[str, Any]]:
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.cache.hits += 1
+            yield from cached["pages"]
+            return
+        pending, leader = self.cache.claim(key)
+        if not leader:
+            try:
+                result = pending.result()
+            except Exception:
+                # the leader failed or its client went away: OCR this copy ourselves
+                yield from self._stream(document, steps, lang, config)
+                return
+            yield from result["pages"]
+            return
+        pages = []
+        try:
+            # another worker may have stored it between our miss and the claim
+            stored = result = self.cache.get(key)
+            if stored is None:
+                for page in self._stream(document, steps, lang, config):
+                    pages.append(page)
+                    yield page
+                # only a fully read document is stored
+                result = _document_result(pages)
+                self.cache.put(key, result)
+        except BaseException as e:
+            # GeneratorExit when the consumer stopped early: waiters redo the OCR
+            self.cache.settle(key, pending, error=e if isinstance(e, Exception)
+                              else RuntimeError("OCR stream abandoned"))
+            raise
+        self.cache.settle(key, pending, result)
+        if stored is not None:
+            yield from stored["pages"]
+
+    def _stream(self, document, steps, lang, config) -> Iterator[Dict[str, Any]]:
+        pages = ((i, page, dpi) for i, (page, dpi) in enumerate(iter_pages(document, gray=bool(steps))))
+        first = next(pages, None)
+        if first is None:
+            return
+        second = next(pages, None)
+        if second is None:
+            # single page: no pool round-trip
+            yield _ocr_page(*first, steps, lang, config)
+            return
+        pool = self._get_pool()
+        pending = set()
+        queue = iter([first, second])
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) < self.workers:
+                    item = next(queue, None) or next(pages, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    pending.add(pool.submit(_ocr_page, *item, steps, lang, config))
+                if not pending:
+                    return
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    yield fut.result()
+        finally:
+            # consumer stopped early or a page failed: drop pages not started yet
+            for fut in pending:
+                fut.cancel()
+
+    def run(self, document: Union[bytes, Image.Image], preprocess: Union[str, Sequence[str]] = "none",
+            lang: Optional[str] = None, config: str = "") -> Dict[str, Any]:
+        """All pages in page order plus the document text (pages separated by form feeds)."""
+        steps = parse_steps(preprocess)
+        def compute():
+            return _document_result(self._stream(document, steps, lang, config))
+        key = self._cache_key(document, steps, lang, config)
+        return compute() if key is None else self.cache.get_or_compute(key, compute)
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+
+def _document_result(pages) -> Dict[str, Any]:
+    pages = sorted(pages, key=lambda p: p["page"])
+    return {"text": "\f".join(p["text"] for p in pages), "pages": pages}
+
+
+_ocr_engine: Optional[OCREngine] = None
+
+def get_ocr_engine() -> OCREngine:
+    global _ocr_engine
+    if _ocr_engine is None:
+        _ocr_engine = OCREngine(cache=get_ocr_cache())
+    return _ocr_engine
@@ -0,0 +1,69 @@
+# backend/app/registry.py
+"""
+Versioned artifact registry under MODEL_DIR.
+
+Layout:
+    MODEL_DIR/versions/<version>/model.joblib, vectorizer.joblib, meta.json
+    MODEL_DIR/CURRENT            -> name of the version to serve
+
+CURRENT is only ever replaced atomically (write temp file + os.replace), so a
+reader sees either the old or the new version, never a partial one. A
+MODEL_DIR without CURRENT is served as a flat, unversioned directory.
+"""
+import os
+import time
+from typing import List, Optional, Tuple
+
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+
+
+def _check_name(version: str):
+    if not version or version in (".", "..") or "/" in version or os.sep in version:
+        raise ValueError(f"Invalid model version name: {version!r}")
+
+def version_dir(model_dir: str, version: str) -> str:
+    _check_name(version)
+    return os.path.join(model_dir, VERSIONS_DIR, version)
+
+def list_versions(model_dir: str) -> List[str]:
+    root = os.path.join(model_dir, VERSIONS_DIR)
+    if not os.path.isdir(root):
+        return []
+    return sorted(d for d in os.listdir(root) if os.path.isdir(os.path.join(root, d)))
+
+def current_version(model_dir: str) -> Optional[str]:
+    try:
+        with open(os.path.join(model_dir, CURRENT_FILE), "r") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def resolve_artifact_dir(model_dir: str, version: Optional[str] = None) -> Tuple[Optional[str], str]:
+    """
+    Return (version name, directory) to load from. Without an explicit version
+    this follows CURRENT, falling back to the flat layout (None, model_dir).
+    """
+    if version is None:
+        version = current_version(model_dir)
+        if version is None:
+            return None, model_dir
+    path = version_dir(model_dir, version)
+    if not os.path.isdir(path):
+        raise FileNotFoundError(f"Model version {version!r} not found under {model_dir}")
+    return version, path
+
+def set_current(model_dir: str, version: str):
+    """Atomically point CURRENT at an existing version."""
+    if not os.path.isdir(version_dir(model_dir, version)):
+        raise FileNotFoundError(f"Model version {version!r} not found under {model_dir}")
+    tmp = os.path.join(model_dir, f".{CURRENT_FILE}.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        f.write(version + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(model_dir, CURRENT_FILE))
+
+def new_version_name() -> str:
+    """Sortable UTC timestamp name for a freshly trained version."""
+    return time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
@@ -0,0 +1,101 @@
+# backend/app/serve.py
+"""
+Server entry point with an optional pre-fork mode.
+
+    python -m app.serve --host 0.0.0.0 --port 8000 --workers 4
+
+The master process imports the app and loads (and warms) the artifacts once,
+then forks the workers, which all accept on one shared listening socket.
+Workers inherit the imported modules and loaded models copy-on-write instead
+of each importing sklearn and unpickling the artifacts again. With one
+worker the server simply runs in the master process.
+"""
+import argparse
+import gc
+import os
+import signal
+import sys
+import time
+import traceback
+
+# a worker dying this soon after its fork is treated as a boot failure, not restarted
+MIN_WORKER_UPTIME = 1.0
+
+
+def serve(host: str = "0.0.0.0", port: int = 8000, workers: int = 1, log_level: str = "info") -> int:
+    import uvicorn
+    from app.main import app
+    from app.model import load_artifacts
+
+    load_artifacts(warm=True)
+    config = uvicorn.Config(app, host=host, port=port, log_level=log_level)
+    if workers <= 1:
+        uvicorn.Server(config).run()
+        return 0
+
+    sock = config.bind_socket()
+    # keep the cyclic GC from writing to (and so copying) inherited objects
+    gc.freeze()
+    children = {}
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            code = 0
+            try:
+                uvicorn.Server(config).run(sockets=[sock])
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            os._exit(code)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for _ in range(workers):
+        spawn()
+    code = 0
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        if time.monotonic() - started < MIN_WORKER_UPTIME:
+            print(f"Worker {pid} exited during startup (status {status}); shutting down", file=sys.stderr)
+            code = 1
+            stop(None, None)
+            continue
+        print(f"Worker {pid} exited (status {status}); starting a replacement", file=sys.stderr)
+        spawn()
+    sock.close()
+    return code
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Serve the course recommender API")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", "1")),
+                        help="worker processes forked after loading artifacts (default: $WEB_CONCURRENCY or 1)")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    return serve(args.host, args.port, args.workers, args.log_level)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
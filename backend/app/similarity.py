@@ -0,0 +1,108 @@
+# backend/app/similarity.py
+"""
+Content-based course retrieval over the catalogue's descriptions.
+
+The catalogue is stored as an L2-normalized TF-IDF matrix in inverted-index
+form: for every vocabulary term, the ids of the courses containing it and
+the term's weight in each (i.e. the term x course matrix in CSR layout).
+A query only touches the postings of its own terms, so its cost grows with
+how many courses share those terms, not with the catalogue size. Courses
+need not be classifier labels, so new catalogue items are retrievable
+before any model has been trained on them.
+"""
+import os
+import numpy as np
+import scipy.sparse as sp
+from typing import List, Optional, Tuple
+
+from app.artifacts import has_array_bundle, load_array_bundle, save_array_bundle
+from app.vectorizer import FastCountVectorizer
+
+CATALOGUE_DIRNAME = "catalogue.arrays"
+
+
+def save_catalogue(path: str, tfidf, courses: List[str], docs: List[str]):
+    """
+    Index `docs` (one description per course) with a TfidfVectorizer
+    (norm="l2") and write the postings, idf and vocabulary to `path`.
+    """
+    if tfidf.norm != "l2" or tfidf.sublinear_tf:
+        raise ValueError("Catalogue index expects a TfidfVectorizer with norm='l2' and raw tf")
+    if len(courses) != len(docs):
+        raise ValueError("Need exactly one description per catalogue course")
+    X = tfidf.fit_transform(docs)
+    postings = X.T.tocsr()
+    postings.sort_indices()
+    terms = tfidf.get_feature_names_out().tolist()
+    arrays = {
+        "indptr": postings.indptr.astype(np.int64),
+        "courses": postings.indices.astype(np.int32),
+        "weights": postings.data.astype(np.float64),
+        "idf": tfidf.idf_.astype(np.float64),
+    }
+    manifest = {
+        "kind": "catalogue",
+        "course_names": list(courses),
+        "terms": terms,
+        "token_pattern": tfidf.token_pattern,
+        "lowercase": bool(tfidf.lowercase),
+    }
+    save_array_bundle(path, arrays, manifest)
+
+
+class CatalogueIndex:
+    def __init__(self, indptr, courses, weights, idf, course_names: List[str], terms: List[str],
+                 token_pattern: str, lowercase: bool = True):
+        self.indptr = np.asarray(indptr)
+        self.courses = np.asarray(courses)
+        self.weights = np.asarray(weights)
+        self.idf = np.asarray(idf)
+        self.course_names = list(course_names)
+        self.vectorizer = FastCountVectorizer({t: i for i, t in enumerate(terms)}, token_pattern,
+                                              lowercase=lowercase)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["CatalogueIndex"]:
+        if not has_array_bundle(path):
+            return None
+        arrays, manifest = load_array_bundle(path)
+        if manifest.get("kind") != "catalogue":
+            raise ValueError(f"Not a catalogue index: {manifest.get('kind')!r}")
+        return cls(arrays["indptr"], arrays["courses"], arrays["weights"], arrays["idf"],
+                   manifest["course_names"], manifest["terms"], manifest["token_pattern"],
+                   manifest.get("lowercase", True))
+
+    def __len__(self) -> int:
+        return len(self.course_names)
+
+    def query_vector(self, text: str) -> sp.csr_matrix:
+        """TF-IDF weights of `text`, L2-normalized like the catalogue rows."""
+        q = self.vectorizer.transform([text]).astype(np.float64)
+        q.data *= self.idf[q.indices]
+        norm = np.sqrt(np.dot(q.data, q.data))
+        if norm > 0:
+            q.data /= norm
+        return q
+
+    def search(self, text: str, k: int = 5) -> List[Tuple[str, float]]:
+        """Top-k (course, cosine similarity) for `text`, best first; only courses sharing a term."""
+        q = self.query_vector(text)
+        if q.nnz == 0 or k <= 0:
+            return []
+        starts, ends = self.indptr[q.indices], self.indptr[q.indices + 1]
+        lengths = ends - starts
+        # concatenated postings of the query's terms
+        pos = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        hits, inverse = np.unique(self.courses[pos], return_inverse=True)
+        scores = np.bincount(inverse, weights=self.weights[pos] * np.repeat(q.data, lengths),
+                             minlength=len(hits))
+        if k < len(hits):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(hits))
+        top = top[np.lexsort((hits[top], -scores[top]))]
+        return [(self.course_names[hits[i]], float(scores[i])) for i in top]
+
+
+def load_catalogue(model_dir: str) -> Optional[CatalogueIndex]:
+    return CatalogueIndex.load(os.path.join(model_dir, CATALOGUE_DIRNAME))
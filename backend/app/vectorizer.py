@@ -0,0 +1,96 @@
+# backend/app/vectorizer.py
+"""
+Serving-side replacement for CountVectorizer.transform.
+
+Built from a fitted CountVectorizer's vocabulary_, it maps normalized interest
+tokens straight to column indices with a dict and assembles the CSR matrix
+itself, skipping sklearn's analyzer pipeline. For the two token patterns this
+repo trains with, inputs made only of word characters and spaces are split
+without a regex at all; anything else goes through the vectorizer's own
+compiled pattern, so the output always matches sklearn's.
+"""
+import re
+import numpy as np
+import scipy.sparse as sp
+from typing import Dict, List, Optional
+
+DEFAULT_TOKEN_PATTERN = r"(?u)\b\w\w+\b"
+# scripts/train.py: every comma-separated interest is one (multi-word) token
+PHRASE_TOKEN_PATTERN = r"(?u)\b[\w\s]+\b"
+
+
+def _plain(doc: str) -> bool:
+    # True when doc holds only regex word characters (\w == isalnum or "_") and spaces
+    return doc.replace(" ", "").replace("_", "").isalnum()
+
+
+class FastCountVectorizer:
+    def __init__(self, vocabulary: Dict[str, int], token_pattern: str, lowercase: bool = True,
+                 binary: bool = False, dtype=np.int64):
+        self.vocabulary = dict(vocabulary)
+        self.n_features = len(self.vocabulary)
+        self.token_pattern = token_pattern
+        self._token_re = re.compile(token_pattern)
+        self.lowercase = lowercase
+        self.binary = binary
+        self.dtype = dtype
+        if token_pattern == DEFAULT_TOKEN_PATTERN:
+            self._split = lambda doc: [w for w in doc.split() if len(w) >= 2]
+        elif token_pattern == PHRASE_TOKEN_PATTERN:
+            self._split = lambda doc: [doc.strip()] if doc.strip() else []
+        else:
+            self._split = None
+
+    @classmethod
+    def from_vectorizer(cls, vect) -> Optional["FastCountVectorizer"]:
+        """
+        Build from a fitted CountVectorizer, or return None when its analyzer
+        does anything beyond lowercase + token_pattern (custom analyzer,
+        tokenizer or preprocessor, n-grams, stop words, accent stripping).
+        """
+        from sklearn.feature_extraction.text import CountVectorizer
+        # subclasses (TfidfVectorizer, ...) transform further; leave them to sklearn
+        if type(vect) is not CountVectorizer:
+            return None
+        if not hasattr(vect, "vocabulary_"):
+            return None
+        if (vect.analyzer != "word" or vect.tokenizer is not None or vect.preprocessor is not None
+                or tuple(vect.ngram_range) != (1, 1) or vect.stop_words is not None
+                or vect.strip_accents is not None or vect.input != "content"
+                or vect.token_pattern is None):
+            return None
+        pattern = re.compile(vect.token_pattern)
+        if pattern.groups > 1:
+            return None
+        return cls(vect.vocabulary_, vect.token_pattern, lowercase=vect.lowercase,
+                   binary=vect.binary, dtype=vect.dtype)
+
+    def tokenize(self, doc: str) -> List[str]:
+        if self.lowercase:
+            doc = doc.lower()
+        if self._split is not None and _plain(doc):
+            return self._split(doc)
+        return self._token_re.findall(doc)
+
+    def transform(self, docs: List[str]) -> sp.csr_matrix:
+        vocab = self.vocabulary
+        indptr = [0]
+        indices: List[int] = []
+        values: List[int] = []
+        for doc in docs:
+            counts: Dict[int, int] = {}
+            for tok in self.tokenize(doc):
+                col = vocab.get(tok)
+                if col is not None:
+                    counts[col] = counts.get(col, 0) + 1
+            if counts:
+                cols = sorted(counts)
+                indices.extend(cols)
+                values.extend(1 if self.binary else counts[c] for c in cols)
+            indptr.append(len(indices))
+        index_dtype = np.int32 if len(indices) <= np.iinfo(np.int32).max else np.int64
+        return sp.csr_matrix(
+            (np.asarray(values, dtype=self.dtype), np.asarray(indices, dtype=index_dtype),
+             np.asarray(indptr, dtype=index_dtype)),
+            shape=(len(docs), self.n_features),
+        )
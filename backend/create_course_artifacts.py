@@ -1,11 +1,13 @@
 ﻿# create_course_artifacts.py
 import json, os
-from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
 import joblib
 
+from app.artifacts import ARRAYS_DIRNAME, export_model
+from app.similarity import CATALOGUE_DIRNAME, save_catalogue
+
 MODEL_DIR = os.path.join(os.path.dirname(__file__), "models")
-os.makedirs(MODEL_DIR, exist_ok=True)
 
 # tiny example dataset (course descriptions)
 docs = [
@@ -29,20 +31,42 @@ labels = [
     "Databases"
 ]
 
-# train vectorizer + simple classifier
-vect = CountVectorizer()
-X = vect.fit_transform(docs)
-clf = LogisticRegression(max_iter=1000)
-clf.fit(X, labels)
+# catalogue segments, for /recommend's `segments` filter
+segments = {
+    "programming": ["Python Basics", "Backend Development"],
+    "data": ["Machine Learning", "Deep Learning", "Databases"],
+    "web": ["Frontend Development", "Backend Development"],
+    "mobile": ["Mobile Development"],
+    "infrastructure": ["Cloud & DevOps", "Databases"],
+}
+
+def build_artifacts():
+    # train vectorizer + simple classifier
+    vect = CountVectorizer()
+    X = vect.fit_transform(docs)
+    clf = LogisticRegression(max_iter=1000)
+    clf.fit(X, labels)
+    return vect, clf
+
+def main(model_dir=MODEL_DIR):
+    os.makedirs(model_dir, exist_ok=True)
+    vect, clf = build_artifacts()
+
+    # save artifacts
+    joblib.dump(clf, os.path.join(model_dir, "model.joblib"))
+    joblib.dump(vect, os.path.join(model_dir, "vectorizer.joblib"))
+    # memory-mappable copy of the model that the API serves from
+    export_model(clf, os.path.join(model_dir, ARRAYS_DIRNAME))
+    # L2-normalized TF-IDF of the descriptions, served by /similar
+    save_catalogue(os.path.join(model_dir, CATALOGUE_DIRNAME), TfidfVectorizer(), labels, docs)
 
-# save artifacts
-joblib.dump(clf, os.path.join(MODEL_DIR, "model.joblib"))
-joblib.dump(vect, os.path.join(MODEL_DIR, "vectorizer.joblib"))
+    meta = {"classes": list(clf.classes_), "segments": segments, "note": "small demo course recommender (dev only)"}
+    with open(os.path.join(model_dir, "meta.json"), "w", encoding="utf8") as f:
+        json.dump(meta, f, indent=2)
 
-meta = {"classes": list(clf.classes_), "note": "small demo course recommender (dev only)"}
-with open(os.path.join(MODEL_DIR, "meta.json"), "w", encoding="utf8") as f:
-    json.dump(meta, f, indent=2)
+    print("Wrote demo course artifacts to:", model_dir)
+    print("classes:", meta["classes"])
+    print("vocab size:", len(vect.get_feature_names_out()))
 
-print("Wrote demo course artifacts to:", MODEL_DIR)
-print("classes:", meta["classes"])
-print("vocab size:", len(vect.get_feature_names_out()))
+if __name__ == "__main__":
+    main()
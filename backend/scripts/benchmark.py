@@ -0,0 +1,330 @@
+"""
+Latency/throughput benchmarks for the serving path.
+
+Times each stage of a prediction separately (normalize, vectorize,
+predict_proba, explain) per artifact type and batch size, then load-tests
+POST /predict end to end, either in-process (ASGI, no network) or against a
+running server. Results go to a JSON file; `compare` diffs two of them and
+exits non-zero on regressions. `preprocess` measures time and peak memory
+per page of OCR preprocessing, legacy preprocess_image vs preprocess_array.
+
+Usage:
+    python scripts/benchmark.py run --out bench.json
+    python scripts/benchmark.py run --artifacts models --url http://127.0.0.1:8000 --out bench.json
+    python scripts/benchmark.py compare baseline.json bench.json --threshold 0.1
+    python scripts/benchmark.py preprocess --out preprocess.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+BATCH_SIZES = [1, 4, 16, 64, 256, 1024, 4096]
+STAGES = ["normalize", "vectorize", "predict_proba", "explain"]
+# metrics where bigger is better; everything else is a time
+HIGHER_IS_BETTER = {"rps"}
+
+
+def _timeit(fn, min_time=0.2, max_repeats=200):
+    """Median seconds per call of fn(), repeating until min_time has elapsed."""
+    fn()  # warm-up
+    times = []
+    start = time.perf_counter()
+    while len(times) < max_repeats and (len(times) < 3 or time.perf_counter() - start < min_time):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return float(np.median(times))
+
+def build_artifacts(workdir, n_samples=5000, seed=42):
+    """Fresh artifacts of both kinds the repo ships: RF from train.py, logreg from create_course_artifacts.py."""
+    import train
+    import create_course_artifacts
+    rf_dir = os.path.join(workdir, "rf")
+    train.main(output=rf_dir, n_samples=n_samples, seed=seed, model_type="rf")
+    logreg_dir = os.path.join(workdir, "logreg")
+    create_course_artifacts.main(logreg_dir)
+    return {"rf": rf_dir, "logreg": logreg_dir}
+
+def make_inputs(n, seed=42):
+    import train
+    return list(train.generate_synthetic_fast(n=n, seed=seed)["interests"].values)
+
+def bench_stages(bundle, inputs, batch_sizes=BATCH_SIZES, min_time=0.2):
+    """Per-stage median ms per batch (and us per row) for every batch size."""
+    from app.model import _normalize_interests, _vectorize, _explain
+    import scipy.sparse as sp
+    results = {}
+    for n in batch_sizes:
+        texts = inputs[:n]
+        norms = [_normalize_interests(t) for t in texts]
+        X = _vectorize(bundle, norms)
+        X = X.tocsr() if sp.issparse(X) else sp.csr_matrix(X)
+        if bundle.linear is not None:
+            predict = lambda: bundle.linear.score(X)
+        else:
+            predict = lambda: (bundle.predict_proba(X), None)
+        probs, contrib = predict()
+        idx = probs.argmax(axis=1)
+        timings = {
+            "normalize": _timeit(lambda: [_normalize_interests(t) for t in texts], min_time),
+            "vectorize": _timeit(lambda: _vectorize(bundle, norms), min_time),
+            "predict_proba": _timeit(predict, min_time),
+            "explain": _timeit(lambda: [_explain(bundle, X, i, int(idx[i]), contrib) for i in range(n)], min_time),
+        }
+        results[str(n)] = {
+            stage: {"ms": t * 1e3, "us_per_row": t * 1e6 / n} for stage, t in timings.items()
+        }
+    return results
+
+async def _load(send, inputs, requests, concurrency):
+    latencies, errors = [], 0
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        nonlocal errors
+        async with sem:
+            t0 = time.perf_counter()
+            r = await send({"interests": inputs[i % len(inputs)]})
+            latencies.append(time.perf_counter() - t0)
+            if r.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    ms = np.asarray(latencies) * 1e3
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "rps": requests / elapsed,
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+    }
+
+def load_test(inputs, requests=2000, concurrency=32, url=None):
+    """
+    POST /predict `requests` times with `concurrency` in flight, in-process
+    against app.main.app unless `url` points at a running server. The result
+    cache is cleared first; inputs are reused round-robin.
+    """
+    import httpx
+    from app.cache import get_result_cache
+
+    async def run():
+        if url is None:
+            from app.main import app
+            get_result_cache().clear()
+            client = httpx.AsyncClient(app=app, base_url="http://benchmark")
+        else:
+            client = httpx.AsyncClient(base_url=url, timeout=30)
+        async with client:
+            await client.post("/predict", json={"interests": inputs[0]})
+            return await _load(lambda body: client.post("/predict", json=body), inputs, requests, concurrency)
+
+    return asyncio.run(run())
+
+def run(out, artifacts=None, batch_sizes=BATCH_SIZES, requests=2000, concurrency=32, url=None,
+        min_time=0.2, n_samples=5000):
+    from app import model as m
+    import sklearn
+    inputs = make_inputs(max(batch_sizes + [requests]))
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "sklearn": sklearn.__version__,
+            "cpus": os.cpu_count(),
+            "batch_sizes": batch_sizes,
+        },
+        "stages": {},
+        "load": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        if artifacts:
+            dirs = {os.path.basename(os.path.normpath(a)): a for a in artifacts}
+        else:
+            dirs = build_artifacts(workdir, n_samples=n_samples)
+        for name, path in dirs.items():
+            bundle = m.ArtifactBundle(path)
+            report["stages"][name] = bench_stages(bundle, inputs, batch_sizes, min_time)
+            if url is None:
+                previous = m._activate(bundle)
+                try:
+                    report["load"][name] = load_test(inputs, requests, concurrency)
+                finally:
+                    if previous is not None:
+                        m._activate(previous)
+        if url is not None:
+            report["load"]["server"] = load_test(inputs, requests, concurrency, url=url)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    _print_report(report)
+    return report
+
+def _print_report(report):
+    for name, by_batch in report["stages"].items():
+        print(f"== {name}: us per row")
+        print(f"{'batch':>6} " + " ".join(f"{s:>14}" for s in STAGES))
+        for n, stages in by_batch.items():
+            print(f"{n:>6} " + " ".join(f"{stages[s]['us_per_row']:>14.2f}" for s in STAGES))
+    for name, load in report["load"].items():
+        print(f"== load {name}: {load['rps']:.0f} req/s, p50 {load['p50_ms']:.2f}ms, "
+              f"p95 {load['p95_ms']:.2f}ms, p99 {load['p99_ms']:.2f}ms, errors {load['errors']}")
+
+def _metrics(report):
+    """Flatten a report into {path: value} for the compared metrics."""
+    flat = {}
+    for name, by_batch in report.get("stages", {}).items():
+        for n, stages in by_batch.items():
+            for stage, values in stages.items():
+                flat[f"stages/{name}/{n}/{stage}/ms"] = values["ms"]
+    for name, load in report.get("load", {}).items():
+        for key in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+            flat[f"load/{name}/{key}"] = load[key]
+    return flat
+
+def compare(baseline, current, threshold=0.1):
+    """
+    Relative change of every metric present in both reports, and the list
+    of those worse by more than `threshold` (slower, or fewer req/s).
+    """
+    old, new = _metrics(baseline), _metrics(current)
+    changes, regressions = {}, []
+    for key in sorted(old.keys() & new.keys()):
+        if old[key] <= 0:
+            continue
+        change = (new[key] - old[key]) / old[key]
+        worse = -change if key.rsplit("/", 1)[-1] in HIGHER_IS_BETTER else change
+        changes[key] = change
+        if worse > threshold:
+            regressions.append(key)
+    return changes, regressions
+
+# ------------ OCR preprocessing ------------
+PREPROCESS_CASES = ["none", "grayscale", "binarize", "denoise"]
+
+def make_page(width=3264, height=2448, skew=2.0):
+    """A synthetic 8-megapixel RGB scan: lines of black text, slightly rotated."""
+    import cv2
+    page = np.full((height, width), 255, dtype=np.uint8)
+    for y in range(120, height - 80, 70):
+        cv2.putText(page, "machine learning with python, numpy and pandas; deep learning, pytorch",
+                    (80, y), cv2.FONT_HERSHEY_SIMPLEX, 1.6, 0, 3)
+    rotation = cv2.getRotationMatrix2D((width / 2.0, height / 2.0), skew, 1.0)
+    page = cv2.warpAffine(page, rotation, (width, height), borderValue=255)
+    return np.ascontiguousarray(np.repeat(page[:, :, None], 3, axis=2))
+
+def _status_kb(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+def _measure_in_child(fn, repeats):
+    """
+    Run fn in a forked child: median seconds per call and peak resident
+    memory growth (VmHWM - VmRSS at start, Linux only) in MB.
+    """
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        start_rss = _status_kb("VmRSS")
+        times = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - t0)
+        result = {"ms": float(np.median(times) * 1e3), "peak_mb": (_status_kb("VmHWM") - start_rss) / 1024.0}
+        os.write(write, json.dumps(result).encode())
+        os._exit(0)
+    os.close(write)
+    with os.fdopen(read) as f:
+        data = f.read()
+    os.waitpid(pid, 0)
+    return json.loads(data)
+
+def bench_preprocess(out, repeats=5, width=3264, height=2448):
+    """
+    Per-page time and peak memory of the legacy preprocess_image against
+    the pipeline, for every legacy method plus the full pipeline. Both start
+    from the same decoded PIL page; the pipeline side includes the array
+    conversion iter_pages does before preprocess_array.
+    """
+    from PIL import Image
+    from app.ocr import iter_pages, preprocess_image, preprocess_array
+    page = Image.fromarray(make_page(width, height))
+    report = {"page": {"width": width, "height": height, "megapixels": width * height / 1e6}, "cases": {}}
+    cases = [(m, [m]) for m in PREPROCESS_CASES]
+    cases.append(("resize,denoise,deskew,binarize", ["resize", "denoise", "deskew", "binarize"]))
+    for name, steps in cases:
+        legacy = None
+        if name in PREPROCESS_CASES:
+            legacy = _measure_in_child(lambda: preprocess_image(page, name), repeats)
+        current = _measure_in_child(
+            lambda: preprocess_array(next(iter_pages(page, gray=name != "none"))[0],
+                                     [] if name == "none" else steps, dpi=400), repeats)
+        report["cases"][name] = {"legacy": legacy, "pipeline": current}
+        line = f"{name:<32} pipeline {current['ms']:8.1f}ms {current['peak_mb']:7.1f}MB"
+        if legacy:
+            line += f"   legacy {legacy['ms']:8.1f}ms {legacy['peak_mb']:7.1f}MB"
+        print(line)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+    r = commands.add_parser("run", help="benchmark stages and load, write JSON")
+    r.add_argument("--out", default="benchmark.json")
+    r.add_argument("--artifacts", action="append",
+                   help="artifact dir to benchmark (repeatable); default: fresh rf + logreg artifacts")
+    r.add_argument("--batch-sizes", default=",".join(map(str, BATCH_SIZES)))
+    r.add_argument("--requests", type=int, default=2000)
+    r.add_argument("--concurrency", type=int, default=32)
+    r.add_argument("--url", default=None, help="load-test a running server instead of the in-process app")
+    r.add_argument("--min-time", type=float, default=0.2, help="seconds spent timing each measurement")
+    r.add_argument("--n-samples", type=int, default=5000, help="training rows for the fresh RF artifacts")
+    c = commands.add_parser("compare", help="flag regressions between two benchmark JSON files")
+    c.add_argument("baseline")
+    c.add_argument("current")
+    c.add_argument("--threshold", type=float, default=0.1, help="relative slowdown that counts as a regression")
+    p = commands.add_parser("preprocess", help="OCR preprocessing time/memory per page, legacy vs pipeline")
+    p.add_argument("--out", default="preprocess.json")
+    p.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    if args.command == "preprocess":
+        bench_preprocess(args.out, repeats=args.repeats)
+        return 0
+    if args.command == "run":
+        run(args.out, artifacts=args.artifacts, batch_sizes=[int(b) for b in args.batch_sizes.split(",")],
+            requests=args.requests, concurrency=args.concurrency, url=args.url, min_time=args.min_time,
+            n_samples=args.n_samples)
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    changes, regressions = compare(baseline, current, args.threshold)
+    for key, change in changes.items():
+        flag = "  REGRESSION" if key in regressions else ""
+        print(f"{key:<60} {change:+8.1%}{flag}")
+    print(f"{len(regressions)} regression(s) over {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
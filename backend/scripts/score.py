@@ -0,0 +1,183 @@
+"""
+Offline bulk scoring: recommend a course for every row of a CSV/Parquet file
+of interest lists, without going through the HTTP API.
+
+The input is read in fixed-size chunks which are scored on a process pool;
+each worker loads the artifacts once (app.model) and scores whole chunks
+with predict_labels_from_interests (predict_batch_from_interests with
+--explain). Results are written as they come in, in
+input order, and at most 2 x workers chunks are in flight, so memory stays
+flat however large the input is.
+
+Usage:
+    python scripts/train.py generate --out data/interests.parquet --n-samples 10000000
+    python scripts/score.py data/interests.parquet --out scores.parquet --workers 4
+    python scripts/score.py interests.csv --out scores.csv --id-column learner_id --models models
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+CHUNK_SIZE = 50_000
+
+
+def iter_input(path: str, column: str = "interests", id_column: Optional[str] = None,
+               chunk_size: int = CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """DataFrame chunks of just the interests (and id) columns of a .parquet or .csv file."""
+    columns = [column] + ([id_column] if id_column else [])
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns):
+            # nulls would reach the scorer as None; score them as empty interests
+            yield batch.to_pandas().fillna({column: ""})
+    else:
+        yield from pd.read_csv(path, usecols=columns, dtype=str, keep_default_na=False, chunksize=chunk_size)
+
+
+class ResultWriter:
+    """Appends result chunks to a .parquet (needs pyarrow) or .csv file."""
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.rows = 0
+        self._parquet = path.endswith(".parquet")
+        self._writer = None
+        self._file = None
+
+    def write(self, chunk: pd.DataFrame):
+        if self._parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            if self._file is None:
+                self._file = open(self.path, "w", newline="")
+            chunk.to_csv(self._file, index=False, header=self.rows == 0)
+        self.rows += len(chunk)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+
+
+def _load_artifacts(model_dir: Optional[str] = None):
+    # pool initializer: every worker loads the artifacts once
+    from app import model as m
+    m.load_artifacts(model_dir=model_dir)
+    if not m.artifacts_ready():
+        raise RuntimeError(f"Model artifacts not found in {model_dir or m.MODEL_DIR}")
+
+def _score_chunk(texts: List[str], explain: bool = False) -> Dict[str, list]:
+    from app.model import predict_batch_from_interests, predict_labels_from_interests
+    if not explain:
+        # explanations are most of the per-row cost; skip them unless asked
+        results = predict_labels_from_interests(texts)
+        return {
+            "recommended_course": [course for course, _ in results],
+            "probability": [round(prob, 4) for _, prob in results],
+        }
+    results = predict_batch_from_interests(texts)
+    return {
+        "recommended_course": [course for course, _, _ in results],
+        "probability": [round(prob, 4) for _, prob, _ in results],
+        "explanation": [json.dumps(expl) for _, _, expl in results],
+    }
+
+def _peak_rss_mb() -> Dict[str, float]:
+    # ru_maxrss is in KB on Linux; RUSAGE_CHILDREN covers the largest waited-for worker
+    return {
+        "main": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+        "worker": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024.0,
+    }
+
+def score(path: str, out: str, model_dir: Optional[str] = None, workers: int = 1, chunk_size: int = CHUNK_SIZE,
+          column: str = "interests", id_column: Optional[str] = None, explain: bool = False) -> Dict[str, Any]:
+    """
+    Score every row of `path` into `out`, keeping the input order. Output
+    columns: the id column (or the 0-based input row), recommended_course,
+    probability and, with `explain`, the explanation as JSON. Returns a
+    throughput and peak-memory report.
+    """
+    start = time.perf_counter()
+    writer = ResultWriter(out)
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_load_artifacts, initargs=(model_dir,))
+    else:
+        _load_artifacts(model_dir)
+    pending = deque()
+    offset = 0
+
+    def flush(keys, columns):
+        writer.write(pd.DataFrame({**keys, **columns}))
+
+    try:
+        for chunk in iter_input(path, column, id_column, chunk_size):
+            texts = chunk[column].tolist()
+            if id_column:
+                keys = {id_column: chunk[id_column].values}
+            else:
+                keys = {"row": range(offset, offset + len(chunk))}
+            offset += len(chunk)
+            if pool is None:
+                flush(keys, _score_chunk(texts, explain))
+                continue
+            pending.append((keys, pool.submit(_score_chunk, texts, explain)))
+            # oldest first keeps the output in input order and bounds the chunks held
+            while len(pending) >= 2 * workers:
+                keys, future = pending.popleft()
+                flush(keys, future.result())
+        while pending:
+            keys, future = pending.popleft()
+            flush(keys, future.result())
+    finally:
+        if pool is not None:
+            for _, future in pending:
+                future.cancel()
+            pool.shutdown(wait=True)
+        writer.close()
+    seconds = time.perf_counter() - start
+    return {
+        "rows": writer.rows,
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(writer.rows / seconds, 1) if seconds > 0 else None,
+        "workers": workers,
+        "chunk_size": chunk_size,
+        "peak_rss_mb": {k: round(v, 1) for k, v in _peak_rss_mb().items()},
+        "out": out,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Score a CSV/Parquet file of interest lists offline")
+    parser.add_argument("input", help=".parquet or .csv with an interests column")
+    parser.add_argument("--out", required=True, help=".parquet or .csv to write")
+    parser.add_argument("--models", default=None, help="artifact directory (default: $MODEL_DIR)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--column", default="interests")
+    parser.add_argument("--id-column", default=None, help="copied to the output instead of the row number")
+    parser.add_argument("--explain", action="store_true", help="add the per-row explanation as JSON")
+    args = parser.parse_args(argv)
+    report = score(args.input, args.out, args.models, args.workers, args.chunk_size,
+                   args.column, args.id_column, args.explain)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
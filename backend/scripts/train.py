@@ -3,19 +3,35 @@ Train a course recommender classifier on synthetic interest lists.
 
 Usage:
     python scripts/train.py --output models --n-samples 5000 --seed 42
+    python scripts/train.py --output models --registry   # new version + move CURRENT
+    python scripts/train.py --output models --compact    # fewest trees within tolerance, quantized arrays
+    python scripts/train.py generate --out data/synthetic.parquet --n-samples 10000000
+    python scripts/train.py --streaming --data data/synthetic.parquet --model-type sgd
+    python scripts/train.py sweep --output models --folds 5 --latency-weight 0.01
 """
 import argparse
+import copy
 import os
+import sys
 import json
+import time
+import shutil
+import tempfile
 import joblib
 import numpy as np
 import pandas as pd
-from sklearn.model_selection import train_test_split
-from sklearn.feature_extraction.text import CountVectorizer
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.model_selection import train_test_split, ParameterGrid, StratifiedKFold
+from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.linear_model import LogisticRegression
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.naive_bayes import MultinomialNB
 from sklearn.metrics import classification_report, accuracy_score
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.registry import version_dir, new_version_name, set_current
+from app.artifacts import ARRAYS_DIRNAME, LEAF_VALUE_SCALE, export_model, has_array_bundle, load_model
+
 COURSES = [
     "intro_ml",
     "deep_learning",
@@ -26,6 +42,14 @@ COURSES = [
     "reinforcement_learning"
 ]
 
+# catalogue segments written to meta.json, for /recommend's `segments` filter
+COURSE_SEGMENTS = {
+    "foundations": ["intro_ml", "ai_ethics"],
+    "deep_learning": ["deep_learning", "nlp", "computer_vision"],
+    "data": ["data_engineering"],
+    "decision_making": ["reinforcement_learning"],
+}
+
 TOPICS = [
     "linear algebra", "probability", "statistics", "python", "pandas", "numpy", "ml",
     "deep learning", "neural networks", "cnn", "rnn", "transformers", "nlp", "cv",
@@ -71,14 +95,294 @@ def generate_synthetic(n=5000, seed=42):
         rows.append({"interests": ", ".join(topics), "label": label})
     return pd.DataFrame(rows)
 
-def main(output="models", n_samples=5000, seed=42, model_type="rf"):
-    os.makedirs(output, exist_ok=True)
-    df = generate_synthetic(n=n_samples, seed=seed)
+# TOPIC_MATCHES[t, c]: keyword hits of topic t for course c, i.e. the inner two
+# loops of generate_synthetic precomputed once
+TOPIC_MATCHES = np.array(
+    [[sum(key in t for key in COURSE_KEYWORDS[c]) for c in COURSES] for t in TOPICS], dtype=np.int16
+)
+MAX_TOPICS = 6
+NOISE_RATE = 0.15
+
+def generate_synthetic_chunks(n=5000, seed=42, chunk_size=100_000):
+    """
+    Vectorized equivalent of generate_synthetic, yielding DataFrames of at
+    most chunk_size rows so memory stays bounded for very large n. Same
+    heuristic (2..6 distinct topics, label = course with most keyword hits,
+    ties to the first course, 15% label noise), but a different random
+    stream: output is reproducible for a given (seed, chunk_size), not
+    identical to generate_synthetic's.
+    """
+    topics = np.array(TOPICS, dtype=object)
+    n_topics, n_courses = TOPIC_MATCHES.shape
+    courses = np.array(COURSES, dtype=object)
+    for i, start in enumerate(range(0, n, chunk_size)):
+        m = min(chunk_size, n - start)
+        rng = np.random.default_rng([seed, i])
+        k = rng.integers(2, MAX_TOPICS + 1, size=m)
+        # a random permutation per row (argsort of uniform keys); its first k
+        # entries are a uniform k-subset without replacement
+        chosen = np.argsort(rng.random((m, n_topics)), axis=1)[:, :MAX_TOPICS]
+        used = np.arange(MAX_TOPICS) < k[:, None]
+        scores = (TOPIC_MATCHES[chosen] * used[:, :, None]).sum(axis=1)
+        label = scores.argmax(axis=1)
+        random_label = rng.integers(0, n_courses, size=m)
+        noisy = (scores.max(axis=1) == 0) | (rng.random(m) < NOISE_RATE)
+        label = np.where(noisy, random_label, label)
+        interests = np.empty(m, dtype=object)
+        for kk in range(2, MAX_TOPICS + 1):
+            rows = np.flatnonzero(k == kk)
+            joined = topics[chosen[rows, 0]]
+            for j in range(1, kk):
+                joined = joined + ", " + topics[chosen[rows, j]]
+            interests[rows] = joined
+        yield pd.DataFrame({"interests": interests, "label": courses[label]})
+
+def generate_synthetic_fast(n=5000, seed=42, chunk_size=100_000):
+    return pd.concat(list(generate_synthetic_chunks(n, seed, chunk_size)), ignore_index=True)
+
+def write_synthetic(path, n, seed=42, chunk_size=100_000):
+    """
+    Stream generate_synthetic_chunks to a .parquet (needs pyarrow) or .csv
+    file one chunk at a time. Returns the number of rows written.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    chunks = generate_synthetic_chunks(n, seed, chunk_size)
+    written = 0
+    if path.endswith(".parquet"):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        writer = None
+        try:
+            for chunk in chunks:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+                written += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        with open(path, "w", newline="") as f:
+            for chunk in chunks:
+                chunk.to_csv(f, index=False, header=written == 0)
+                written += len(chunk)
+    return written
+
+TOKEN_PATTERN = r"(?u)\b[\w\s]+\b"
+HASHING_FEATURES = 2 ** 18
+
+def make_vectorizer():
+    # every comma-separated interest becomes one (possibly multi-word) token
+    return CountVectorizer(token_pattern=TOKEN_PATTERN)
+
+def make_hashing_vectorizer():
+    # stateless counterpart of make_vectorizer: raw counts, no fitted vocabulary
+    return HashingVectorizer(token_pattern=TOKEN_PATTERN, n_features=HASHING_FEATURES,
+                             alternate_sign=False, norm=None)
+
+def iter_records(data=None, n_samples=5000, seed=42, chunk_size=100_000):
+    """
+    Yield DataFrame chunks of (interests, label) from a .parquet or .csv
+    file, or from the synthetic generator when no file is given.
+    """
+    if data is None:
+        yield from generate_synthetic_chunks(n_samples, seed, chunk_size)
+    elif data.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(data).iter_batches(batch_size=chunk_size, columns=["interests", "label"]):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(data, usecols=["interests", "label"], dtype=str, keep_default_na=False,
+                               chunksize=chunk_size)
+
+def scan_records(chunks, analyzer=None):
+    """One pass collecting the sorted label set and, given an analyzer, the token set."""
+    labels, tokens = set(), set()
+    for chunk in chunks:
+        labels.update(chunk["label"].unique())
+        if analyzer is not None:
+            for doc in chunk["interests"].values:
+                tokens.update(analyzer(doc))
+    return sorted(labels), sorted(tokens)
+
+def make_streaming_model(model_type="sgd", seed=42):
+    if model_type == "nb":
+        return MultinomialNB()
+    # log loss so the API gets predict_proba
+    return SGDClassifier(loss="log_loss", random_state=seed)
+
+def vocab_size(vect):
+    if isinstance(vect, HashingVectorizer):
+        return vect.n_features
+    return len(vect.get_feature_names_out())
+
+def _artifact_dir(output, registry):
+    # with a registry, artifacts go to output/versions/<name>/ and CURRENT is
+    # only moved once every file is written
+    version = new_version_name() if registry else None
+    artifact_dir = version_dir(output, version) if registry else output
+    os.makedirs(artifact_dir, exist_ok=True)
+    return version, artifact_dir
+
+def save_artifacts(output, artifact_dir, version, model, vect, X_check, meta=None, registry=False, compact=False):
+    joblib.dump(vect, os.path.join(artifact_dir, "vectorizer.joblib"))
+    kind = export_serving_model(model, os.path.join(artifact_dir, ARRAYS_DIRNAME), X_check, compact=compact)
+    # a compact forest is served from its arrays alone: the pickle would only
+    # add back the training-time tree state (impurities, sample counts,
+    # float64 node distributions) that compaction drops
+    model_path = os.path.join(artifact_dir, "model.joblib")
+    if not (compact and kind == "forest"):
+        joblib.dump(model, model_path)
+    elif os.path.exists(model_path):
+        # an earlier model's pickle would be served with ARTIFACT_MMAP off
+        os.remove(model_path)
+    classes = [str(c) for c in model.classes_]
+    segments = {name: [c for c in members if c in classes] for name, members in COURSE_SEGMENTS.items()}
+    meta = dict({"classes": classes, "segments": {k: v for k, v in segments.items() if v},
+                 "vectorizer_vocab_size": vocab_size(vect)}, **(meta or {}))
+    if version:
+        meta["version"] = version
+    with open(os.path.join(artifact_dir, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    if registry:
+        set_current(output, version)
+
+def export_serving_model(model, path, X_check, compact=False):
+    """
+    Compile the model into the flat array format the API serves from and
+    check that it reproduces sklearn's predict_proba on X_check (to within
+    the leaf quantization step when `compact`).
+    """
+    # an export left by an earlier model would be served in place of this one
+    shutil.rmtree(path, ignore_errors=True)
+    kind = export_model(model, path, compact=compact)
+    if kind is None:
+        print("No array export for", type(model).__name__, "- serving from model.joblib")
+        return None
+    diff = np.abs(load_model(path).predict_proba(X_check) - model.predict_proba(X_check)).max()
+    if diff > (0.5 / LEAF_VALUE_SCALE if compact and kind == "forest" else 0) + 1e-9:
+        raise RuntimeError(f"Exported {kind} model disagrees with sklearn (max abs diff {diff})")
+    print(f"Exported {kind} model to {path} (max abs diff vs sklearn: {diff})")
+    return kind
+
+# ------------ Forest compaction ------------
+# accuracy (fraction, not points) a compacted forest may give up vs all trees
+COMPACT_TOLERANCE = 0.005
+# fraction of the training split held out to choose the tree count on
+COMPACT_VALIDATION = 0.2
+# rows timed one at a time, and the batch size, for serve-time latency
+LATENCY_ROWS = 200
+LATENCY_BATCH = 1024
+
+def select_tree_count(model, X_val, y_val, tolerance=COMPACT_TOLERANCE):
+    """
+    Accuracy on (X_val, y_val) of every prefix of the forest's trees, in one
+    pass that adds each tree's probabilities to a running sum, and the
+    smallest tree count whose accuracy is within `tolerance` of the whole
+    forest's (for that count and every larger one). Returns (count,
+    accuracies).
+    """
+    X_val = X_val.astype(np.float32)
+    total = None
+    accuracies = []
+    for est in model.estimators_:
+        proba = est.predict_proba(X_val)
+        total = proba if total is None else total + proba
+        accuracies.append(accuracy_score(y_val, model.classes_[np.argmax(total, axis=1)]))
+    # smallest count from which every larger forest stays within tolerance,
+    # so one lucky prefix on a small split cannot pick the count
+    target = accuracies[-1] - tolerance
+    worst_after = np.minimum.accumulate(np.asarray(accuracies)[::-1])[::-1]
+    return int(np.argmax(worst_after >= target)) + 1, accuracies
+
+def truncate_forest(model, n_trees):
+    """The forest's first n_trees trees as a forest of its own (trees are shared, not copied)."""
+    small = copy.copy(model)
+    small.estimators_ = model.estimators_[:n_trees]
+    small.n_estimators = n_trees
+    return small
+
+def _dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+def _latency(predict, X, seed=42):
+    """Single-row p50/p95 and batch throughput of predict over rows of X."""
+    rows = np.random.default_rng(seed).choice(X.shape[0], size=min(LATENCY_ROWS, X.shape[0]), replace=False)
+    times = []
+    for r in rows:
+        t0 = time.perf_counter()
+        predict(X[r:r + 1])
+        times.append(time.perf_counter() - t0)
+    batch = X[:LATENCY_BATCH]
+    t0 = time.perf_counter()
+    predict(batch)
+    batch_s = time.perf_counter() - t0
+    return {
+        "latency_ms_p50": float(np.percentile(times, 50) * 1e3),
+        "latency_ms_p95": float(np.percentile(times, 95) * 1e3),
+        "batch_rows_per_s": float(batch.shape[0] / batch_s),
+    }
+
+def _artifact_profile(model_dir, X_val, y_val, seed=42):
+    # size, cold load time (arrays read fully, pickle unpickled), latency and accuracy of one artifact dir
+    arrays_dir = os.path.join(model_dir, ARRAYS_DIRNAME)
+    model_path = os.path.join(model_dir, "model.joblib")
+    t0 = time.perf_counter()
+    served = load_model(arrays_dir, mmap_mode=None)
+    arrays_load = time.perf_counter() - t0
+    joblib_load = None
+    if os.path.exists(model_path):
+        t0 = time.perf_counter()
+        joblib.load(model_path)
+        joblib_load = (time.perf_counter() - t0) * 1e3
+    return dict({
+        "n_trees": served.n_trees,
+        "arrays_bytes": _dir_size(arrays_dir),
+        "model_bytes": os.path.getsize(model_path) if os.path.exists(model_path) else 0,
+        "arrays_load_ms": arrays_load * 1e3,
+        "joblib_load_ms": joblib_load,
+        "accuracy": float(accuracy_score(y_val, served.predict(X_val))),
+    }, **_latency(served.predict_proba, X_val, seed))
+
+def compaction_report(full, compact_dir, X_val, y_val, seed=42):
+    """Full forest (exported to a scratch dir) vs the compacted artifacts in compact_dir."""
+    workdir = tempfile.mkdtemp(prefix="compact-")
+    try:
+        joblib.dump(full, os.path.join(workdir, "model.joblib"))
+        export_model(full, os.path.join(workdir, ARRAYS_DIRNAME))
+        report = {
+            "full": _artifact_profile(workdir, X_val, y_val, seed),
+            "compact": _artifact_profile(compact_dir, X_val, y_val, seed),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    full_p, compact_p = report["full"], report["compact"]
+    report["ratios"] = {
+        "bytes": (compact_p["arrays_bytes"] + compact_p["model_bytes"]) / (full_p["arrays_bytes"] + full_p["model_bytes"]),
+        "arrays_load": compact_p["arrays_load_ms"] / full_p["arrays_load_ms"],
+        "latency_p50": compact_p["latency_ms_p50"] / full_p["latency_ms_p50"],
+    }
+    return report
+
+def main(output="models", n_samples=5000, seed=42, model_type="rf", registry=False, generator="loop",
+         compact=False, compact_tolerance=COMPACT_TOLERANCE):
+    version, artifact_dir = _artifact_dir(output, registry)
+    if generator == "vectorized":
+        df = generate_synthetic_fast(n=n_samples, seed=seed)
+    else:
+        df = generate_synthetic(n=n_samples, seed=seed)
     X_raw = df["interests"].values
     y = df["label"].values
-    vect = CountVectorizer(token_pattern=r"(?u)\b[\w\s]+\b")
+    vect = make_vectorizer()
     X = vect.fit_transform(X_raw)
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=seed, stratify=y)
+    compact = compact and model_type == "rf"
+    if compact:
+        # the tree count is picked on data carved from the training split, so
+        # the test split stays unseen for the report
+        X_train, X_val, y_train, y_val = train_test_split(X_train, y_train, test_size=COMPACT_VALIDATION,
+                                                          random_state=seed, stratify=y_train)
     if model_type == "rf":
         model = RandomForestClassifier(n_estimators=200, random_state=seed)
     else:
@@ -89,21 +393,261 @@ def main(output="models", n_samples=5000, seed=42, model_type="rf"):
     acc = accuracy_score(y_test, preds)
     print("Accuracy on test:", acc)
     print(classification_report(y_test, preds))
+    meta = None
+    full = model
+    if compact:
+        n_trees, _ = select_tree_count(model, X_val, y_val, compact_tolerance)
+        model = truncate_forest(model, n_trees)
+        meta = {"compaction": {"n_trees": n_trees, "source_trees": len(full.estimators_),
+                               "tolerance": compact_tolerance, "value_scale": LEAF_VALUE_SCALE}}
+        print(f"Compacted forest: {n_trees} of {len(full.estimators_)} trees")
     # Save artifacts
-    joblib.dump(model, os.path.join(output, "model.joblib"))
-    joblib.dump(vect, os.path.join(output, "vectorizer.joblib"))
-    meta = {"classes": list(model.classes_), "vectorizer_vocab_size": len(vect.get_feature_names_out())}
-    with open(os.path.join(output, "meta.json"), "w") as f:
-        json.dump(meta, f)
+    save_artifacts(output, artifact_dir, version, model, vect, X_test, meta=meta, registry=registry, compact=compact)
+    if compact:
+        report = compaction_report(full, artifact_dir, X_test, y_test, seed)
+        with open(os.path.join(artifact_dir, "compaction_report.json"), "w") as f:
+            json.dump(report, f, indent=2)
+        for name in ("full", "compact"):
+            r = report[name]
+            print(f"{name:>8}: trees={r['n_trees']} size={r['arrays_bytes'] + r['model_bytes']}B "
+                  f"load={r['arrays_load_ms']:.1f}ms p50={r['latency_ms_p50']:.3f}ms acc={r['accuracy']:.4f}")
     # save a small sample
-    df.sample(20, random_state=seed).to_csv(os.path.join(os.path.dirname(output), "data", "sample_interests.csv"), index=False)
-    print(f"Saved model and vectorizer to {output}")
+    data_dir = os.path.join(os.path.dirname(output), "data")
+    os.makedirs(data_dir, exist_ok=True)
+    df.sample(20, random_state=seed).to_csv(os.path.join(data_dir, "sample_interests.csv"), index=False)
+    print(f"Saved model and vectorizer to {artifact_dir}")
+
+def train_streaming(output="models", data=None, n_samples=5000, seed=42, model_type="sgd", registry=False,
+                    chunk_size=100_000, vocabulary="frozen", epochs=1):
+    """
+    Out-of-core training: records are read chunk by chunk and fed to
+    partial_fit, so memory is bounded by the chunk size (plus the vocabulary
+    for vocabulary="frozen") however large the data is. "frozen" first scans
+    the data once for its token set and fixes a CountVectorizer vocabulary;
+    "hashing" needs no scan and no stored vocabulary. Accuracy is measured
+    by progressive validation: each chunk of the first epoch is scored
+    before the model trains on it.
+    """
+    if model_type not in ("sgd", "nb"):
+        raise ValueError(f"Streaming training needs a partial_fit model (sgd or nb), not {model_type!r}")
+    version, artifact_dir = _artifact_dir(output, registry)
+    records = lambda: iter_records(data, n_samples=n_samples, seed=seed, chunk_size=chunk_size)
+    if vocabulary == "hashing":
+        vect = make_hashing_vectorizer()
+        classes, _ = scan_records(records())
+    else:
+        vect = make_vectorizer()
+        classes, tokens = scan_records(records(), vect.build_analyzer())
+        vect.set_params(vocabulary=tokens).fit([])
+    model = make_streaming_model(model_type, seed)
+    seen = correct = 0
+    acc = None
+    X = None
+    for epoch in range(epochs):
+        for chunk in records():
+            X = vect.transform(chunk["interests"].values)
+            y = chunk["label"].values
+            if epoch == 0 and hasattr(model, "classes_"):
+                correct += int((model.predict(X) == y).sum())
+                seen += len(y)
+            model.partial_fit(X, y, classes=classes)
+        if epoch == 0:
+            acc = correct / seen if seen else None
+            print(f"Progressive validation accuracy: {acc} over {seen} rows")
+    if X is None:
+        raise ValueError("No training records")
+    meta = {"training": "streaming", "progressive_accuracy": acc, "vectorizer": vocabulary}
+    # the last chunk doubles as the export parity check
+    save_artifacts(output, artifact_dir, version, model, vect, X, meta=meta, registry=registry)
+    print(f"Saved model and vectorizer to {artifact_dir}")
+    return acc
+
+# ------------ Hyperparameter sweep ------------
+SWEEP_GRID = {
+    "rf": {"n_estimators": [50, 100, 200], "max_depth": [None, 12, 24], "min_samples_leaf": [1, 3]},
+    "logreg": {"C": [0.1, 1.0, 10.0]},
+    "sgd": {"alpha": [1e-5, 1e-4, 1e-3]},
+    "nb": {"alpha": [0.1, 0.5, 1.0]},
+}
+
+def make_model(model_type, params, seed=42):
+    if model_type == "rf":
+        return RandomForestClassifier(random_state=seed, **params)
+    if model_type == "logreg":
+        return LogisticRegression(max_iter=1000, **params)
+    if model_type == "sgd":
+        return SGDClassifier(loss="log_loss", random_state=seed, **params)
+    if model_type == "nb":
+        return MultinomialNB(**params)
+    raise ValueError(f"Unknown model type: {model_type!r}")
+
+def sweep_candidates(model_types, n_iter=None, seed=42, grid=SWEEP_GRID):
+    """Full grid over the given model types, or a random subset of n_iter of it."""
+    candidates = [(m, params) for m in model_types for params in ParameterGrid(grid[m])]
+    if n_iter is not None and n_iter < len(candidates):
+        pick = np.random.default_rng(seed).choice(len(candidates), size=n_iter, replace=False)
+        candidates = [candidates[i] for i in sorted(pick)]
+    return candidates
+
+_sweep_data = {}
+
+def _init_sweep_worker(path):
+    # the CSR arrays come back as read-only memmaps: every worker shares one
+    # copy of the featurized data through the page cache
+    X, y = joblib.load(path, mmap_mode="r")
+    _sweep_data.update(X=X, y=y)
+
+def _serving_predictor(cand_dir):
+    """predict_proba as the API runs it: array export plus LinearEngine where they apply."""
+    from app.model import LinearEngine
+    path = os.path.join(cand_dir, ARRAYS_DIRNAME)
+    if has_array_bundle(path):
+        served = load_model(path)
+    else:
+        served = joblib.load(os.path.join(cand_dir, "model.joblib"))
+    engine = LinearEngine.from_model(served)
+    return (lambda X: engine.score(X)[0]) if engine is not None else served.predict_proba
+
+def _sweep_task(i, model_type, params, fold, folds, seed, outdir):
+    """
+    One unit of sweep work: fold k of candidate i's cross-validation, or
+    (fold None) the final fit on all data, saved with its array export for
+    the parent to time and pick up.
+    """
+    X, y = _sweep_data["X"], _sweep_data["y"]
+    model = make_model(model_type, params, seed)
+    if fold is not None:
+        train_idx, test_idx = list(StratifiedKFold(folds, shuffle=True, random_state=seed).split(X, y))[fold]
+        model.fit(X[train_idx], y[train_idx])
+        return i, fold, accuracy_score(y[test_idx], model.predict(X[test_idx]))
+    model.fit(X, y)
+    cand_dir = os.path.join(outdir, f"candidate_{i}")
+    os.makedirs(cand_dir)
+    joblib.dump(model, os.path.join(cand_dir, "model.joblib"))
+    export_model(model, os.path.join(cand_dir, ARRAYS_DIRNAME))
+    return i, None, {
+        "model_bytes": os.path.getsize(os.path.join(cand_dir, "model.joblib")),
+        "arrays_bytes": _dir_size(os.path.join(cand_dir, ARRAYS_DIRNAME)),
+    }
+
+def sweep(output="models", data=None, n_samples=5000, seed=42, model_types=("rf", "logreg", "sgd", "nb"),
+          n_iter=None, folds=5, latency_weight=0.01, max_latency_ms=None, workers=None, registry=False):
+    """
+    Cross-validate every candidate in parallel, time each final fit
+    serially afterwards, and write the best by
+    cv_accuracy - latency_weight * latency_ms_p50 (optionally only among
+    candidates under max_latency_ms) to `output`, with the full results in
+    sweep_results.json. Data is featurized once in this process.
+    """
+    candidates = sweep_candidates(model_types, n_iter=n_iter, seed=seed)
+    if data is None:
+        df = generate_synthetic(n=n_samples, seed=seed)
+    else:
+        df = pd.concat(list(iter_records(data)), ignore_index=True)
+    vect = make_vectorizer()
+    X = vect.fit_transform(df["interests"].values).tocsr()
+    y = df["label"].values.astype(str)
+    workdir = tempfile.mkdtemp(prefix="sweep-")
+    try:
+        data_path = os.path.join(workdir, "Xy.joblib")
+        joblib.dump((X, y), data_path)
+        tasks = [(i, m, p, f) for i, (m, p) in enumerate(candidates) for f in list(range(folds)) + [None]]
+        results = [{"model_type": m, "params": p, "fold_accuracy": []} for m, p in candidates]
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_sweep_worker,
+                                 initargs=(data_path,)) as pool:
+            futures = [pool.submit(_sweep_task, i, m, p, f, folds, seed, workdir) for i, m, p, f in tasks]
+            for fut in futures:
+                i, fold, value = fut.result()
+                if fold is None:
+                    results[i].update(value)
+                else:
+                    results[i]["fold_accuracy"].append(value)
+        # latency is timed here, one candidate at a time once the pool has
+        # drained, not in workers competing with other candidates' fits
+        for i, r in enumerate(results):
+            r.update(_latency(_serving_predictor(os.path.join(workdir, f"candidate_{i}")), X, seed))
+        for r in results:
+            r["cv_accuracy"] = float(np.mean(r["fold_accuracy"]))
+            r["score"] = r["cv_accuracy"] - latency_weight * r["latency_ms_p50"]
+        eligible = [i for i, r in enumerate(results)
+                    if max_latency_ms is None or r["latency_ms_p50"] <= max_latency_ms]
+        if not eligible:
+            raise ValueError(f"No candidate under {max_latency_ms}ms p50 latency")
+        best = max(eligible, key=lambda i: results[i]["score"])
+        for r in sorted(results, key=lambda r: -r["score"]):
+            print(f"{r['model_type']:>6} {json.dumps(r['params']):<60} acc={r['cv_accuracy']:.4f} "
+                  f"p50={r['latency_ms_p50']:.3f}ms size={r['model_bytes'] + r['arrays_bytes']}B "
+                  f"score={r['score']:.4f}")
+        model = joblib.load(os.path.join(workdir, f"candidate_{best}", "model.joblib"))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    version, artifact_dir = _artifact_dir(output, registry)
+    meta = {"sweep": {"best": results[best], "latency_weight": latency_weight, "folds": folds}}
+    save_artifacts(output, artifact_dir, version, model, vect, X[:LATENCY_BATCH], meta=meta, registry=registry)
+    with open(os.path.join(artifact_dir, "sweep_results.json"), "w") as f:
+        json.dump({"best": best, "results": results}, f, indent=2)
+    print(f"Best: {results[best]['model_type']} {results[best]['params']}; saved to {artifact_dir}")
+    return results[best]
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--output", default="models")
     parser.add_argument("--n-samples", type=int, default=5000)
     parser.add_argument("--seed", type=int, default=42)
-    parser.add_argument("--model-type", choices=["rf", "logreg"], default="rf")
+    parser.add_argument("--model-type", choices=["rf", "logreg", "sgd", "nb"], default=None,
+                        help="default: rf, or sgd with --streaming")
+    parser.add_argument("--registry", action="store_true",
+                        help="write a new version under OUTPUT/versions and point CURRENT at it")
+    parser.add_argument("--generator", choices=["loop", "vectorized"], default="loop",
+                        help="synthetic data generator; 'loop' reproduces earlier runs exactly")
+    parser.add_argument("--streaming", action="store_true",
+                        help="out-of-core training with partial_fit (sgd or nb) in bounded memory")
+    parser.add_argument("--data", default=None,
+                        help="--streaming input (.parquet or .csv with interests,label); synthetic if omitted")
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    parser.add_argument("--vocabulary", choices=["frozen", "hashing"], default="frozen",
+                        help="--streaming features: vocabulary from a first pass, or a HashingVectorizer")
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--compact", action="store_true",
+                        help="rf: keep the fewest trees within --compact-tolerance, export quantized arrays, "
+                             "write compaction_report.json")
+    parser.add_argument("--compact-tolerance", type=float, default=COMPACT_TOLERANCE,
+                        help="accuracy the compacted forest may lose vs all trees (fraction)")
+    commands = parser.add_subparsers(dest="command")
+    gen = commands.add_parser("generate", help="stream synthetic training data to a file")
+    gen.add_argument("--out", required=True, help=".parquet or .csv path")
+    gen.add_argument("--n-samples", type=int, default=5000)
+    gen.add_argument("--seed", type=int, default=42)
+    gen.add_argument("--chunk-size", type=int, default=100_000)
+    sw = commands.add_parser("sweep", help="parallel k-fold CV over models/hyperparameters, save the best")
+    sw.add_argument("--output", default="models")
+    sw.add_argument("--data", default=None, help=".parquet or .csv with interests,label; synthetic if omitted")
+    sw.add_argument("--n-samples", type=int, default=5000)
+    sw.add_argument("--seed", type=int, default=42)
+    sw.add_argument("--models", default="rf,logreg,sgd,nb", help="comma-separated model types")
+    sw.add_argument("--n-iter", type=int, default=None, help="random search over this many candidates")
+    sw.add_argument("--folds", type=int, default=5)
+    sw.add_argument("--latency-weight", type=float, default=0.01,
+                    help="accuracy given up per ms of single-row p50 latency")
+    sw.add_argument("--max-latency-ms", type=float, default=None)
+    sw.add_argument("--workers", type=int, default=None)
+    sw.add_argument("--registry", action="store_true")
     args = parser.parse_args()
-    main(output=args.output, n_samples=args.n_samples, seed=args.seed, model_type=args.model_type)
\ No newline at end of file
+    if args.command == "sweep":
+        sweep(output=args.output, data=args.data, n_samples=args.n_samples, seed=args.seed,
+              model_types=args.models.split(","), n_iter=args.n_iter, folds=args.folds,
+              latency_weight=args.latency_weight, max_latency_ms=args.max_latency_ms,
+              workers=args.workers, registry=args.registry)
+    elif args.command == "generate":
+        rows = write_synthetic(args.out, args.n_samples, seed=args.seed, chunk_size=args.chunk_size)
+        print(f"Wrote {rows} rows to {args.out}")
+    elif args.streaming:
+        train_streaming(output=args.output, data=args.data, n_samples=args.n_samples, seed=args.seed,
+                        model_type=args.model_type or "sgd", registry=args.registry,
+                        chunk_size=args.chunk_size, vocabulary=args.vocabulary, epochs=args.epochs)
+    else:
+        if args.model_type not in (None, "rf", "logreg"):
+            parser.error("--model-type sgd/nb needs --streaming")
+        main(output=args.output, n_samples=args.n_samples, seed=args.seed, model_type=args.model_type or "rf",
+             registry=args.registry, generator=args.generator, compact=args.compact,
+             compact_tolerance=args.compact_tolerance)
\ No newline at end of file
@@ -9,10 +9,12 @@ Outputs:
 - models/scaler.joblib
 - models/vectorizer.joblib
 - models/meta.json
-- models/test_data.csv
+- models/test_data.parquet (test rows with predictions, zstd-compressed)
+- models/fairness.parquet (group metrics with bootstrap intervals)
 - backend/data/sample_loans.csv
 """
 import argparse
+from itertools import combinations
 import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
@@ -25,6 +27,9 @@ import os
 import json
 
 LOAN_PURPOSES = ["debt_consolidation", "home_improvement", "small_business", "car", "other"]
+AGE_BANDS = (["18-29", "30-44", "45-59", "60+"], [30, 45, 60])
+SENSITIVE_COLS = ["gender", "age_band"]
+GROUP_METRICS = ["tpr", "fpr", "approval_rate"]
 
 def generate_synthetic(n=10000, seed=42):
     rng = np.random.RandomState(seed)
@@ -59,6 +64,7 @@ def generate_synthetic(n=10000, seed=42):
         "loan_purpose": loan_purpose,
         "age": age,
         "gender": gender,
+        "age_band": np.asarray(AGE_BANDS[0])[np.searchsorted(AGE_BANDS[1], age, side="right")],
         "approved": approved
     })
     return df
@@ -75,21 +81,95 @@ def build_features(df):
     feature_names = num_cols + list(dv.get_feature_names_out())
     return X, df["approved"].values, dv, feature_names
 
+def _cell_counts(df, preds, sensitive_cols, label_col="approved"):
+    """
+    Row counts per (group of every sensitive column, actual, predicted) cell,
+    from one bincount over the rows. Every group metric, for any column or
+    intersection of columns, is a function of this small tensor.
+    """
+    codes, levels = [], []
+    for col in sensitive_cols:
+        c, uniques = pd.factorize(df[col], sort=True, use_na_sentinel=False)
+        codes.append(c)
+        levels.append([str(u) for u in uniques])
+    actual = (np.asarray(df[label_col]) == 1).astype(np.intp)
+    predicted = (np.asarray(preds) == 1).astype(np.intp)
+    shape = tuple(len(l) for l in levels) + (2, 2)
+    cells = np.ravel_multi_index(tuple(codes) + (actual, predicted), shape)
+    return np.bincount(cells, minlength=int(np.prod(shape))).reshape(shape), levels
+
+def _subset_rates(counts, subsets, n_cols):
+    """
+    (..., groups, len(GROUP_METRICS)) rates for every column subset, groups
+    in subset order then C order; leading axes (bootstrap replicates) kept.
+    """
+    lead = counts.ndim - n_cols - 2
+    out = []
+    for subset in subsets:
+        other = tuple(lead + i for i in range(n_cols) if i not in subset)
+        c = counts.sum(axis=other) if other else counts
+        c = c.reshape(c.shape[:lead] + (-1, 2, 2))
+        positives, negatives = c[..., 1, :].sum(-1), c[..., 0, :].sum(-1)
+        n = positives + negatives
+        out.append(np.stack([
+            c[..., 1, 1] / np.maximum(1, positives),
+            c[..., 0, 1] / np.maximum(1, negatives),
+            c[..., :, 1].sum(-1) / np.maximum(1, n),
+        ], axis=-1))
+    return np.concatenate(out, axis=-2)
+
+def _bootstrap_rates(counts, subsets, n_cols, size, seed):
+    # resampling rows with replacement only changes the cell counts, so draw
+    # those directly: O(cells) per replicate instead of O(rows), all
+    # replicates in one multinomial call
+    rng = np.random.default_rng(seed)
+    flat = counts.ravel()
+    draws = rng.multinomial(int(flat.sum()), flat / flat.sum(), size=size)
+    return _subset_rates(draws.reshape((size,) + counts.shape), subsets, n_cols)
+
+def group_metrics(df, preds, sensitive_cols=SENSITIVE_COLS, label_col="approved", max_order=None,
+                  n_bootstrap=0, confidence=0.95, seed=42):
+    """
+    TPR, FPR and approval rate per group of each sensitive column and of
+    their intersections (up to `max_order` columns at once, all by default),
+    as one row per non-empty group. With `n_bootstrap`, percentile intervals
+    at `confidence` are added as <metric>_lo / <metric>_hi (reproducible for
+    a given seed).
+    """
+    counts, levels = _cell_counts(df, preds, sensitive_cols, label_col)
+    n_cols = len(sensitive_cols)
+    max_order = n_cols if max_order is None else min(max_order, n_cols)
+    subsets = [s for r in range(1, max_order + 1) for s in combinations(range(n_cols), r)]
+    rows = []
+    for subset in subsets:
+        sizes = counts.sum(axis=tuple(i for i in range(n_cols) if i not in subset) + (n_cols, n_cols + 1))
+        for idx in np.ndindex(sizes.shape):
+            rows.append({
+                "attributes": "&".join(sensitive_cols[i] for i in subset),
+                "group": "&".join(levels[i][j] for i, j in zip(subset, idx)),
+                "n": int(sizes[idx]),
+            })
+    table = pd.DataFrame(rows)
+    rates = _subset_rates(counts, subsets, n_cols)
+    for k, metric in enumerate(GROUP_METRICS):
+        table[metric] = rates[:, k]
+    if n_bootstrap > 0:
+        replicates = _bootstrap_rates(counts, subsets, n_cols, n_bootstrap, seed)
+        alpha = (1 - confidence) / 2 * 100
+        lo, hi = np.percentile(replicates, [alpha, 100 - alpha], axis=0)
+        for k, metric in enumerate(GROUP_METRICS):
+            table[f"{metric}_lo"] = lo[:, k]
+            table[f"{metric}_hi"] = hi[:, k]
+    return table[table["n"] > 0].reset_index(drop=True)
+
 def compute_fairness_metrics(df, preds, probs, sensitive_col="gender"):
-    out = {}
-    groups = df[sensitive_col].unique().tolist()
-    for g in groups:
-        mask = df[sensitive_col] == g
-        grp_preds = preds[mask]
-        grp_probs = probs[mask]
-        grp_actual = df.loc[mask, "approved"].values
-        tpr = ((grp_preds == 1) & (grp_actual == 1)).sum() / max(1, (grp_actual == 1).sum())
-        fpr = ((grp_preds == 1) & (grp_actual == 0)).sum() / max(1, (grp_actual == 0).sum())
-        approval_rate = (grp_preds == 1).mean()
-        out[g] = {"tpr": float(round(tpr, 3)), "fpr": float(round(fpr, 3)), "approval_rate": float(round(approval_rate, 3))}
-    return out
+    table = group_metrics(df, preds, [sensitive_col])
+    return {
+        row["group"]: {m: float(round(row[m], 3)) for m in GROUP_METRICS}
+        for row in table.to_dict(orient="records")
+    }
 
-def main(output_dir="models", seed=42, n_samples=10000):
+def main(output_dir="models", seed=42, n_samples=10000, sensitive_cols=SENSITIVE_COLS, n_bootstrap=200):
     os.makedirs(output_dir, exist_ok=True)
     os.makedirs(os.path.join(os.path.dirname(output_dir), "data"), exist_ok=True)
     df = generate_synthetic(n=n_samples, seed=seed)
@@ -110,25 +190,39 @@ def main(output_dir="models", seed=42, n_samples=10000):
     print("AUC:", auc)
     print("Classification report:")
     print(classification_report(y_test, preds))
-    # fairness metrics on test set
+    # fairness metrics on test set: each sensitive column and their intersections
     df_test = df_test.copy()
     df_test["pred"] = preds
     df_test["prob"] = probs
-    fairness = compute_fairness_metrics(df_test, preds, probs, sensitive_col="gender")
+    fairness = group_metrics(df_test, preds, sensitive_cols, n_bootstrap=n_bootstrap, seed=seed)
+    print("Group metrics:")
+    print(fairness.to_string(index=False, float_format="%.3f"))
     # save artifacts
     joblib.dump(model, os.path.join(output_dir, "model.joblib"))
     joblib.dump(scaler, os.path.join(output_dir, "scaler.joblib"))
     joblib.dump(dv, os.path.join(output_dir, "vectorizer.joblib"))
+    fairness.to_parquet(os.path.join(output_dir, "fairness.parquet"), index=False, compression="zstd")
+    df_test.to_parquet(os.path.join(output_dir, "test_data.parquet"), index=False, compression="zstd")
+    # per-column summary only; intersections and intervals live in fairness.parquet
+    single = fairness[~fairness["attributes"].str.contains("&")]
     meta = {
         "feature_names": feature_names,
-        "metrics": {"auc": float(round(auc, 4)), "report": report},
-        "fairness": fairness,
+        "metrics": {
+            "auc": float(round(auc, 4)),
+            "accuracy": float(round(report["accuracy"], 4)),
+            "macro_f1": float(round(report["macro avg"]["f1-score"], 4)),
+        },
+        "fairness": {
+            attr: {row["group"]: {m: float(round(row[m], 3)) for m in GROUP_METRICS}
+                   for row in rows.to_dict(orient="records")}
+            for attr, rows in single.groupby("attributes", sort=False)
+        },
+        "outputs": {"test_data": "test_data.parquet", "fairness": "fairness.parquet"},
         "generated_samples": n_samples,
         "note": "Synthetic dataset for demo purposes only."
     }
     with open(os.path.join(output_dir, "meta.json"), "w") as f:
-        json.dump(meta, f, indent=2)
-    df_test.to_csv(os.path.join(output_dir, "test_data.csv"), index=False)
+        json.dump(meta, f, separators=(",", ":"))
     # write a small sample to backend/data
     df.sample(20, random_state=seed).to_csv(os.path.join(os.path.dirname(output_dir), "data/sample_loans.csv"), index=False)
     print(f"Saved model and artifacts to {output_dir}")
@@ -138,5 +232,10 @@ if __name__ == "__main__":
     parser.add_argument("--output-dir", default="models")
     parser.add_argument("--seed", type=int, default=42)
     parser.add_argument("--n-samples", type=int, default=20000)
+    parser.add_argument("--sensitive", default=",".join(SENSITIVE_COLS),
+                        help="comma-separated sensitive columns; intersections are evaluated too")
+    parser.add_argument("--bootstrap", type=int, default=200, help="bootstrap replicates for intervals (0 = off)")
     args = parser.parse_args()
-    main(output_dir=args.output_dir, seed=args.seed, n_samples=args.n_samples)
\ No newline at end of file
+    main(output_dir=args.output_dir, seed=args.seed, n_samples=args.n_samples,
+         sensitive_cols=[c.strip() for c in args.sensitive.split(",") if c.strip()],
+         n_bootstrap=args.bootstrap)
@@ -7,11 +7,26 @@ import tempfile
 
 client = TestClient(app)
 
+def setup_module(module):
+    # runs the app's startup, which is where artifacts load
+    client.__enter__()
+
+def teardown_module(module):
+    client.__exit__(None, None, None)
+
 def test_health():
     r = client.get("/health")
     assert r.status_code == 200
     assert r.json()["status"] == "ok"
 
+def test_ready_waits_for_artifacts(monkeypatch):
+    from app import model as m
+    r = client.get("/ready")
+    assert r.status_code == 200 and r.json()["status"] == "ready"
+    monkeypatch.setattr(m, "_active", None)
+    assert client.get("/ready").status_code == 503
+    assert client.get("/health").status_code == 200
+
 def test_predict_with_dummy_model(monkeypatch, tmp_path):
     # create a tiny trained model artifacts so load_artifacts can succeed
     from sklearn.feature_extraction.text import CountVectorizer
@@ -43,4 +58,324 @@ def test_predict_with_dummy_model(monkeypatch, tmp_path):
     body = r.json()
     assert "recommended_course" in body
     assert "probability" in body
-    assert "explanation" in body
\ No newline at end of file
+    assert "explanation" in body
+
+def test_predict_batch_matches_single():
+    items = ["python, numpy", "deep learning, pytorch", "react, javascript"]
+    r = client.post("/predict/batch", json={"interests": items})
+    assert r.status_code == 200
+    results = r.json()["results"]
+    assert len(results) == len(items)
+    for item, res in zip(items, results):
+        single = client.post("/predict", json={"interests": item}).json()
+        assert res["recommended_course"] == single["recommended_course"]
+        assert res["probability"] == single["probability"]
+
+
+def test_predict_batch_rejects_empty():
+    r = client.post("/predict/batch", json={"interests": []})
+    assert r.status_code == 422
+
+def test_explanation_only_uses_present_tokens():
+    r = client.post("/predict", json={"interests": "react, javascript, web, frontend, development, with, dart"})
+    assert r.status_code == 200
+    explanation = r.json()["explanation"]
+    top = explanation["top_contributing_tokens"]
+    assert 0 < len(top) <= 5
+    assert set(top) <= {"react", "javascript", "web", "frontend", "development", "with", "dart"}
+
+def test_inference_service_rejects_when_full():
+    import asyncio
+    import threading
+    import pytest
+    from app.model import InferenceService, InferenceQueueFull
+
+    async def scenario():
+        svc = InferenceService(workers=1, queue_size=0, executor="thread", retry_after=3)
+        gate = threading.Event()
+        first = asyncio.ensure_future(svc.submit(gate.wait, 5))
+        await asyncio.sleep(0)
+        with pytest.raises(InferenceQueueFull) as exc:
+            await svc.submit(int, "1")
+        assert exc.value.retry_after == 3
+        gate.set()
+        await first
+        assert await svc.submit(int, "1") == 1
+        svc.shutdown()
+
+    asyncio.run(scenario())
+
+def test_predict_returns_503_when_saturated(monkeypatch):
+    from app import api
+    from app.model import InferenceQueueFull
+
+    class Saturated:
+        async def submit(self, fn, *args):
+            raise InferenceQueueFull(2)
+
+    monkeypatch.setattr(api, "get_inference_service", lambda: Saturated())
+    r = client.post("/predict", json={"interests": "python"})
+    assert r.status_code == 503
+    assert r.headers["retry-after"] == "2"
+
+def test_metric_shards_of_exited_threads_are_folded():
+    import threading
+    from app.metrics import Counter
+    counter = Counter("probe_total", "test")
+    counter.inc()
+    for _ in range(3):
+        # a pool rebuilt per reload: every round brings new threads
+        threads = [threading.Thread(target=counter.inc, args=(2,)) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert counter.value == 1 + 8 * (_ + 1)
+    assert len(counter._values._shards) == 1
+
+def test_metrics_endpoint_reports_stages_and_errors(monkeypatch):
+    from app import api
+    from app.metrics import STAGE_SECONDS
+    from app.model import InferenceQueueFull
+    from app.cache import get_result_cache
+
+    get_result_cache().clear()
+    before = {stage: h.snapshot()[0] for stage, h in STAGE_SECONDS.items()}
+    assert client.post("/predict", json={"interests": "metrics, probe"}).status_code == 200
+    for stage, h in STAGE_SECONDS.items():
+        assert sum(h.snapshot()[0]) == sum(before[stage]) + 1
+
+    class Saturated:
+        async def submit(self, fn, *args):
+            raise InferenceQueueFull(1)
+
+    monkeypatch.setattr(api, "get_inference_service", lambda: Saturated())
+    client.post("/predict/batch", json={"interests": ["python"]})
+    body = client.get("/metrics").text
+    assert '# TYPE predict_stage_seconds histogram' in body
+    assert 'predict_stage_seconds_bucket{stage="vectorize",le="+Inf"}' in body
+    assert 'predict_errors_total{endpoint="/predict/batch",status="503"}' in body
+    assert "predict_cache_misses_total" in body
+
+def test_slow_request_sampler(monkeypatch):
+    from app import model as m
+    from app.metrics import SlowRequestSampler
+    sampler = SlowRequestSampler(rate=1.0, keep=2)
+    monkeypatch.setattr(m, "slow_requests", sampler)
+    m.predict_batch_from_interests(["sampled one", "sampled two"])
+    (entry,) = sampler.slowest()
+    assert entry["items"] == 2
+    assert set(entry["stages_ms"]) <= {"normalize", "vectorize", "predict_proba", "explain"}
+    for total in (0.3, 0.1, 0.2):
+        sampler.record(total, {"total": total})
+    assert [e["total"] for e in sampler.slowest()] == [0.3, 0.2]
+    # entries carry learner inputs: admin only
+    from app import api
+    monkeypatch.setattr(api, "slow_requests", sampler)
+    assert client.get("/metrics/slow").status_code == 404
+    monkeypatch.setattr(api, "ADMIN_TOKEN", "secret")
+    assert client.get("/metrics/slow").status_code == 403
+    r = client.get("/metrics/slow", headers={"X-Admin-Token": "secret"})
+    assert r.status_code == 200 and len(r.json()["slowest"]) == 2
+
+def test_histogram_shards_sum_across_threads():
+    import threading
+    from app.metrics import Histogram
+    h = Histogram("t", "test", buckets=(1.0, 2.0))
+    threads = [threading.Thread(target=lambda: [h.observe(v) for v in (0.5, 1.0, 1.5, 3.0) * 100])
+               for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    counts, total = h.snapshot()
+    assert counts == [800, 400, 400] and total == 2400.0
+    assert 't_bucket{le="2.0"} 1200.0' in h.samples()
+
+def test_micro_batcher_coalesces_concurrent_requests():
+    import asyncio
+    from app.batching import MicroBatcher
+
+    calls = []
+
+    def run_batch(items):
+        calls.append(list(items))
+        return [item.upper() for item in items]
+
+    async def inline(fn, *args):
+        return fn(*args)
+
+    async def scenario():
+        batcher = MicroBatcher(run_batch, window_ms=20, max_batch_size=4, submit=inline)
+        out = await asyncio.gather(*[batcher.predict(s) for s in "abcdef"])
+        assert out == list("ABCDEF")
+        return batcher.stats()
+
+    stats = asyncio.run(scenario())
+    assert [len(c) for c in calls] == [4, 2]
+    assert stats["batches"] == 2 and stats["items"] == 6
+    assert stats["histogram"] == {"1": 0, "2": 1, "4": 1}
+
+def test_predict_through_batcher(monkeypatch):
+    from app import api
+    from app.batching import MicroBatcher
+
+    direct = client.post("/predict", json={"interests": "python, numpy"}).json()
+    batcher = MicroBatcher(window_ms=1, max_batch_size=8)
+    monkeypatch.setattr(api, "get_batcher", lambda: batcher)
+    batched = client.post("/predict", json={"interests": "python, numpy"}).json()
+    assert batched == direct
+    assert batcher.stats()["items"] == 1
+
+def test_result_cache_lru_ttl_and_shared(tmp_path):
+    from app.cache import ResultCache, SqliteCacheBackend
+
+    cache = ResultCache(max_size=2, ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)  # evicts "b", the least recently used
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+    expired = ResultCache(max_size=2, ttl=-1)
+    expired.put("a", 1)
+    assert expired.get("a") is None
+
+    shared = SqliteCacheBackend(str(tmp_path / "cache.sqlite"), ttl=60)
+    writer = ResultCache(max_size=4, ttl=60, shared=shared)
+    reader = ResultCache(max_size=4, ttl=60, shared=SqliteCacheBackend(shared.path, ttl=60))
+    writer.put("v1:python", ("intro_ml", 0.9, {"method": "none"}))
+    assert reader.get("v1:python") == ("intro_ml", 0.9, {"method": "none"})
+    assert reader.shared_hits == 1
+
+def test_predictions_are_cached_on_normalized_input():
+    from app.cache import get_result_cache
+    cache = get_result_cache()
+    first = client.post("/predict", json={"interests": "Python, numpy"}).json()
+    hits = cache.hits
+    second = client.post("/predict", json={"interests": " python ,NUMPY, python"}).json()
+    assert cache.hits == hits + 1
+    assert first == second
+
+def test_recommend_top_k_with_filters():
+    r = client.post("/recommend?k=3", json={"interests": "python, numpy"})
+    assert r.status_code == 200
+    recs = r.json()["recommendations"]
+    assert len(recs) == 3
+    probs = [rec["probability"] for rec in recs]
+    assert probs == sorted(probs, reverse=True)
+    top = client.post("/predict", json={"interests": "python, numpy"}).json()
+    assert recs[0]["course"] == top["recommended_course"]
+
+    excluded = client.post("/recommend?k=3", json={"interests": "python, numpy", "exclude": [recs[0]["course"]]}).json()
+    courses = [rec["course"] for rec in excluded["recommendations"]]
+    assert courses[:2] == [rec["course"] for rec in recs[1:]]
+    assert recs[0]["course"] not in courses
+
+    only = client.post("/recommend?k=5", json={"interests": "python", "include": [recs[2]["course"], "no-such-course"]}).json()
+    assert [rec["course"] for rec in only["recommendations"]] == [recs[2]["course"]]
+
+    # the shipped artifacts define catalogue segments
+    web = client.post("/recommend?k=5", json={"interests": "python", "segments": ["web"]})
+    assert web.status_code == 200
+    assert {rec["course"] for rec in web.json()["recommendations"]} == {"Frontend Development", "Backend Development"}
+    assert client.post("/recommend", json={"interests": "python", "segments": ["missing"]}).status_code == 400
+    assert client.post("/recommend?k=0", json={"interests": "python"}).status_code == 422
+
+def test_class_index_segments_and_top_k():
+    import numpy as np
+    from app.model import ClassIndex
+    index = ClassIndex(["a", "b", "c", "d"], {"data": ["a", "c"], "web": ["d", "unknown"]})
+    probs = np.array([0.1, 0.4, 0.3, 0.2])
+    assert list(index.top_k(probs, 2, index.mask())) == [1, 2]
+    assert list(index.top_k(probs, 5, index.mask(segments=["data"]))) == [2, 0]
+    assert list(index.top_k(probs, 5, index.mask(segments=["data", "web"], exclude=["c"]))) == [3, 0]
+    assert list(index.top_k(probs, 3, index.mask(include=["b"], exclude=["b"]))) == []
+    # ties keep catalogue order
+    assert list(index.top_k(np.full(4, 0.25), 3, index.mask())) == [0, 1, 2]
+
+def test_similar_uses_catalogue_index(tmp_path):
+    import create_course_artifacts
+    from app import model as m
+    create_course_artifacts.main(str(tmp_path / "catalogue"))
+    _write_artifacts(str(tmp_path / "plain"), ["python pandas", "react css"], ["Data", "Web"])
+    original = m._activate(m.ArtifactBundle(str(tmp_path / "plain")))
+    try:
+        assert client.post("/similar", json={"interests": "react"}).status_code == 404
+        m._activate(m.ArtifactBundle(str(tmp_path / "catalogue")))
+        r = client.post("/similar?k=2", json={"interests": "react, javascript"})
+        assert r.status_code == 200
+        results = r.json()["results"]
+        assert results[0]["course"] == "Frontend Development"
+        assert len(results) <= 2 and results[0]["score"] > 0
+        assert client.post("/similar", json={"interests": "zzz"}).json()["results"] == []
+    finally:
+        m._activate(original)
+
+def _write_artifacts(path, docs, labels):
+    from sklearn.feature_extraction.text import CountVectorizer
+    from sklearn.linear_model import LogisticRegression
+    os.makedirs(path, exist_ok=True)
+    vect = CountVectorizer()
+    X = vect.fit_transform(docs)
+    model = LogisticRegression(max_iter=1000).fit(X, labels)
+    joblib.dump(model, os.path.join(path, "model.joblib"))
+    joblib.dump(vect, os.path.join(path, "vectorizer.joblib"))
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump({"classes": list(model.classes_)}, f)
+
+def test_registry_hot_reload(monkeypatch, tmp_path):
+    from app import api, model as m
+    from app.registry import version_dir, set_current, current_version
+
+    _write_artifacts(version_dir(str(tmp_path), "v1"), ["python pandas", "react css"], ["Data", "Web"])
+    _write_artifacts(version_dir(str(tmp_path), "v2"), ["python pandas", "react css"], ["Data v2", "Web v2"])
+    set_current(str(tmp_path), "v1")
+    original = m._active
+    monkeypatch.setattr(m, "MODEL_DIR", str(tmp_path))
+    try:
+        # without a configured token the admin routes do not exist
+        assert client.post("/admin/reload").status_code == 404
+        monkeypatch.setattr(api, "ADMIN_TOKEN", "secret")
+        assert client.post("/admin/reload", headers={"X-Admin-Token": "wrong"}).status_code == 403
+        admin = {"X-Admin-Token": "secret"}
+
+        r = client.post("/admin/reload", headers=admin)
+        assert r.status_code == 200
+        assert r.json()["name"] == "v1"
+        assert client.post("/predict", json={"interests": "python"}).json()["recommended_course"] == "Data"
+
+        # CURRENT only moves when asked to
+        assert client.post("/admin/reload", json={"version": "v2"}, headers=admin).status_code == 200
+        assert current_version(str(tmp_path)) == "v1"
+        r = client.post("/admin/reload", json={"version": "v2", "promote": True}, headers=admin)
+        assert r.status_code == 200
+        assert current_version(str(tmp_path)) == "v2"
+        assert client.post("/predict", json={"interests": "python"}).json()["recommended_course"] == "Data v2"
+
+        info = client.get("/admin/model", headers=admin).json()
+        assert info["name"] == "v2" and info["available"] == ["v1", "v2"]
+        assert client.post("/admin/reload", json={"version": "missing"}, headers=admin).status_code == 404
+    finally:
+        m._activate(original)
+
+def test_process_workers_serve_the_reloaded_version(monkeypatch, tmp_path):
+    import asyncio
+    from app import model as m
+    from app.registry import version_dir, set_current
+
+    _write_artifacts(version_dir(str(tmp_path), "v1"), ["python pandas", "react css"], ["Data", "Web"])
+    _write_artifacts(version_dir(str(tmp_path), "v2"), ["python pandas", "react css"], ["Data v2", "Web v2"])
+    set_current(str(tmp_path), "v1")
+    original = m._active
+    monkeypatch.setattr(m, "MODEL_DIR", str(tmp_path))
+    service = m.InferenceService(workers=1, executor="process")
+    try:
+        # not promoted: CURRENT still says v1, the workers must follow this process
+        m.reload_artifacts("v2")
+        course, _, _ = asyncio.run(service.submit(m.predict_from_interests, "python"))
+        assert course == "Data v2"
+    finally:
+        service.shutdown()
+        m._activate(original)
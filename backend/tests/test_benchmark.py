@@ -0,0 +1,37 @@
+import os, sys
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(BACKEND)
+sys.path.append(os.path.join(BACKEND, "scripts"))
+
+import benchmark
+
+def test_compare_flags_slower_stages_and_lower_throughput():
+    base = {
+        "stages": {"rf": {"1": {"vectorize": {"ms": 1.0}, "predict_proba": {"ms": 2.0}}}},
+        "load": {"rf": {"rps": 1000.0, "p50_ms": 5.0, "p95_ms": 8.0, "p99_ms": 10.0}},
+    }
+    cur = {
+        "stages": {"rf": {"1": {"vectorize": {"ms": 1.05}, "predict_proba": {"ms": 3.0}}}},
+        "load": {"rf": {"rps": 800.0, "p50_ms": 4.0, "p95_ms": 8.0, "p99_ms": 10.0}},
+    }
+    changes, regressions = benchmark.compare(base, cur, threshold=0.1)
+    assert regressions == ["load/rf/rps", "stages/rf/1/predict_proba/ms"]
+    assert abs(changes["load/rf/p50_ms"] + 0.2) < 1e-12
+
+def test_stage_and_load_benchmarks_run(tmp_path):
+    import create_course_artifacts
+    from app import model as m
+    create_course_artifacts.main(str(tmp_path))
+    bundle = m.ArtifactBundle(str(tmp_path))
+    inputs = benchmark.make_inputs(8)
+    stages = benchmark.bench_stages(bundle, inputs, batch_sizes=[1, 8], min_time=0)
+    assert set(stages) == {"1", "8"}
+    assert set(stages["8"]) == set(benchmark.STAGES)
+    # the in-process client skips the app's startup, so serve this bundle explicitly
+    previous = m._activate(bundle)
+    try:
+        load = benchmark.load_test(inputs, requests=20, concurrency=4)
+    finally:
+        if previous is not None:
+            m._activate(previous)
+    assert load["errors"] == 0 and load["rps"] > 0 and load["p50_ms"] <= load["p99_ms"]
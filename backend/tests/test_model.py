@@ -0,0 +1,191 @@
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import joblib
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+
+from app.artifacts import ARRAYS_DIRNAME, LEAF_VALUE_SCALE, export_model, load_model, FlatForest, LinearModelArrays
+
+DOCS = [
+    "python, pandas, numpy", "deep learning, pytorch", "nlp, transformers, rnn",
+    "cnn, computer vision", "spark, etl, big data", "ethics, fairness",
+    "rl, optimization", "python, ml, statistics", "tensorflow, neural networks",
+    "cv, cnn, pytorch", "hadoop, spark", "explainability, ethics, ml",
+]
+LABELS = [
+    "intro_ml", "deep_learning", "nlp", "computer_vision", "data_engineering", "ai_ethics",
+    "reinforcement_learning", "intro_ml", "deep_learning", "computer_vision", "data_engineering", "ai_ethics",
+]
+
+def _data():
+    vect = CountVectorizer(token_pattern=r"(?u)\b[\w\s]+\b")
+    X = vect.fit_transform(DOCS)
+    return vect, X, np.array(LABELS)
+
+def test_forest_array_export_matches_sklearn(tmp_path):
+    vect, X, y = _data()
+    rf = RandomForestClassifier(n_estimators=25, random_state=0).fit(X, y)
+    assert export_model(rf, str(tmp_path)) == "forest"
+    flat = load_model(str(tmp_path))
+    assert isinstance(flat, FlatForest)
+    assert not flat.value.flags.writeable  # read-only mapping
+    np.testing.assert_array_equal(flat.predict_proba(X), rf.predict_proba(X))
+    # sparse (row, feature) lookup path used for large batches
+    flat.DENSE_CELLS = 0
+    np.testing.assert_array_equal(flat.predict_proba(X), rf.predict_proba(X))
+    # one row at a time, as /predict calls it
+    for i in range(X.shape[0]):
+        np.testing.assert_array_equal(flat.predict_proba(X[i]), rf.predict_proba(X[i]))
+    np.testing.assert_array_equal(flat.feature_importances_, rf.feature_importances_)
+    assert list(flat.classes_) == list(rf.classes_)
+
+def test_compact_forest_export(tmp_path, monkeypatch):
+    from app import model as m
+    from app.artifacts import _round_down_f32
+    vect, X, y = _data()
+    rf = RandomForestClassifier(n_estimators=25, random_state=0).fit(X, y)
+    assert export_model(rf, str(tmp_path / "full")) == "forest"
+    assert export_model(rf, str(tmp_path / ARRAYS_DIRNAME), compact=True) == "forest"
+    flat = load_model(str(tmp_path / ARRAYS_DIRNAME))
+    assert flat.value.dtype == np.uint16 and flat.threshold.dtype == np.float32
+    assert flat.feature.dtype == np.uint16
+    # only leaves keep a class distribution
+    assert len(flat.value) == len(flat.children) // 2 - flat.leaf_offset
+    assert len(flat.value) < len(load_model(str(tmp_path / "full")).value)
+    expected = rf.predict_proba(X)
+    np.testing.assert_allclose(flat.predict_proba(X), expected, rtol=0, atol=0.5 / LEAF_VALUE_SCALE)
+    flat.DENSE_CELLS = 0
+    np.testing.assert_allclose(flat.predict_proba(X), expected, rtol=0, atol=0.5 / LEAF_VALUE_SCALE)
+    t = np.array([0.5, 1.1, 2.0000001, -3.3, np.inf])
+    t32 = _round_down_f32(t)
+    assert (t32.astype(np.float64) <= t).all() and t32[-1] == np.inf
+    assert (np.nextafter(t32[:-1], np.float32(np.inf)) > t[:-1]).all()
+    # served without a pickle, with or without memory mapping
+    joblib.dump(vect, str(tmp_path / "vectorizer.joblib"))
+    monkeypatch.setattr(m, "ARTIFACT_MMAP", False)
+    bundle = m.ArtifactBundle(str(tmp_path))
+    assert bundle.ready and isinstance(bundle.model, FlatForest)
+    probs = [p for _, p, _ in m._score(bundle, ["python", "spark"])]
+    np.testing.assert_allclose(probs, rf.predict_proba(vect.transform(["python", "spark"])).max(axis=1),
+                               rtol=0, atol=0.5 / LEAF_VALUE_SCALE)
+
+def test_linear_array_export_matches_sklearn(tmp_path):
+    vect, X, y = _data()
+    for i, model in enumerate([LogisticRegression(max_iter=1000),
+                               LogisticRegression(max_iter=1000, multi_class="ovr"),
+                               LogisticRegression(max_iter=1000).fit(X, y == "nlp"),
+                               LogisticRegression(max_iter=1000, multi_class="multinomial").fit(X, y == "nlp")]):
+        if not hasattr(model, "classes_"):
+            model.fit(X, y)
+        path = str(tmp_path / str(i))
+        assert export_model(model, path) == "linear"
+        lin = load_model(path)
+        assert isinstance(lin, LinearModelArrays)
+        np.testing.assert_allclose(lin.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-12)
+
+def test_bundle_serves_from_array_export(tmp_path):
+    from app import model as m
+    vect, X, y = _data()
+    rf = RandomForestClassifier(n_estimators=10, random_state=0).fit(X, y)
+    joblib.dump(rf, str(tmp_path / "model.joblib"))
+    joblib.dump(vect, str(tmp_path / "vectorizer.joblib"))
+    export_model(rf, str(tmp_path / ARRAYS_DIRNAME))
+    bundle = m.ArtifactBundle(str(tmp_path))
+    assert isinstance(bundle.model, FlatForest)
+    results = m._score(bundle, ["python", "spark"])
+    expected = rf.predict_proba(vect.transform(["python", "spark"]))
+    assert [p for _, p, _ in results] == list(expected.max(axis=1))
+    assert results[0][2]["method"] == "feature_importances"
+
+def test_bundle_sends_large_forest_batches_to_sklearn(tmp_path, monkeypatch):
+    import pytest
+    from app import model as m
+    vect, X, y = _data()
+    rf = RandomForestClassifier(n_estimators=10, random_state=0).fit(X, y)
+    joblib.dump(rf, str(tmp_path / "model.joblib"))
+    joblib.dump(vect, str(tmp_path / "vectorizer.joblib"))
+    export_model(rf, str(tmp_path / ARRAYS_DIRNAME))
+    bundle = m.ArtifactBundle(str(tmp_path))
+    monkeypatch.setattr(m, "FLAT_FOREST_MAX_ROWS", 4)
+    np.testing.assert_array_equal(bundle.predict_proba(X[:4]), rf.predict_proba(X[:4]))
+    assert bundle._forest is None
+    np.testing.assert_array_equal(bundle.predict_proba(X), rf.predict_proba(X))
+    assert isinstance(bundle._forest, RandomForestClassifier)
+    # both paths check the input width
+    for rows in (X[:1, :-1], X[:, :-1]):
+        with pytest.raises(ValueError, match="features"):
+            bundle.predict_proba(rows)
+
+def test_linear_engine_matches_predict_proba():
+    import scipy.sparse as sp
+    from sklearn.linear_model import SGDClassifier
+    from app.model import LinearEngine
+    vect, X, y = _data()
+    # include empty rows at the start, middle and end of the batch
+    Xb = sp.vstack([X[:1] * 0, X[:5], sp.csr_matrix((1, X.shape[1]), dtype=X.dtype), X[5:],
+                    sp.csr_matrix((2, X.shape[1]), dtype=X.dtype)]).tocsr()
+    Xb.eliminate_zeros()
+    models = [LogisticRegression(max_iter=1000).fit(X, y),
+              LogisticRegression(max_iter=1000, multi_class="ovr").fit(X, y),
+              LogisticRegression(max_iter=1000).fit(X, y == "nlp"),
+              LogisticRegression(max_iter=1000, multi_class="multinomial").fit(X, y == "nlp"),
+              SGDClassifier(loss="log_loss", random_state=0).fit(X, y)]
+    for model in models:
+        engine = LinearEngine.from_model(model)
+        probs, contrib = engine.score(Xb)
+        np.testing.assert_allclose(probs, model.predict_proba(Xb), rtol=0, atol=1e-12)
+        for i in range(Xb.shape[0]):
+            single, _ = engine.score(Xb[i])
+            np.testing.assert_allclose(single, model.predict_proba(Xb[i]), rtol=0, atol=1e-12)
+        np.testing.assert_allclose(contrib, model.coef_.T[Xb.indices] * Xb.data[:, None])
+    assert LinearEngine.from_model(RandomForestClassifier(n_estimators=2).fit(X, y)) is None
+
+def test_mismatched_vectorizer_is_rejected(tmp_path):
+    import pytest
+    from sklearn.feature_extraction import DictVectorizer
+    from app import model as m
+    vect, X, y = _data()
+    model = LogisticRegression(max_iter=1000).fit(X, y)
+    # a stale vectorizer with fewer columns than the model was trained on
+    stale = DictVectorizer().fit([{"python": 1, "spark": 1}])
+    joblib.dump(model, str(tmp_path / "model.joblib"))
+    joblib.dump(stale, str(tmp_path / "vectorizer.joblib"))
+    with pytest.raises(ValueError, match="expecting"):
+        m.LinearEngine.from_model(model).score(stale.transform([{"python": 1}]))
+    with pytest.raises(RuntimeError, match="features"):
+        m._score(m.ArtifactBundle(str(tmp_path)), ["python"])
+
+def test_linear_engine_reads_export_in_place(tmp_path):
+    from app.model import LinearEngine
+    vect, X, y = _data()
+    model = LogisticRegression(max_iter=1000).fit(X, y)
+    export_model(model, str(tmp_path))
+    lin = load_model(str(tmp_path))
+    engine = LinearEngine.from_model(lin)
+    # the engine gathers from the memory-mapped file, not a per-worker copy
+    assert np.shares_memory(engine.weights, lin.coef_)
+    np.testing.assert_allclose(engine.score(X)[0], model.predict_proba(X), rtol=0, atol=1e-12)
+
+def test_catalogue_index_matches_dense_cosine(tmp_path):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from app.similarity import CatalogueIndex, save_catalogue
+    rng = np.random.default_rng(0)
+    words = np.array(sorted({w for d in DOCS for w in d.replace(",", "").split()}))
+    docs = [" ".join(rng.choice(words, size=rng.integers(1, 6))) for _ in range(300)]
+    courses = [f"course {i}" for i in range(len(docs))]
+    tfidf = TfidfVectorizer()
+    save_catalogue(str(tmp_path), tfidf, courses, docs)
+    index = CatalogueIndex.load(str(tmp_path))
+    X = tfidf.transform(docs)
+    for query in ["python pandas", "spark etl big data", "ethics", "unknown words only", ""]:
+        q = tfidf.transform([query])
+        expected = (X @ q.T).toarray().ravel()
+        got = index.search(query, k=10)
+        assert len(got) == min(10, int((expected > 0).sum()))
+        for name, score in got:
+            assert abs(expected[courses.index(name)] - score) < 1e-12
+        if got:
+            # nothing outside the result beats its last entry
+            assert np.sort(expected)[::-1][len(got) - 1] <= got[-1][1] + 1e-12
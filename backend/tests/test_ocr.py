@@ -0,0 +1,263 @@
+import io
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import pytest
+
+pytest.importorskip("cv2")
+pytest.importorskip("pytesseract")
+import numpy as np
+from PIL import Image
+
+from app import ocr
+
+# fake Tesseract output per page: lines of words, keyed by the page's gray level
+PAGES = {
+    10: [["Transcript", "2024"], ["Python", "and", "NumPy"]],
+    20: [["Deep", "learning,", "PyTorch"]],
+    30: [["react", "javascript"]],
+}
+
+def _fake_image_to_data(image, config="", output_type=None, lang=None):
+    lines = PAGES[int(np.asarray(image).flat[0])]
+    data = {k: [] for k in ("text", "left", "top", "width", "height", "conf",
+                            "page_num", "block_num", "par_num", "line_num")}
+    for line_num, words in enumerate(lines, 1):
+        # tesseract emits an empty row per line before its words
+        for word in [""] + words:
+            data["text"].append(word)
+            data["conf"].append("-1" if not word else "91.5")
+            data["page_num"].append(1)
+            data["block_num"].append(1)
+            data["par_num"].append(1 if line_num < 3 else 2)
+            data["line_num"].append(line_num)
+            for k in ("left", "top", "width", "height"):
+                data[k].append(0)
+    return data
+
+def _tiff(levels):
+    frames = [Image.new("RGB", (40, 20), (v, v, v)) for v in levels]
+    buf = io.BytesIO()
+    frames[0].save(buf, format="TIFF", save_all=True, append_images=frames[1:])
+    return buf.getvalue()
+
+@pytest.fixture
+def fake_tesseract(monkeypatch):
+    calls = []
+    def fake(*args, **kwargs):
+        calls.append(1)
+        return _fake_image_to_data(*args, **kwargs)
+    monkeypatch.setattr(ocr.pytesseract, "image_to_data", fake)
+    return calls
+
+def test_run_ocr_calls_tesseract_once_and_rebuilds_text(fake_tesseract):
+    result = ocr.run_ocr(Image.new("RGB", (40, 20), (10, 10, 10)))
+    assert len(fake_tesseract) == 1
+    assert result["text"] == "Transcript 2024\nPython and NumPy"
+    assert [w["text"] for w in result["words"]][:2] == ["Transcript", "2024"]
+    assert result["words"][0]["conf"] == 91
+
+def test_text_from_data_separates_paragraphs():
+    data = _fake_image_to_data(np.full((2, 2, 3), 10, dtype=np.uint8))
+    data["par_num"][-4:] = [2] * 4
+    assert ocr.text_from_data(data) == "Transcript 2024\n\nPython and NumPy"
+
+def test_engine_streams_every_page_of_a_tiff(fake_tesseract):
+    engine = ocr.OCREngine(workers=2, executor="thread")
+    try:
+        pages = list(engine.stream(_tiff([10, 20, 30])))
+        assert sorted(p["page"] for p in pages) == [0, 1, 2]
+        result = engine.run(_tiff([10, 20, 30]))
+        assert [p["page"] for p in result["pages"]] == [0, 1, 2]
+        assert result["text"].split("\f")[2] == "react javascript"
+        assert len(fake_tesseract) == 6
+    finally:
+        engine.shutdown()
+
+def test_open_document_rejects_garbage():
+    with pytest.raises(ValueError):
+        ocr.open_document(b"not an image")
+
+def test_upload_endpoints(fake_tesseract, monkeypatch):
+    import json
+    from fastapi.testclient import TestClient
+    from app.main import app
+    monkeypatch.setattr(ocr, "_ocr_engine", ocr.OCREngine(workers=2, executor="thread"))
+    png = io.BytesIO()
+    Image.new("RGB", (40, 20), (10, 10, 10)).save(png, format="PNG")
+    with TestClient(app) as client:
+        r = client.post("/predict/upload", files={"file": ("transcript.png", png.getvalue(), "image/png")})
+        assert r.status_code == 200
+        body = r.json()
+        assert body["skills"] == ["python", "numpy"]
+        assert body["pages"] == [{"page": 0, "text": "Transcript 2024\nPython and NumPy"}]
+        direct = client.post("/predict", json={"interests": "python, numpy"}).json()
+        assert body["recommended_course"] == direct["recommended_course"]
+
+        r = client.post("/ocr", files={"file": ("scan.tiff", _tiff([10, 20, 30]), "image/tiff")})
+        assert r.status_code == 200
+        pages = [json.loads(line) for line in r.text.splitlines()]
+        assert sorted(p["page"] for p in pages) == [0, 1, 2]
+
+        assert client.post("/ocr", files={"file": ("x.png", b"garbage", "image/png")}).status_code == 400
+        PAGES[40] = [["nothing", "relevant"]]
+        blank = io.BytesIO()
+        Image.new("RGB", (40, 20), (40, 40, 40)).save(blank, format="PNG")
+        r = client.post("/predict/upload", files={"file": ("blank.png", blank.getvalue(), "image/png")})
+        assert r.status_code == 422
+        assert client.post("/ocr", files={"file": ("scan.tiff", _tiff([10]), "image/tiff")},
+                           data={"preprocess": "sharpen"}).status_code == 400
+
+        # no model loaded: a counted 500, not an unhandled error
+        from app import metrics, model as m
+        monkeypatch.setattr(m, "_active", None)
+        r = client.post("/predict/upload", files={"file": ("transcript.png", png.getvalue(), "image/png")})
+        assert r.status_code == 500
+        assert metrics._errors["/predict/upload:500"].value >= 1
+
+def test_preprocess_array_pipeline():
+    import cv2
+    page = np.full((300, 400, 3), 255, dtype=np.uint8)
+    for y in range(40, 280, 40):
+        cv2.putText(page, "python numpy pandas", (20, y), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 0), 2)
+    assert ocr.preprocess_array(page, ocr.parse_steps("none")) is page
+    gray = ocr.preprocess_array(page, ["grayscale", "binarize"])
+    assert gray.ndim == 2 and set(np.unique(gray)) <= {0, 255}
+    assert ocr.preprocess_array(page, ["resize"], dpi=600).shape == (150, 200)
+    assert ocr.preprocess_array(page, ["resize"], dpi=None).shape == (300, 400)
+    # single-channel input is worked on in place
+    single = np.ascontiguousarray(page[:, :, 0])
+    assert ocr.preprocess_array(single, ["denoise", "binarize"]) is single
+    # a read-only page (as np.asarray gives for a PIL image) is left alone
+    frozen = single.copy()
+    frozen.flags.writeable = False
+    out = ocr.preprocess_array(frozen, ["denoise"])
+    assert out is not frozen and np.array_equal(frozen, single)
+    # preprocessing decodes color pages straight to one gray channel
+    color, _ = next(ocr.iter_pages(Image.fromarray(page), gray=True))
+    assert color.shape == (300, 400)
+    assert next(ocr.iter_pages(Image.fromarray(page)))[0].shape == (300, 400, 3)
+    skewed = cv2.warpAffine(single, cv2.getRotationMatrix2D((200, 150), 4, 1.0), (400, 300), borderValue=255)
+    assert abs(ocr._deskew_angle(skewed)) > 3
+    assert abs(ocr._deskew_angle(ocr.preprocess_array(skewed, ["deskew"]))) < 0.5
+
+def test_parse_steps():
+    assert ocr.parse_steps("none") == ()
+    assert ocr.parse_steps("resize, deskew,binarize") == ("resize", "deskew", "binarize")
+    with pytest.raises(ValueError):
+        ocr.parse_steps("sharpen")
+
+def test_ocr_cache_serves_repeat_uploads(fake_tesseract, tmp_path):
+    from app.cache import OCRResultCache
+    cache = OCRResultCache(str(tmp_path / "ocr.sqlite3"))
+    engine = ocr.OCREngine(workers=2, executor="thread", cache=cache)
+    try:
+        first = engine.run(_tiff([10, 20, 30]))
+        assert len(fake_tesseract) == 3
+        assert engine.run(_tiff([10, 20, 30])) == first
+        assert sorted(p["page"] for p in engine.stream(_tiff([10, 20, 30]))) == [0, 1, 2]
+        assert len(fake_tesseract) == 3
+        # other preprocessing is another key
+        engine.run(_tiff([10, 20, 30]), preprocess="denoise")
+        assert len(fake_tesseract) == 6
+        assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 2
+        # a fresh handle on the same file sees the stored results
+        assert OCRResultCache(cache.path).get(ocr.ocr_cache_key(_tiff([10, 20, 30]))) == first
+    finally:
+        engine.shutdown()
+
+def test_ocr_cache_evicts_least_recently_used(tmp_path):
+    from app.cache import OCRResultCache
+    value = {"text": "x", "pages": [{"page": 0, "text": "x", "words": list(range(100))}]}
+    cache = OCRResultCache(str(tmp_path / "ocr.sqlite3"), max_bytes=1000)
+    cache.put("a", value)
+    entry = cache.total_bytes()
+    # room for four entries, with the low-water mark above three
+    cache.max_bytes = 4 * entry + entry // 2
+    for key in "bcd":
+        cache.put(key, value)
+    assert cache.get("a") == value
+    cache.put("e", value)
+    assert cache.total_bytes() == 4 * entry
+    assert cache.get("b") is None
+    assert all(cache.get(key) == value for key in "acde")
+
+def test_ocr_cache_runs_concurrent_misses_once(tmp_path):
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from app.cache import OCRResultCache
+    cache = OCRResultCache(str(tmp_path / "ocr.sqlite3"))
+    release, calls = threading.Event(), []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return {"text": "done", "pages": []}
+
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(cache.get_or_compute, "doc", compute) for _ in range(4)]
+        while cache.coalesced < 3:
+            threading.Event().wait(0.01)
+        release.set()
+        assert [f.result()["text"] for f in futures] == ["done"] * 4
+    assert len(calls) == 1
+
+def test_concurrent_streams_of_one_upload_share_a_pass(monkeypatch, tmp_path):
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from app.cache import OCRResultCache
+    release, calls = threading.Event(), []
+
+    def slow(*args, **kwargs):
+        calls.append(1)
+        release.wait(5)
+        return _fake_image_to_data(*args, **kwargs)
+
+    monkeypatch.setattr(ocr.pytesseract, "image_to_data", slow)
+    cache = OCRResultCache(str(tmp_path / "ocr.sqlite3"))
+    engine = ocr.OCREngine(workers=2, executor="thread", cache=cache)
+    doc = _tiff([10, 20, 30])
+    try:
+        with ThreadPoolExecutor(3) as pool:
+            futures = [pool.submit(lambda: list(engine.stream(doc))) for _ in range(3)]
+            while cache.coalesced < 2:
+                threading.Event().wait(0.01)
+            release.set()
+            results = [f.result() for f in futures]
+        assert len(calls) == 3
+        assert all(sorted(p["page"] for p in pages) == [0, 1, 2] for pages in results)
+
+        # a leader whose client goes away leaves the waiters to OCR it themselves
+        other = _tiff([30, 20, 10])
+        leader = engine.stream(other)
+        next(leader)
+        with ThreadPoolExecutor(1) as pool:
+            waiter = pool.submit(lambda: list(engine.stream(other)))
+            while cache.coalesced < 3:
+                threading.Event().wait(0.01)
+            leader.close()
+            assert sorted(p["page"] for p in waiter.result(timeout=5)) == [0, 1, 2]
+    finally:
+        engine.shutdown()
+
+def test_ocr_cache_rechecks_the_file_after_claiming(fake_tesseract, monkeypatch, tmp_path):
+    from app.cache import OCRResultCache
+    cache = OCRResultCache(str(tmp_path / "ocr.sqlite3"))
+    engine = ocr.OCREngine(workers=2, executor="thread", cache=cache)
+    doc = _tiff([10, 20])
+    stored = ocr.OCREngine(workers=2, executor="thread").run(doc)
+    calls = len(fake_tesseract)
+    claim = cache.claim
+
+    def claim_after_other_worker(key):
+        # another worker on the same file finishes between our miss and our claim
+        OCRResultCache(cache.path).put(key, stored)
+        return claim(key)
+
+    monkeypatch.setattr(cache, "claim", claim_after_other_worker)
+    try:
+        assert engine.run(doc) == stored
+        assert list(engine.stream(doc, preprocess="denoise")) == stored["pages"]
+        assert len(fake_tesseract) == calls
+        assert not cache._inflight
+    finally:
+        engine.shutdown()
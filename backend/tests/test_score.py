@@ -0,0 +1,54 @@
+import os, sys
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(BACKEND)
+sys.path.append(os.path.join(BACKEND, "scripts"))
+import pandas as pd
+import pytest
+
+import score
+import create_course_artifacts
+from app import model as m
+
+INTERESTS = ["python, machine learning", "react, javascript", "sql, databases", "", "deep learning, pytorch"]
+
+@pytest.fixture
+def artifacts(tmp_path):
+    path = str(tmp_path / "models")
+    create_course_artifacts.main(path)
+    previous = m._active
+    yield path
+    if previous is not None:
+        m._activate(previous)
+
+@pytest.mark.parametrize("workers,out", [(1, "scores.csv"), (2, "scores.parquet")])
+def test_score_keeps_input_order(artifacts, tmp_path, workers, out):
+    rows = INTERESTS * 7
+    src = tmp_path / "in.csv"
+    pd.DataFrame({"learner_id": [f"u{i}" for i in range(len(rows))], "interests": rows}).to_csv(src, index=False)
+    out = str(tmp_path / out)
+    report = score.score(str(src), out, model_dir=artifacts, workers=workers, chunk_size=4, id_column="learner_id")
+    assert report["rows"] == len(rows) and report["rows_per_sec"] > 0
+    result = pd.read_parquet(out) if out.endswith(".parquet") else pd.read_csv(out)
+    assert result["learner_id"].tolist() == [f"u{i}" for i in range(len(rows))]
+    m._activate(m.ArtifactBundle(artifacts))
+    expected = [m.predict_from_interests(text) for text in rows]
+    assert result["recommended_course"].tolist() == [course for course, _, _ in expected]
+    assert result["probability"].tolist() == [round(prob, 4) for _, prob, _ in expected]
+
+def test_score_with_explanations(artifacts, tmp_path):
+    src = tmp_path / "in.csv"
+    pd.DataFrame({"interests": INTERESTS}).to_csv(src, index=False)
+    out = str(tmp_path / "scores.csv")
+    score.score(str(src), out, model_dir=artifacts, chunk_size=2, explain=True)
+    result = pd.read_csv(out)
+    assert result["row"].tolist() == list(range(len(INTERESTS)))
+    assert "explanation" in result.columns
+
+def test_score_treats_parquet_nulls_as_empty(artifacts, tmp_path):
+    src = str(tmp_path / "in.parquet")
+    pd.DataFrame({"interests": ["python, sql", None, "react"]}).to_parquet(src, index=False)
+    out = str(tmp_path / "scores.csv")
+    assert score.score(src, out, model_dir=artifacts)["rows"] == 3
+    result = pd.read_csv(out)
+    m._activate(m.ArtifactBundle(artifacts))
+    assert result["recommended_course"][1] == m.predict_from_interests("")[0]
@@ -0,0 +1,134 @@
+import os, sys
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(BACKEND)
+sys.path.append(os.path.join(BACKEND, "scripts"))
+import numpy as np
+import pandas as pd
+import pytest
+
+import train
+
+def _heuristic(interests):
+    topics = interests.split(", ")
+    scores = [sum(key in t for t in topics for key in train.COURSE_KEYWORDS[c]) for c in train.COURSES]
+    return train.COURSES[int(np.argmax(scores))] if max(scores) else None
+
+def test_vectorized_generator_follows_heuristic():
+    df = train.generate_synthetic_fast(n=5000, seed=0, chunk_size=1000)
+    assert len(df) == 5000 and list(df.columns) == ["interests", "label"]
+    topics = df["interests"].str.split(", ")
+    assert topics.map(len).between(2, 6).all()
+    assert (topics.map(lambda t: len(set(t))) == topics.map(len)).all()
+    assert set(topics.explode()) <= set(train.TOPICS)
+    expected = df["interests"].map(_heuristic)
+    agree = (expected == df["label"])[expected.notna()].mean()
+    # only the 15% noise (which can still land on the right course) disagrees
+    assert 0.82 < agree < 0.92
+
+def test_vectorized_generator_is_reproducible():
+    a = train.generate_synthetic_fast(n=3000, seed=7, chunk_size=1000)
+    b = train.generate_synthetic_fast(n=3000, seed=7, chunk_size=1000)
+    pd.testing.assert_frame_equal(a, b)
+    assert not a.equals(train.generate_synthetic_fast(n=3000, seed=8, chunk_size=1000))
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet"])
+def test_write_synthetic_streams_chunks(tmp_path, suffix):
+    if suffix == ".parquet":
+        pytest.importorskip("pyarrow")
+    path = str(tmp_path / f"synthetic{suffix}")
+    assert train.write_synthetic(path, 2500, seed=3, chunk_size=1000) == 2500
+    df = pd.read_parquet(path) if suffix == ".parquet" else pd.read_csv(path)
+    pd.testing.assert_frame_equal(df, train.generate_synthetic_fast(n=2500, seed=3, chunk_size=1000),
+                                  check_dtype=False)
+
+@pytest.mark.parametrize("model_type,vocabulary", [("sgd", "frozen"), ("sgd", "hashing"), ("nb", "frozen")])
+def test_streaming_training_produces_servable_artifacts(tmp_path, model_type, vocabulary):
+    from app.model import ArtifactBundle, _score
+    data = str(tmp_path / "data.csv")
+    train.write_synthetic(data, 3000, seed=1, chunk_size=500)
+    out = str(tmp_path / "models")
+    acc = train.train_streaming(output=out, data=data, model_type=model_type, chunk_size=500,
+                                vocabulary=vocabulary)
+    assert acc > 0.6
+    bundle = ArtifactBundle(out)
+    assert bundle.ready and bundle.meta["training"] == "streaming"
+    assert bundle.meta["classes"] == sorted(train.COURSES)
+    assert set(bundle.meta["segments"]) == set(train.COURSE_SEGMENTS)
+    assert set(bundle.class_index.segments) == set(train.COURSE_SEGMENTS)
+    course, prob, explanation = _score(bundle, ["spark"])[0]
+    assert course in train.COURSES and 0 < prob <= 1
+    # hashed columns have no token names to explain with
+    expected = "coef_contributions" if (model_type, vocabulary) == ("sgd", "frozen") else "none"
+    assert explanation["method"] == expected
+
+def test_retraining_without_array_export_drops_stale_export(tmp_path):
+    from sklearn.naive_bayes import MultinomialNB
+    from app.artifacts import ARRAYS_DIRNAME
+    from app.model import ArtifactBundle
+    out = str(tmp_path / "models")
+    train.main(output=out, n_samples=300, model_type="rf")
+    assert os.path.isdir(os.path.join(out, ARRAYS_DIRNAME))
+    train.train_streaming(output=out, n_samples=300, model_type="nb", chunk_size=100)
+    assert not os.path.exists(os.path.join(out, ARRAYS_DIRNAME))
+    assert isinstance(ArtifactBundle(out).model, MultinomialNB)
+
+def test_streaming_training_rejects_batch_only_models(tmp_path):
+    with pytest.raises(ValueError):
+        train.train_streaming(output=str(tmp_path), model_type="rf")
+
+def test_sweep_writes_best_candidate(tmp_path):
+    import json
+    from app.model import ArtifactBundle
+    out = str(tmp_path / "models")
+    best = train.sweep(output=out, n_samples=400, model_types=["logreg", "nb"], folds=2, workers=2)
+    with open(os.path.join(out, "sweep_results.json")) as f:
+        results = json.load(f)["results"]
+    assert len(results) == len(train.sweep_candidates(["logreg", "nb"]))
+    for r in results:
+        assert len(r["fold_accuracy"]) == 2
+        assert r["latency_ms_p50"] > 0 and r["model_bytes"] > 0
+    assert best["score"] == max(r["score"] for r in results)
+    bundle = ArtifactBundle(out)
+    assert bundle.ready and bundle.meta["sweep"]["best"]["params"] == best["params"]
+    with pytest.raises(ValueError):
+        train.sweep(output=out, n_samples=400, model_types=["nb"], folds=2, workers=1, max_latency_ms=0)
+
+def test_sweep_replaces_an_earlier_array_export(tmp_path):
+    from sklearn.naive_bayes import MultinomialNB
+    from app.model import ArtifactBundle
+    out = str(tmp_path / "models")
+    train.main(output=out, n_samples=300, model_type="rf")
+    train.sweep(output=out, n_samples=300, model_types=["nb"], folds=2, workers=2)
+    assert isinstance(ArtifactBundle(out).model, MultinomialNB)
+
+def test_sweep_random_search_subsets_grid():
+    grid = train.sweep_candidates(["rf", "logreg"])
+    picked = train.sweep_candidates(["rf", "logreg"], n_iter=5, seed=0)
+    assert len(picked) == 5 and all(c in grid for c in picked)
+    assert picked == train.sweep_candidates(["rf", "logreg"], n_iter=5, seed=0)
+
+def test_compact_training_keeps_fewest_trees_within_tolerance(tmp_path):
+    import json
+    from sklearn.ensemble import RandomForestClassifier
+    df = train.generate_synthetic(n=600, seed=0)
+    vect = train.make_vectorizer()
+    X, y = vect.fit_transform(df["interests"].values), df["label"].values
+    rf = RandomForestClassifier(n_estimators=30, random_state=0).fit(X[:400], y[:400])
+    n_trees, accs = train.select_tree_count(rf, X[400:], y[400:], tolerance=0.02)
+    assert len(accs) == 30 and accs[-1] == rf.score(X[400:], y[400:])
+    target = accs[-1] - 0.02
+    assert min(accs[n_trees - 1:]) >= target
+    assert n_trees == 1 or accs[n_trees - 2] < target
+    small = train.truncate_forest(rf, n_trees)
+    assert len(small.estimators_) == n_trees and len(rf.estimators_) == 30
+
+    out = tmp_path / "models"
+    # a pickle from an earlier run in the same directory must not survive
+    train.main(output=str(out), n_samples=300, model_type="logreg")
+    train.main(output=str(out), n_samples=600, compact=True, compact_tolerance=0.02)
+    report = json.loads((out / "compaction_report.json").read_text())
+    assert report["compact"]["n_trees"] <= report["full"]["n_trees"] == 200
+    assert report["compact"]["arrays_bytes"] < report["full"]["arrays_bytes"]
+    assert report["compact"]["model_bytes"] == 0 and report["compact"]["joblib_load_ms"] is None
+    assert not (out / "model.joblib").exists()
+    assert json.loads((out / "meta.json").read_text())["compaction"]["n_trees"] == report["compact"]["n_trees"]
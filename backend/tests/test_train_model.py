@@ -0,0 +1,56 @@
+import os, sys, json
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(BACKEND)
+sys.path.append(os.path.join(BACKEND, "scripts"))
+import numpy as np
+import pandas as pd
+import pytest
+
+import train_model
+
+def _loop_metrics(df, preds, cols):
+    # reference: boolean masks per group, as compute_fairness_metrics used to
+    out = {}
+    for key, grp in df.groupby(cols):
+        key = key if isinstance(key, tuple) else (key,)
+        p, a = preds[grp.index], grp["approved"].values
+        out["&".join(map(str, key))] = (
+            ((p == 1) & (a == 1)).sum() / max(1, (a == 1).sum()),
+            ((p == 1) & (a == 0)).sum() / max(1, (a == 0).sum()),
+            (p == 1).mean(),
+        )
+    return out
+
+def test_group_metrics_match_per_group_masks():
+    df = train_model.generate_synthetic(n=3000, seed=1)
+    preds = np.random.default_rng(1).integers(0, 2, len(df))
+    table = train_model.group_metrics(df, preds, ["gender", "age_band", "loan_purpose"], max_order=2)
+    assert set(table["attributes"]) == {"gender", "age_band", "loan_purpose", "gender&age_band",
+                                        "gender&loan_purpose", "age_band&loan_purpose"}
+    for attrs, rows in table.groupby("attributes"):
+        expected = _loop_metrics(df, preds, attrs.split("&"))
+        assert set(rows["group"]) == set(expected)
+        for row in rows.to_dict(orient="records"):
+            np.testing.assert_allclose([row[m] for m in train_model.GROUP_METRICS], expected[row["group"]])
+    assert table.loc[table["attributes"] == "gender", "n"].sum() == len(df)
+
+def test_bootstrap_intervals_are_reproducible_and_bracket_estimates():
+    df = train_model.generate_synthetic(n=2000, seed=2)
+    preds = df["approved"].values.copy()
+    preds[::5] = 1 - preds[::5]
+    a = train_model.group_metrics(df, preds, n_bootstrap=120, seed=3)
+    b = train_model.group_metrics(df, preds, n_bootstrap=120, seed=3)
+    pd.testing.assert_frame_equal(a, b)
+    for m in train_model.GROUP_METRICS:
+        assert (a[f"{m}_lo"] <= a[m] + 1e-12).all() and (a[m] <= a[f"{m}_hi"] + 1e-12).all()
+        assert (a[f"{m}_lo"] < a[f"{m}_hi"]).any()
+
+def test_main_writes_columnar_outputs(tmp_path):
+    out = tmp_path / "models"
+    train_model.main(output_dir=str(out), n_samples=2000, n_bootstrap=20)
+    meta = json.loads((out / "meta.json").read_text())
+    assert set(meta["fairness"]) == {"gender", "age_band"}
+    test_data = pd.read_parquet(out / "test_data.parquet")
+    assert len(test_data) == 400 and {"pred", "prob"} <= set(test_data.columns)
+    fairness = pd.read_parquet(out / "fairness.parquet")
+    assert "gender&age_band" in set(fairness["attributes"])
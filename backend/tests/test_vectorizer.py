@@ -0,0 +1,78 @@
+import os, sys
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(BACKEND)
+sys.path.append(os.path.join(BACKEND, "scripts"))
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import CountVectorizer
+
+import train
+import create_course_artifacts
+from app.model import _normalize_interests
+from app.vectorizer import FastCountVectorizer
+
+RAW_INPUTS = [
+    "python, ml",
+    "Deep Learning, PyTorch, deep learning",
+    "linear algebra, probability, statistics, python, pandas, numpy",
+    "machine learning with python, numpy, pandas",
+    "react, javascript, frontend web development",
+    "nlp",
+    "r, c, go",
+    "c++, node.js, ci/cd",
+    "mlo ps, big  data",
+    "data_engineering, etl",
+    "café, naïve bayes, ÜBER",
+    "tab\tseparated, new\nline",
+    "  ,  , ",
+    "",
+    "python python python",
+    "2024, gpt4, 3d vision",
+]
+
+def _assert_same(fast, vect, docs):
+    expected = vect.transform(docs)
+    got = fast.transform(docs)
+    assert got.shape == expected.shape
+    assert got.dtype == expected.dtype
+    assert got.has_sorted_indices
+    np.testing.assert_array_equal(got.indptr, expected.indptr)
+    np.testing.assert_array_equal(got.indices, expected.indices)
+    np.testing.assert_array_equal(got.data, expected.data)
+
+def _docs(vect):
+    normalized = [_normalize_interests(t) for t in RAW_INPUTS]
+    # vocabulary entries themselves, plus raw (unnormalized) strings
+    return normalized + list(vect.vocabulary_) + RAW_INPUTS
+
+def test_parity_with_train_py_vocabulary():
+    df = train.generate_synthetic(n=500, seed=0)
+    vect = train.make_vectorizer().fit(df["interests"].values)
+    fast = FastCountVectorizer.from_vectorizer(vect)
+    assert fast is not None
+    _assert_same(fast, vect, _docs(vect) + list(df["interests"].values[:50]))
+
+def test_parity_with_course_artifacts_vocabulary():
+    vect, _ = create_course_artifacts.build_artifacts()
+    fast = FastCountVectorizer.from_vectorizer(vect)
+    assert fast is not None
+    _assert_same(fast, vect, _docs(vect) + create_course_artifacts.docs)
+
+@pytest.mark.parametrize("kwargs", [
+    {"binary": True},
+    {"lowercase": False},
+    {"token_pattern": r"(?u)\b\w+\b"},
+    {"token_pattern": r"(\w+)@"},
+])
+def test_parity_other_count_vectorizer_settings(kwargs):
+    vect = CountVectorizer(**kwargs).fit(create_course_artifacts.docs + ["a@b x@y", "Python"])
+    fast = FastCountVectorizer.from_vectorizer(vect)
+    _assert_same(fast, vect, _docs(vect) + ["a@b, x@y", "Python PYTHON"])
+
+def test_unsupported_vectorizers_fall_back():
+    from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer
+    docs = create_course_artifacts.docs
+    assert FastCountVectorizer.from_vectorizer(CountVectorizer(ngram_range=(1, 2)).fit(docs)) is None
+    assert FastCountVectorizer.from_vectorizer(CountVectorizer(stop_words="english").fit(docs)) is None
+    assert FastCountVectorizer.from_vectorizer(TfidfVectorizer().fit(docs)) is None
+    assert FastCountVectorizer.from_vectorizer(HashingVectorizer()) is None